@@ -0,0 +1,61 @@
+"""Cold-start import benchmark for the bot/API entry modules.
+
+Each target is imported in a fresh interpreter several times; the median wall
+time and any heavy backend modules that got pulled in are reported.
+
+	python -m benchmarks.bench_imports
+	python -m benchmarks.bench_imports --max-ms 1500   # exit 1 if slower
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List
+
+TARGETS = ["src.agent.api", "src.agent.bot", "src.agent.pipeline"]
+# Backends that should only load when a reel is actually processed
+HEAVY_MODULES = ["cv2", "pytesseract", "googleapiclient", "faster_whisper", "ctranslate2", "numpy", "openai", "requests"]
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_PROBE = """
+import json, resource, sys, time
+t = time.perf_counter()
+import {target}
+elapsed = time.perf_counter() - t
+print(json.dumps({{
+	"import_ms": elapsed * 1000,
+	"max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+	"heavy": [m for m in {heavy!r} if m in sys.modules],
+}}))
+"""
+
+
+def probe(target: str) -> Dict:
+	code = _PROBE.format(target=target, heavy=HEAVY_MODULES)
+	res = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+	return json.loads(res.stdout.strip().splitlines()[-1])
+
+
+def main(argv: List[str] | None = None) -> int:
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument("--repeat", type=int, default=5)
+	parser.add_argument("--max-ms", type=float, help="fail if any target's median import time exceeds this")
+	args = parser.parse_args(argv)
+
+	failed = False
+	for target in TARGETS:
+		runs = [probe(target) for _ in range(args.repeat)]
+		median_ms = statistics.median(r["import_ms"] for r in runs)
+		rss = statistics.median(r["max_rss_mb"] for r in runs)
+		heavy = runs[-1]["heavy"]
+		print(f"{target:>20}  {median_ms:8.1f} ms  rss {rss:7.1f} MB  heavy: {', '.join(heavy) or '-'}")
+		if args.max_ms and median_ms > args.max_ms:
+			failed = True
+	return 1 if failed else 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,108 @@
+"""Microbenchmark for per-event logging overhead on the calling thread.
+
+Compares the old synchronous stdlib-json renderer with the orjson renderer,
+the queue-backed async sink and sampled-out events, writing to /dev/null and to
+a slow stream (every write() stalls, like a congested pipe or log driver).
+
+	python -m benchmarks.bench_logging
+	python -m benchmarks.bench_logging --events 50000 --stall-us 200
+"""
+from __future__ import annotations
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from typing import Any, Callable, Dict, List
+
+import structlog
+
+from src.agent.logging_setup import AsyncLogSink, EventSampler, QueueLogger, _json_dumps
+
+
+class _SlowStream:
+	def __init__(self, stream, stall_s: float):
+		self.stream = stream
+		self.stall_s = stall_s
+
+	def write(self, data):
+		time.sleep(self.stall_s)
+		return self.stream.write(data)
+
+	def flush(self):
+		self.stream.flush()
+
+
+def _configure(logger_factory: Callable, serializer: Callable, rates: Dict[str, float] | None = None, level: int = logging.INFO) -> None:
+	processors: List[Any] = []
+	if rates:
+		processors.append(EventSampler(rates))
+	processors += [
+		structlog.processors.TimeStamper(fmt="iso"),
+		structlog.stdlib.add_log_level,
+		structlog.processors.StackInfoRenderer(),
+		structlog.processors.format_exc_info,
+		structlog.processors.JSONRenderer(serializer=serializer),
+	]
+	structlog.reset_defaults()
+	structlog.configure(
+		processors=processors,
+		wrapper_class=structlog.make_filtering_bound_logger(level),
+		logger_factory=logger_factory,
+		cache_logger_on_first_use=False,
+	)
+
+
+def _run(n: int, method: str = "info") -> float:
+	log = getattr(structlog.get_logger(), method)
+	started = time.perf_counter()
+	for i in range(n):
+		log("ocr.frame", path=f"/tmp/ai_agent/jobs/abc/frame_{i % 8:02d}.png", cache_hit=bool(i % 3), chars=42 + i % 17)
+	return (time.perf_counter() - started) / n * 1e6
+
+
+def main(argv: List[str] | None = None) -> int:
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument("--events", type=int, default=20_000)
+	parser.add_argument("--stall-us", type=float, default=100.0, help="delay per write() on the slow stream")
+	args = parser.parse_args(argv)
+
+	devnull_text = open(os.devnull, "w")
+	devnull_bytes = open(os.devnull, "wb")
+	orjson_dumps = _json_dumps()
+	results = []
+	for stream_name, stall in (("devnull", 0.0), ("slow", args.stall_us / 1e6)):
+		text_out = _SlowStream(devnull_text, stall) if stall else devnull_text
+		bytes_out = _SlowStream(devnull_bytes, stall) if stall else devnull_bytes
+		n = args.events if not stall else max(1000, args.events // 10)
+
+		_configure(structlog.PrintLoggerFactory(text_out), json.dumps)
+		results.append((stream_name, "sync json (previous)", _run(n), None))
+
+		_configure(structlog.BytesLoggerFactory(bytes_out), orjson_dumps)
+		results.append((stream_name, "sync orjson", _run(n), None))
+
+		sink = AsyncLogSink(stream=bytes_out, max_buffer=10_000)
+		_configure(lambda *a: QueueLogger(sink), orjson_dumps)
+		per_event = _run(n)
+		sink.flush(timeout=60)
+		results.append((stream_name, "async orjson", per_event, sink.dropped))
+
+		sink = AsyncLogSink(stream=bytes_out, max_buffer=10_000)
+		_configure(lambda *a: QueueLogger(sink), orjson_dumps, rates={"ocr.frame": 0.1}, level=logging.DEBUG)
+		per_event = _run(n, "debug")
+		sink.flush(timeout=60)
+		results.append((stream_name, "async, debug sampled 10%", per_event, sink.dropped))
+
+		_configure(structlog.BytesLoggerFactory(bytes_out), orjson_dumps)
+		results.append((stream_name, "debug below LOG_LEVEL", _run(n, "debug"), None))
+
+	print(f"{'stream':>8}  {'variant':<28} {'us/event':>9}  dropped")
+	for stream_name, variant, us, dropped in results:
+		print(f"{stream_name:>8}  {variant:<28} {us:9.2f}  {'-' if dropped is None else dropped}")
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,475 @@
+"""Offline benchmark for the reel pipeline.
+
+Runs each pipeline step on generated videos/audio with every network dependency
+replaced by a local stand-in (OpenAI-compatible LLM stub, Nominatim stub, fake
+Sheets service) and reports per-stage latency, peak RSS and throughput at several
+concurrency levels.
+
+	python -m benchmarks.bench_pipeline --quick
+	python -m benchmarks.bench_pipeline --save my-laptop
+	python -m benchmarks.bench_pipeline --compare my-laptop
+
+Timings only compare on the same machine, so no baseline is committed: run
+`--save NAME` on the unchanged tree first, then `--compare NAME` after the
+change (same flags both times).
+
+Stages whose tools are missing (ffmpeg, tesseract, whisper weights) are reported
+as skipped/failed rather than aborting the run.
+"""
+from __future__ import annotations
+import argparse
+import json
+import math
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List
+from urllib.parse import parse_qs, urlparse
+
+# Settings defaults are read at import time, so point them at the stubs first.
+os.environ.setdefault("USE_LLM", "true")
+os.environ.setdefault("OPENAI_API_KEY", "bench-stub")
+os.environ.setdefault("WHISPER_BACKEND", "local")
+os.environ.setdefault("WHISPER_LOCAL_MODEL", "tiny")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+import numpy as np
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+
+# (name, seconds, width, height)
+CASES = [
+	("short-480p", 15, 480, 854),
+	("medium-720p", 30, 720, 1280),
+	("long-1080p", 60, 1080, 1920),
+]
+QUICK_CASES = [("quick-360p", 5, 360, 640)]
+OVERLAYS = ["Cafe Aurora", "Rs 499 only", "Baga Beach, Goa", "Link in bio", "Hotel Sunrise"]
+STUB_ITEMS = [
+	{"type": "place", "item_name": "Baga Beach", "city": "Goa", "confidence": 0.8, "processing_status": "done"},
+	{"type": "hotel", "item_name": "Hotel Sunrise", "confidence": 0.7, "processing_status": "done"},
+	{"type": "product", "item_name": "Travel mug", "brand_or_category": "Cafe Aurora", "confidence": 0.6},
+]
+
+
+# ---------------------------------------------------------------- synthetic media
+
+def make_video(path: str, seconds: int, width: int, height: int, fps: int = 30) -> str:
+	import cv2
+	if os.path.exists(path):
+		return path
+	writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+	rng = np.random.default_rng(seconds * width)
+	base = rng.integers(0, 255, size=(height, width, 3), dtype=np.uint8)
+	scale = max(1.0, width / 360)
+	for i in range(seconds * fps):
+		frame = np.roll(base, i * 3, axis=1)
+		text = OVERLAYS[(i // fps) % len(OVERLAYS)]
+		cv2.rectangle(frame, (0, height // 3), (width, height // 3 + int(60 * scale)), (255, 255, 255), -1)
+		cv2.putText(frame, text, (int(20 * scale), height // 3 + int(45 * scale)), cv2.FONT_HERSHEY_SIMPLEX, 1.2 * scale, (0, 0, 0), max(2, int(2 * scale)))
+		writer.write(frame)
+	writer.release()
+	return path
+
+
+def make_audio(path: str, seconds: int, rate: int = 16000) -> str:
+	"""Mono 16 kHz WAV alternating voiced-like bursts and silence."""
+	if os.path.exists(path):
+		return path
+	t = np.arange(seconds * rate) / rate
+	envelope = (np.sin(2 * np.pi * 0.5 * t) > 0).astype(np.float64)
+	voice = np.sin(2 * np.pi * 180 * t) * (0.6 + 0.4 * np.sin(2 * np.pi * 4 * t))
+	noise = np.random.default_rng(seconds).normal(0, 0.02, t.shape)
+	pcm = np.clip((voice * envelope * 0.5 + noise) * 32767, -32768, 32767).astype(np.int16)
+	with wave.open(path, "wb") as w:
+		w.setnchannels(1)
+		w.setsampwidth(2)
+		w.setframerate(rate)
+		w.writeframes(pcm.tobytes())
+	return path
+
+
+# ---------------------------------------------------------------- local stand-ins
+
+class _StubHandler(BaseHTTPRequestHandler):
+	latency_s = 0.0
+
+	def log_message(self, *args):
+		pass
+
+	def _json(self, payload: Any) -> None:
+		body = json.dumps(payload).encode("utf-8")
+		self.send_response(200)
+		self.send_header("Content-Type", "application/json")
+		self.send_header("Content-Length", str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+
+	def do_GET(self):
+		time.sleep(self.latency_s)
+		url = urlparse(self.path)
+		q = parse_qs(url.query)
+		if url.path.endswith("/search"):
+			seed = sum(map(ord, q.get("q", [""])[0]))
+			self._json([{"lat": str(15.0 + seed % 100 / 100), "lon": str(73.0 + seed % 37 / 100)}])
+		elif url.path.endswith("/reverse"):
+			self._json({"address": {"town": "Calangute", "state": "Goa", "country": "India"}})
+		else:
+			self.send_error(404)
+
+	def do_POST(self):
+		time.sleep(self.latency_s)
+		length = int(self.headers.get("Content-Length") or 0)
+		self.rfile.read(length)
+		if not self.path.endswith("/chat/completions"):
+			self.send_error(404)
+			return
+		self._json({
+			"id": "bench",
+			"object": "chat.completion",
+			"created": int(time.time()),
+			"model": "gpt-4o-mini",
+			"choices": [{
+				"index": 0,
+				"finish_reason": "stop",
+				"message": {"role": "assistant", "content": json.dumps({"items": STUB_ITEMS})},
+			}],
+			"usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+		})
+
+
+def start_stub_server(latency_ms: float) -> ThreadingHTTPServer:
+	_StubHandler.latency_s = latency_ms / 1000.0
+	server = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+	threading.Thread(target=server.serve_forever, daemon=True).start()
+	return server
+
+
+class _Request:
+	def __init__(self, fn: Callable[[], Dict[str, Any]]):
+		self._fn = fn
+
+	def execute(self) -> Dict[str, Any]:
+		return self._fn()
+
+
+class FakeSheetsService:
+	"""In-memory stand-in for the googleapiclient Sheets v4 resource used by SheetsClient."""
+
+	def __init__(self, latency_ms: float = 0.0):
+		self.rows: List[List[Any]] = []
+		self.latency_s = latency_ms / 1000.0
+		self.lock = threading.Lock()
+
+	def spreadsheets(self):
+		return self
+
+	def values(self):
+		return self
+
+	def get(self, spreadsheetId: str, range: str):
+		def run():
+			time.sleep(self.latency_s)
+			with self.lock:
+				return {"values": [list(r) for r in (self.rows[:1] if range.endswith("1:U1") else self.rows)]}
+		return _Request(run)
+
+	def update(self, spreadsheetId: str, range: str, valueInputOption: str, body: Dict[str, Any]):
+		def run():
+			time.sleep(self.latency_s)
+			with self.lock:
+				if self.rows:
+					self.rows[0] = body["values"][0]
+				else:
+					self.rows.append(body["values"][0])
+			return {}
+		return _Request(run)
+
+	def append(self, spreadsheetId: str, range: str, valueInputOption: str, insertDataOption: str, body: Dict[str, Any]):
+		def run():
+			time.sleep(self.latency_s)
+			with self.lock:
+				start = len(self.rows) + 1
+				self.rows.extend(body["values"])
+				return {"updates": {"updatedRange": f"Sheet1!A{start}:U{len(self.rows)}"}}
+		return _Request(run)
+
+
+def fake_sheets_client(service: FakeSheetsService):
+	from src.agent.config import get_settings
+	from src.agent.sheets import SheetsClient
+	client = SheetsClient.__new__(SheetsClient)
+	client.settings = get_settings()
+	client.sheet_id = "bench"
+	client.service = service
+	client.service_account_email = "bench@example.com"
+	return client
+
+
+# ---------------------------------------------------------------- measurement
+
+def _rss_bytes() -> int:
+	try:
+		with open("/proc/self/statm") as f:
+			return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+	except (OSError, ValueError):
+		import resource
+		return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class PeakRss:
+	"""Samples process RSS in a background thread while the block runs."""
+
+	def __init__(self, interval_s: float = 0.005):
+		self.interval_s = interval_s
+		self.peak = 0
+		self._stop = threading.Event()
+
+	def _run(self):
+		while not self._stop.is_set():
+			self.peak = max(self.peak, _rss_bytes())
+			self._stop.wait(self.interval_s)
+
+	def __enter__(self):
+		self.peak = _rss_bytes()
+		self._thread = threading.Thread(target=self._run, daemon=True)
+		self._thread.start()
+		return self
+
+	def __exit__(self, *exc):
+		self._stop.set()
+		self._thread.join()
+		self.peak = max(self.peak, _rss_bytes())
+
+
+def measure(fn: Callable[[], Any], repeat: int) -> Dict[str, Any]:
+	latencies = []
+	peak = 0
+	try:
+		for _ in range(repeat):
+			with PeakRss() as rss:
+				started = time.perf_counter()
+				fn()
+				latencies.append(time.perf_counter() - started)
+			peak = max(peak, rss.peak)
+	except Exception as e:
+		return {"status": "failed", "error": f"{type(e).__name__}: {e}"[:200]}
+	return {
+		"status": "ok",
+		"latency_s": round(statistics.median(latencies), 4),
+		"latency_min_s": round(min(latencies), 4),
+		"peak_rss_mb": round(peak / 2**20, 1),
+	}
+
+
+# ---------------------------------------------------------------- stages
+
+def build_stages(video: str | None, audio: str, work_dir: str, sheets: FakeSheetsService, video_error: str = "") -> Dict[str, Callable[[], Any]]:
+	"""Stage callables for one case. Setup failures (no video, no keyframes)
+	are raised from the stages that need them, so only those are marked failed.
+	"""
+	from src.agent import media
+	from src.agent.enrich import enrich_item
+	from src.agent.llm import extract_items_with_llm
+	from src.agent.pipeline import item_to_row
+
+	frames_dir = os.path.join(work_dir, "frames")
+	frames: List[str] = []
+	frames_error = f"no video ({video_error})" if video is None else ""
+	if video is not None:
+		try:
+			frames = media.extract_keyframes(video, frames_dir)
+			frames_error = "" if frames else "no keyframes extracted"
+		except Exception as e:
+			frames_error = f"{type(e).__name__}: {e}"
+	blob = "caption: " + " / ".join(OVERLAYS)
+
+	def require(tool: str) -> None:
+		import shutil
+		if not shutil.which(tool):
+			raise RuntimeError(f"{tool} not installed")
+
+	def require_video() -> str:
+		if video is None:
+			raise RuntimeError(f"no video ({video_error})")
+		return video
+
+	def process_media():
+		require("ffmpeg")
+		media.process_media(require_video(), os.path.join(work_dir, "media"))
+
+	def keyframes():
+		if not media.extract_keyframes(require_video(), frames_dir):
+			raise RuntimeError("no keyframes extracted")
+
+	def ocr():
+		require("tesseract")
+		if frames_error:
+			raise RuntimeError(frames_error)
+		media.ocr_images(frames)
+
+	def transcribe():
+		# The synthetic audio is tones, so an empty transcript is a valid result;
+		# only a backend that can't be imported or loaded fails the stage
+		try:
+			media.transcribe_segments(audio, raise_errors=True)
+		except Exception as e:
+			raise RuntimeError(f"whisper backend unavailable: {type(e).__name__}: {e}") from e
+
+	def enrich():
+		for it in json.loads(json.dumps(STUB_ITEMS)):
+			enrich_item(it)
+
+	def sheets_write():
+		client = fake_sheets_client(sheets)
+		rows = [item_to_row(i, "2024-01-01T00:00:00", "https://www.instagram.com/reel/bench/", it) for i, it in enumerate(STUB_ITEMS, start=1)]
+		client.append_rows(rows)
+
+	return {
+		"process_media": process_media,
+		"extract_keyframes": keyframes,
+		"ocr_images": ocr,
+		"transcribe_audio": transcribe,
+		"llm_extract": lambda: extract_items_with_llm(blob),
+		"enrich": enrich,
+		"sheets_write": sheets_write,
+	}
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+	server = start_stub_server(args.stub_latency_ms)
+	base = f"http://127.0.0.1:{server.server_address[1]}"
+	os.environ["OPENAI_BASE_URL"] = base + "/v1"
+	# src.agent is only imported below this point, so Settings picks this up
+	os.environ["NOMINATIM_URL"] = base
+	from src.agent.logging_setup import configure_logging
+	configure_logging(os.environ["LOG_LEVEL"])
+
+	work_root = args.work_dir or os.path.join(tempfile.gettempdir(), "reel_bench")
+	os.makedirs(work_root, exist_ok=True)
+	cases = QUICK_CASES if args.quick else CASES
+	selected = set(args.stages.split(",")) if args.stages else None
+	results: Dict[str, Any] = {"meta": {
+		"python": sys.version.split()[0],
+		"cpu_count": os.cpu_count(),
+		"repeat": args.repeat,
+		"stub_latency_ms": args.stub_latency_ms,
+		"started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+	}, "stages": {}, "throughput": {}}
+
+	for name, seconds, width, height in cases:
+		case_dir = os.path.join(work_root, name)
+		os.makedirs(case_dir, exist_ok=True)
+		video, video_error = None, ""
+		try:
+			video = make_video(os.path.join(case_dir, "video.mp4"), seconds, width, height)
+		except Exception as e:
+			video_error = f"{type(e).__name__}: {e}"
+		audio = make_audio(os.path.join(case_dir, "audio.wav"), seconds)
+		sheets = FakeSheetsService(args.stub_latency_ms)
+		stages = build_stages(video, audio, case_dir, sheets, video_error)
+		for stage, fn in stages.items():
+			if selected and stage not in selected:
+				continue
+			res = measure(fn, args.repeat)
+			results["stages"][f"{name}/{stage}"] = res
+			print(f"{name:>12} {stage:>18}  " + (f"{res['latency_s']*1000:9.1f} ms  peak {res['peak_rss_mb']:7.1f} MB" if res["status"] == "ok" else res["error"]), flush=True)
+
+		# Throughput: the offline chain (no whisper/ffmpeg) run by N threads at once
+		chain = [stages[s] for s in ("extract_keyframes", "ocr_images", "llm_extract", "enrich", "sheets_write") if not selected or s in selected]
+		usable = []
+		for fn in chain:
+			try:
+				fn()
+				usable.append(fn)
+			except Exception:
+				pass
+
+		def job():
+			for fn in usable:
+				fn()
+
+		for level in args.concurrency:
+			n_jobs = level * args.jobs_per_worker
+			with PeakRss() as rss:
+				started = time.perf_counter()
+				with ThreadPoolExecutor(max_workers=level) as pool:
+					list(pool.map(lambda _: job(), range(n_jobs)))
+				elapsed = time.perf_counter() - started
+			results["throughput"][f"{name}/c{level}"] = {
+				"jobs": n_jobs,
+				"jobs_per_s": round(n_jobs / elapsed, 3) if elapsed else math.inf,
+				"peak_rss_mb": round(rss.peak / 2**20, 1),
+			}
+			print(f"{name:>12} {'concurrency=' + str(level):>18}  {n_jobs / elapsed:9.2f} jobs/s  peak {rss.peak / 2**20:7.1f} MB", flush=True)
+
+	server.shutdown()
+	return results
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+	"""Human-readable regressions: latency up or throughput down by more than `tolerance`."""
+	regressions = []
+	for key, cur in current["stages"].items():
+		old = baseline.get("stages", {}).get(key)
+		if not old or cur.get("status") != "ok" or old.get("status") != "ok" or not old["latency_s"]:
+			continue
+		ratio = cur["latency_s"] / old["latency_s"]
+		if ratio > 1 + tolerance:
+			regressions.append(f"{key}: latency {old['latency_s']:.4f}s -> {cur['latency_s']:.4f}s (x{ratio:.2f})")
+	for key, cur in current["throughput"].items():
+		old = baseline.get("throughput", {}).get(key)
+		if not old or not old["jobs_per_s"]:
+			continue
+		ratio = cur["jobs_per_s"] / old["jobs_per_s"]
+		if ratio < 1 - tolerance:
+			regressions.append(f"{key}: throughput {old['jobs_per_s']:.3f} -> {cur['jobs_per_s']:.3f} jobs/s (x{ratio:.2f})")
+	return regressions
+
+
+def main(argv: List[str] | None = None) -> int:
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument("--quick", action="store_true", help="one short low-res case instead of the full matrix")
+	parser.add_argument("--stages", help="comma-separated subset of stages to run")
+	parser.add_argument("--repeat", type=int, default=3)
+	parser.add_argument("--concurrency", type=lambda s: [int(x) for x in s.split(",")], default=[1, 2, 4])
+	parser.add_argument("--jobs-per-worker", type=int, default=2)
+	parser.add_argument("--stub-latency-ms", type=float, default=0.0, help="artificial latency of LLM/Nominatim/Sheets stand-ins")
+	parser.add_argument("--work-dir", help="where generated media is cached (default: $TMPDIR/reel_bench)")
+	parser.add_argument("--save", metavar="NAME", help=f"save results as a baseline in {BASELINE_DIR}")
+	parser.add_argument("--compare", metavar="NAME", help="compare against a saved baseline; exit 1 on regression")
+	parser.add_argument("--tolerance", type=float, default=0.2)
+	parser.add_argument("--output", help="also write the raw results JSON here")
+	args = parser.parse_args(argv)
+	baseline_path = os.path.join(BASELINE_DIR, f"{args.compare}.json") if args.compare else None
+	if baseline_path and not os.path.exists(baseline_path):
+		parser.error(f"no baseline {baseline_path}; create it with --save {args.compare} on the tree to compare against")
+
+	results = run(args)
+	if args.output:
+		with open(args.output, "w", encoding="utf-8") as f:
+			json.dump(results, f, indent=1)
+	if args.save:
+		os.makedirs(BASELINE_DIR, exist_ok=True)
+		with open(os.path.join(BASELINE_DIR, f"{args.save}.json"), "w", encoding="utf-8") as f:
+			json.dump(results, f, indent=1)
+	if args.compare:
+		with open(baseline_path, "r", encoding="utf-8") as f:
+			baseline = json.load(f)
+		regressions = compare(results, baseline, args.tolerance)
+		for line in regressions:
+			print("REGRESSION " + line)
+		if regressions:
+			return 1
+		print(f"No regressions beyond {args.tolerance:.0%} vs baseline '{args.compare}'.")
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
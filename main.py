@@ -4,33 +4,43 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
-# Mode: bot | api | both
+# Mode: bot | api | both | worker
 MODE = os.getenv("BOT_MODE", "both").lower()
 
 async def run_bot():
 	from src.agent.bot import run_telegram_bot
 	await run_telegram_bot()
 
-async def run_api():
+# With a public URL, the bot receives updates through the API's webhook route instead of polling
+WEBHOOK = bool(os.getenv("TELEGRAM_WEBHOOK_URL"))
+
+async def run_api(telegram_webhook: bool = False):
 	import uvicorn
 	from src.agent.api import app
+	app.state.telegram_webhook = telegram_webhook
 	config = uvicorn.Config(app, host="0.0.0.0", port=int(os.getenv("PORT", 8080)), log_level="info")
 	server = uvicorn.Server(config)
 	await server.serve()
 
 async def main():
 	tasks = []
-	if MODE in ("bot", "both"):
+	bot = MODE in ("bot", "both")
+	if bot and not WEBHOOK:
 		tasks.append(asyncio.create_task(run_bot()))
-	if MODE in ("api", "both"):
-		tasks.append(asyncio.create_task(run_api()))
+	if MODE in ("api", "both") or (bot and WEBHOOK):
+		tasks.append(asyncio.create_task(run_api(telegram_webhook=bot and WEBHOOK)))
 	if not tasks:
-		print("Nothing to run. Set BOT_MODE to bot|api|both.")
+		print("Nothing to run. Set BOT_MODE to bot|api|both|worker.")
 		return
 	await asyncio.gather(*tasks)
 
 if __name__ == "__main__":
-	try:
-		asyncio.run(main())
-	except KeyboardInterrupt:
-		pass
+	if MODE == "worker":
+		# Plain threads, no event loop: pulls jobs from the shared job store (JOB_QUEUE)
+		from src.agent.worker import run_worker
+		run_worker()
+	else:
+		try:
+			asyncio.run(main())
+		except KeyboardInterrupt:
+			pass
@@ -1,16 +1,43 @@
 from __future__ import annotations
 import os
-from fastapi import FastAPI, Query, Response
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Query, Request, Response
 from fastapi.responses import PlainTextResponse, StreamingResponse
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 
 from .config import get_settings
 from .logging_setup import configure_logging
+from .jobs import get_job_store
 from .sheets import SheetsClient
+from .utils import is_valid_reel_url
+from . import tracing  # noqa: F401  registers pipeline metrics on the default registry
 
 
 settings = get_settings()
 configure_logging(settings.log_level)
-app = FastAPI(title="Reel Extractor AI Agent")
+
+TELEGRAM_WEBHOOK_PATH = "/telegram/webhook"
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+	# main.py sets telegram_webhook when the bot should be served from this app (webhook mode)
+	bot_app = None
+	if getattr(app.state, "telegram_webhook", False):
+		from .bot import start_webhook_bot
+		bot_app = await start_webhook_bot(settings.telegram_webhook_url.rstrip("/") + TELEGRAM_WEBHOOK_PATH)
+	app.state.telegram = bot_app
+	try:
+		yield
+	finally:
+		app.state.telegram = None
+		if bot_app is not None:
+			from .bot import stop_webhook_bot
+			await stop_webhook_bot(bot_app)
+
+
+app = FastAPI(title="Reel Extractor AI Agent", lifespan=lifespan)
 
 
 @app.get("/health")
@@ -18,6 +45,57 @@ def health():
 	return {"status": "ok"}
 
 
+@app.post(TELEGRAM_WEBHOOK_PATH)
+async def telegram_webhook(request: Request):
+	bot_app = getattr(app.state, "telegram", None)
+	if bot_app is None:
+		return Response(status_code=404)
+	if request.headers.get("X-Telegram-Bot-Api-Secret-Token") != bot_app.bot_data["webhook_secret"]:
+		return Response(status_code=403)
+	from .bot import feed_update
+	# Acknowledge right away; handlers run as background tasks on this loop
+	await feed_update(bot_app, await request.json())
+	return Response(status_code=200)
+
+
+@app.post("/jobs")
+def create_job(
+	reel_url: str = Query(...),
+	lat: float | None = Query(None, ge=-90, le=90),
+	lng: float | None = Query(None, ge=-180, le=180),
+):
+	if not settings.job_queue:
+		# Nothing would ever run the job
+		return Response(status_code=503, content="Job queue is disabled (JOB_QUEUE=false).")
+	if not is_valid_reel_url(reel_url):
+		return Response(status_code=422, content="Not an Instagram reel URL.")
+	store = get_job_store(settings)
+	job_id = store.enqueue(reel_url, {"origin_lat": lat, "origin_lng": lng})
+	return {"job_id": job_id, "status": "queued", "position": store.position(job_id)}
+
+
+@app.get("/jobs/{job_id}")
+def job_status(job_id: str):
+	store = get_job_store(settings)
+	job = store.get(job_id)
+	if job is None:
+		return Response(status_code=404, content="Unknown job.")
+	return {
+		"job_id": job["id"],
+		"status": job["status"],
+		"position": store.position(job_id),
+		"attempts": job["attempts"],
+		"progress": job["progress"],
+		"result": job["result"],
+		"error": job["error"],
+	}
+
+
+@app.get("/metrics")
+def metrics():
+	return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
 @app.get("/summary", response_class=PlainTextResponse)
 def summary(n: int = Query(10, ge=1, le=100)):
 	client = SheetsClient()
@@ -34,3 +112,52 @@ def download():
 	return StreamingResponse(open(backup, "rb"), media_type="text/csv", headers={
 		"Content-Disposition": "attachment; filename=backup.csv"
 	})
+
+
+@app.get("/archive/items")
+def archive_items(
+	columns: str | None = Query(None, description="comma-separated archive columns"),
+	type: list[str] | None = Query(None),
+	country: list[str] | None = Query(None),
+	since: str | None = Query(None, pattern=r"^\d{4}-\d{2}-\d{2}$"),
+	until: str | None = Query(None, pattern=r"^\d{4}-\d{2}-\d{2}$"),
+	min_confidence: float | None = Query(None, ge=0, le=1),
+	limit: int = Query(100, ge=1, le=10000),
+):
+	from .archive import get_archive
+	try:
+		table = get_archive(settings).query(
+			columns=columns.split(",") if columns else None,
+			item_type=type,
+			country=country,
+			since=since,
+			until=until,
+			min_confidence=min_confidence,
+			limit=limit,
+		)
+	except ValueError as e:
+		return Response(status_code=422, content=str(e))
+	return table.to_pylist()
+
+
+@app.get("/nearby")
+def nearby(
+	lat: float = Query(..., ge=-90, le=90),
+	lng: float = Query(..., ge=-180, le=180),
+	km: float = Query(25.0, gt=0, le=20000),
+	limit: int = Query(20, ge=1, le=500),
+):
+	from .geo import load_backup_index
+	index = load_backup_index(os.path.join(settings.temp_dir, "backup.csv"))
+	hits = index.within(lat, lng, km)[:limit]
+	return [
+		{
+			"item_name": row.get("Item Name"),
+			"item_type": row.get("Item Type"),
+			"city": row.get("City"),
+			"country": row.get("Country"),
+			"reel_link": row.get("Reel Link"),
+			"distance_km": dist,
+		}
+		for row, dist in hits
+	]
@@ -0,0 +1,385 @@
+from __future__ import annotations
+import argparse
+import csv
+import functools
+import json
+import os
+import re
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+
+from .logging_setup import logger
+from .utils import ensure_dir, file_lock, SHEET_HEADERS
+
+
+# Column types for the sheet headers; anything not listed is a string
+_TYPES = {
+	"Index": "int64",
+	"Timestamp": "timestamp",
+	"Item Index": "int32",
+	"Lat": "float64",
+	"Lng": "float64",
+	"Distance_km": "float64",
+	"Confidence": "float64",
+}
+# Low-cardinality columns are dictionary-encoded and sorted on, so row-group
+# statistics let type/country filters skip most of each file
+_SORT_KEYS = ("item_type", "country", "timestamp")
+
+PARTITION = "date"
+# Per partition: {merged file: [input files it replaced]}. Inputs listed under a
+# merged file that exists are ignored by readers and deleted by the next compaction.
+_REPLACED = "_replaced.json"
+
+
+def column_name(header: str) -> str:
+	"""Archive column for a sheet header: "Brand/Category" -> "brand_category"."""
+	return re.sub(r"[^0-9a-z]+", "_", header.lower()).strip("_")
+
+
+COLUMNS = [column_name(h) for h in SHEET_HEADERS]
+
+
+def archive_schema():
+	import pyarrow as pa
+	types = {
+		"int64": pa.int64(),
+		"int32": pa.int32(),
+		"float64": pa.float64(),
+		"timestamp": pa.timestamp("us"),
+		"string": pa.string(),
+	}
+	return pa.schema([pa.field(column_name(h), types[_TYPES.get(h, "string")]) for h in SHEET_HEADERS])
+
+
+def _cast(value: Any, kind: str) -> Any:
+	if value is None or value == "":
+		return None
+	try:
+		if kind in ("int64", "int32"):
+			return int(float(value))
+		if kind == "float64":
+			return float(value)
+		if kind == "timestamp":
+			return value if isinstance(value, datetime) else datetime.fromisoformat(str(value))
+	except (TypeError, ValueError):
+		return None
+	if isinstance(value, (list, dict)):
+		return json.dumps(value, ensure_ascii=False)
+	return str(value)
+
+
+def rows_to_columns(rows: Iterable[Sequence[Any]]) -> Dict[str, List[Any]]:
+	"""Sheet-shaped rows (see SHEET_HEADERS) -> typed column lists."""
+	kinds = [_TYPES.get(h, "string") for h in SHEET_HEADERS]
+	cols: Dict[str, List[Any]] = {c: [] for c in COLUMNS}
+	for row in rows:
+		row = list(row[:len(COLUMNS)]) + [None] * (len(COLUMNS) - len(row))
+		for name, kind, value in zip(COLUMNS, kinds, row):
+			cols[name].append(_cast(value, kind))
+	return cols
+
+
+class ItemArchive:
+	"""Append-only Parquet archive of sheet rows, hive-partitioned by day.
+
+	Every append writes one small zstd file into `date=YYYY-MM-DD/`; once a
+	partition holds `compact_files` files a background thread merges them into
+	one, sorted so that row-group statistics prune type/country filters. Queries
+	read only the requested columns and only the partitions/row groups the
+	filter can match.
+	"""
+
+	def __init__(self, root: str, compact_files: int = 32, row_group_size: int = 64_000):
+		self.root = root
+		self.compact_files = compact_files
+		self.row_group_size = row_group_size
+		ensure_dir(root)
+
+	def _partition_dir(self, day: str) -> str:
+		return os.path.join(self.root, f"{PARTITION}={day}")
+
+	def _replaced(self, part_dir: str) -> Dict[str, List[str]]:
+		try:
+			with open(os.path.join(part_dir, _REPLACED), "r", encoding="utf-8") as f:
+				return json.load(f)
+		except FileNotFoundError:
+			return {}
+		except (OSError, ValueError) as e:
+			logger.warn("archive.replaced.unreadable", dir=part_dir, error=str(e))
+			return {}
+
+	def _save_replaced(self, part_dir: str, replaced: Dict[str, List[str]]) -> None:
+		path = os.path.join(part_dir, _REPLACED)
+		if not replaced:
+			if os.path.exists(path):
+				os.remove(path)
+			return
+		tmp = os.path.join(part_dir, f".{_REPLACED}.tmp")
+		with open(tmp, "w", encoding="utf-8") as f:
+			json.dump(replaced, f)
+		os.replace(tmp, path)
+
+	def _data_files(self, part_dir: str) -> List[str]:
+		"""Live data files of a partition: not temp files, not already merged away."""
+		if not os.path.isdir(part_dir):
+			return []
+		# Read the record before listing: a merged file is only renamed in after
+		# its inputs were recorded, so seeing it means seeing its record too
+		replaced = self._replaced(part_dir)
+		names = {f for f in os.listdir(part_dir) if f.endswith(".parquet") and not f.startswith((".", "_"))}
+		gone = {f for merged, inputs in replaced.items() if merged in names for f in inputs}
+		return sorted(os.path.join(part_dir, f) for f in names - gone)
+
+	def _write_tmp(self, table, part_dir: str, prefix: str) -> Tuple[str, str]:
+		"""Write `table` under a temp name; returns (temp path, final path)."""
+		import pyarrow.parquet as pq
+		ensure_dir(part_dir)
+		name = f"{prefix}-{datetime.utcnow():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}.parquet"
+		# Dot-prefixed temp names are ignored by readers until the rename
+		tmp = os.path.join(part_dir, f".{name}.tmp")
+		pq.write_table(
+			table,
+			tmp,
+			compression="zstd",
+			row_group_size=self.row_group_size,
+			use_dictionary=["item_type", "country", "state", "city", "price_source", "processing_status"],
+		)
+		return tmp, os.path.join(part_dir, name)
+
+	def _write(self, table, part_dir: str, prefix: str) -> str:
+		tmp, path = self._write_tmp(table, part_dir, prefix)
+		os.replace(tmp, path)
+		return path
+
+	def append_rows(self, rows: Sequence[Sequence[Any]]) -> int:
+		"""Archive sheet-shaped rows; returns how many were written."""
+		import pyarrow as pa
+		if not rows:
+			return 0
+		table = pa.table(rows_to_columns(rows), schema=archive_schema())
+		days: Dict[str, List[int]] = {}
+		for i, ts in enumerate(table.column("timestamp").to_pylist()):
+			days.setdefault((ts or datetime.utcnow()).date().isoformat(), []).append(i)
+		for day, idx in days.items():
+			part = table.take(pa.array(idx)).sort_by([(k, "ascending") for k in _SORT_KEYS])
+			part_dir = self._partition_dir(day)
+			self._write(part, part_dir, "part")
+			if len(self._data_files(part_dir)) >= self.compact_files:
+				self._compact_later(day)
+		logger.info("archive.appended", rows=table.num_rows, partitions=len(days))
+		return table.num_rows
+
+	def compact(self, day: str | None = None) -> int:
+		"""Merge each partition's files (or just `day`'s) into one; returns files merged.
+
+		Compactions of the same root are serialized across threads and processes.
+		The inputs are recorded in the partition's `_replaced.json` before the
+		merged file is renamed in, so readers never count a row twice, and inputs
+		left behind by an interrupted compaction are deleted by the next one.
+		"""
+		return self._compact([day] if day else None, min_files=2)
+
+	def _compact_later(self, day: str) -> None:
+		key = (os.path.abspath(self.root), day)
+		with _queued_lock:
+			if key in _queued:
+				return
+			_queued.add(key)
+
+		def run() -> None:
+			with _queued_lock:
+				_queued.discard(key)
+			try:
+				self._compact([day], min_files=self.compact_files)
+			except Exception as e:
+				logger.warn("archive.compact.failed", date=day, error=str(e))
+
+		_compactor().submit(run)
+
+	def _drop_replaced(self, part_dir: str) -> None:
+		# Finish what an earlier compaction started: delete inputs whose merged
+		# file exists, forget records whose merged file never got renamed in
+		replaced = self._replaced(part_dir)
+		if not replaced:
+			return
+		for merged, inputs in replaced.items():
+			if not os.path.exists(os.path.join(part_dir, merged)):
+				continue
+			for f in inputs:
+				try:
+					os.remove(os.path.join(part_dir, f))
+				except FileNotFoundError:
+					pass
+		self._save_replaced(part_dir, {})
+
+	def _compact(self, days: List[str] | None, min_files: int) -> int:
+		import pyarrow as pa
+		import pyarrow.parquet as pq
+		removed = 0
+		# Archives are recreated per backup, so the lock is on a file under the
+		# root, shared by every instance and process
+		with file_lock(os.path.join(self.root, ".compact.lock")):
+			for d in days or self.partitions():
+				part_dir = self._partition_dir(d)
+				self._drop_replaced(part_dir)
+				# Listed under the lock: another appender may have compacted already
+				files = self._data_files(part_dir)
+				if len(files) < min_files:
+					continue
+				tables, merged = [], []
+				for f in files:
+					try:
+						tables.append(pq.read_table(f, schema=archive_schema()))
+						merged.append(f)
+					except FileNotFoundError:
+						# Removed by something not holding the lock; nothing to merge
+						continue
+				if len(merged) < 2:
+					continue
+				table = pa.concat_tables(tables)
+				tmp, path = self._write_tmp(table.sort_by([(k, "ascending") for k in _SORT_KEYS]), part_dir, "compact")
+				self._save_replaced(part_dir, {os.path.basename(path): [os.path.basename(f) for f in merged]})
+				os.replace(tmp, path)
+				self._drop_replaced(part_dir)
+				removed += len(merged)
+				logger.info("archive.compacted", date=d, files=len(merged), rows=table.num_rows)
+		return removed
+
+	def partitions(self) -> List[str]:
+		prefix = f"{PARTITION}="
+		return sorted(d[len(prefix):] for d in os.listdir(self.root) if d.startswith(prefix))
+
+	def query(
+		self,
+		columns: Sequence[str] | None = None,
+		item_type: str | Sequence[str] | None = None,
+		country: str | Sequence[str] | None = None,
+		since: date | str | None = None,
+		until: date | str | None = None,
+		min_confidence: float | None = None,
+		limit: int | None = None,
+	):
+		"""Filtered, projected scan as a pyarrow Table.
+
+		`since`/`until` are inclusive days and prune whole partitions; the other
+		filters are pushed down to Parquet row-group statistics.
+		"""
+		import pyarrow as pa
+		import pyarrow.dataset as ds
+		columns = list(columns) if columns else list(COLUMNS)
+		unknown = [c for c in columns if c not in COLUMNS]
+		if unknown:
+			raise ValueError(f"Unknown archive column(s): {', '.join(unknown)}")
+		schema = archive_schema()
+		# Partition values are ISO dates, so string comparison orders them correctly
+		days = [d for d in self.partitions() if (not since or d >= str(since)[:10]) and (not until or d <= str(until)[:10])]
+		files = [f for d in days for f in self._data_files(self._partition_dir(d))]
+		if not files:
+			return schema.empty_table().select(columns)
+		dataset = ds.dataset(
+			files,
+			schema=schema.append(pa.field(PARTITION, pa.string())),
+			format="parquet",
+			partitioning=ds.partitioning(pa.schema([(PARTITION, pa.string())]), flavor="hive"),
+			partition_base_dir=self.root,
+		)
+		expr = None
+
+		def both(e):
+			return e if expr is None else expr & e
+
+		for name, value in (("item_type", item_type), ("country", country)):
+			if value:
+				values = [value] if isinstance(value, str) else list(value)
+				expr = both(ds.field(name).isin(values))
+		if min_confidence is not None:
+			expr = both(ds.field("confidence") >= min_confidence)
+		if limit:
+			return dataset.head(limit, columns=columns, filter=expr)
+		return dataset.to_table(columns=columns, filter=expr)
+
+	def import_csv(self, path: str, batch_size: int = 50_000) -> int:
+		"""Backfill from a backup.csv written by `local_csv_backup`."""
+		total = 0
+		with open(path, newline="", encoding="utf-8") as f:
+			reader = csv.reader(f)
+			batch: List[List[str]] = []
+			for row in reader:
+				if row and row[0] == "Index":
+					continue
+				batch.append(row)
+				if len(batch) >= batch_size:
+					total += self.append_rows(batch)
+					batch = []
+			if batch:
+				total += self.append_rows(batch)
+		self.compact()
+		return total
+
+
+_queued: set = set()
+_queued_lock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=1)
+def _compactor() -> ThreadPoolExecutor:
+	# One thread: compactions take the root's lock anyway, and appends never wait on them
+	return ThreadPoolExecutor(max_workers=1, thread_name_prefix="archive-compact")
+
+
+def wait_for_compactions() -> None:
+	"""Block until compactions queued by append_rows have finished."""
+	_compactor().submit(lambda: None).result()
+
+
+def get_archive(settings) -> ItemArchive:
+	return ItemArchive(
+		settings.archive_path or os.path.join(settings.temp_dir, "archive"),
+		compact_files=settings.archive_compact_files,
+	)
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+	from .config import get_settings
+	parser = argparse.ArgumentParser(prog="python -m src.agent.archive", description="Query or maintain the Parquet item archive.")
+	sub = parser.add_subparsers(dest="cmd", required=True)
+	q = sub.add_parser("query")
+	q.add_argument("--columns", help="comma-separated, e.g. item_name,city,country")
+	q.add_argument("--type", dest="item_type", action="append")
+	q.add_argument("--country", action="append")
+	q.add_argument("--since")
+	q.add_argument("--until")
+	q.add_argument("--min-confidence", type=float)
+	q.add_argument("--limit", type=int, default=50)
+	sub.add_parser("compact")
+	imp = sub.add_parser("import-csv")
+	imp.add_argument("path", nargs="?", help="default: $TEMP_DIR/backup.csv")
+	args = parser.parse_args(argv)
+
+	settings = get_settings()
+	archive = get_archive(settings)
+	if args.cmd == "compact":
+		print(f"removed {archive.compact()} file(s)")
+	elif args.cmd == "import-csv":
+		path = args.path or os.path.join(settings.temp_dir, "backup.csv")
+		print(f"imported {archive.import_csv(path)} row(s)")
+	else:
+		table = archive.query(
+			columns=args.columns.split(",") if args.columns else None,
+			item_type=args.item_type,
+			country=args.country,
+			since=args.since,
+			until=args.until,
+			min_confidence=args.min_confidence,
+			limit=args.limit,
+		)
+		for row in table.to_pylist():
+			print(json.dumps(row, default=str, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+	main()
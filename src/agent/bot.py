@@ -1,13 +1,16 @@
 from __future__ import annotations
 import asyncio
+import hashlib
 import os
+import time
 from io import BytesIO
-from typing import Optional
+from typing import Any, Awaitable, Dict, Optional
 
 from telegram import Update, InputFile
 from telegram.ext import (
 	Application,
 	ApplicationBuilder,
+	BaseUpdateProcessor,
 	CommandHandler,
 	MessageHandler,
 	ContextTypes,
@@ -15,12 +18,51 @@ from telegram.ext import (
 )
 
 from .config import get_settings
+from .jobs import get_job_store
 from .logging_setup import configure_logging, logger
 from .pipeline import process_reel_url
+from .scheduler import Overloaded, get_admission
 from .sheets import SheetsClient
 from .utils import is_valid_reel_url
 
 
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+	"""Run updates from different chats concurrently, but one at a time and in
+	arrival order within a chat, so a user's messages are answered in the order sent.
+	"""
+
+	def __init__(self, max_concurrent_updates: int):
+		super().__init__(max_concurrent_updates)
+		self._chat_locks: Dict[int, asyncio.Lock] = {}
+		self._chat_pending: Dict[int, int] = {}
+
+	async def process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+		chat = update.effective_chat if isinstance(update, Update) else None
+		if chat is None:
+			await super().process_update(update, coroutine)
+			return
+		# Take the chat lock before a global slot, so a backlog in one chat can't starve the others
+		lock = self._chat_locks.setdefault(chat.id, asyncio.Lock())
+		self._chat_pending[chat.id] = self._chat_pending.get(chat.id, 0) + 1
+		try:
+			async with lock:
+				await super().process_update(update, coroutine)
+		finally:
+			self._chat_pending[chat.id] -= 1
+			if not self._chat_pending[chat.id]:
+				del self._chat_pending[chat.id]
+				del self._chat_locks[chat.id]
+
+	async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+		await coroutine
+
+	async def initialize(self) -> None:
+		pass
+
+	async def shutdown(self) -> None:
+		pass
+
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
 	await update.message.reply_text(
 		"Hi! 👋\n\n"
@@ -96,13 +138,76 @@ async def sheet(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
 		message += "\n💡 Tip: Click the links above to open your spreadsheets in Google Sheets."
 		await update.message.reply_text(message)
 
+def _failure_text(error_type: str, error_msg: str) -> str:
+	if error_type == "ValueError":
+		return f"⚠️ Validation error: {error_msg}"
+	if error_type == "PermissionError":
+		# Send the helpful error message about sharing the sheet
+		return f"⚠️ {error_msg[:1000]}"
+	if error_type == "FileNotFoundError":
+		return "⚠️ File not found error. Check Docker logs for details."
+	# Truncate long error messages but keep important parts
+	if len(error_msg) > 500:
+		error_msg = error_msg[:500] + "... (see logs for full error)"
+	return f"⚠️ Failed to process: {error_msg}"
+
+
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
 	text = update.message.text or ""
 	if not is_valid_reel_url(text):
 		return
-	await update.message.reply_text("Processing… This may take up to ~1-2 minutes.")
+	settings = get_settings()
+	if settings.job_queue:
+		# Heavy work happens in BOT_MODE=worker processes; this process only enqueues and reports
+		store = get_job_store(settings)
+		job_id = await asyncio.to_thread(store.enqueue, text, {"chat_id": update.effective_chat.id})
+		position = await asyncio.to_thread(store.position, job_id)
+		await update.message.reply_text(f"📥 Queued (position {position}). I'll report back when it's done.")
+		context.application.create_task(_report_job(update, job_id))
+		return
+	loop = asyncio.get_running_loop()
+	admitted = loop.create_future()
+
+	def on_admit() -> None:
+		loop.call_soon_threadsafe(lambda: admitted.done() or admitted.set_result(None))
+
+	try:
+		ticket = get_admission().join(on_admit)
+	except Overloaded as e:
+		logger.warn("bot.process.rejected", reason=str(e))
+		await update.message.reply_text("⏳ I'm at capacity right now. Please send the link again in a few minutes.")
+		return
+	position = ticket.position()
+	if position:
+		await update.message.reply_text(f"⏳ Queued, position {position}. I'll start as soon as a slot frees up.")
+	# Runs in the background so a long queue doesn't hold the update-processing slots
+	context.application.create_task(_process_admitted(update, text, ticket, admitted))
+
+
+async def _process_admitted(update: Update, text: str, ticket, admitted: asyncio.Future) -> None:
+	try:
+		# Wait on the loop, not in a thread: queued reels must not tie up the to_thread pool
+		await admitted
+		await update.message.reply_text("Processing… This may take up to ~1-2 minutes.")
+		await _process_inline(update, text)
+	finally:
+		ticket.leave()
+
+
+async def _process_inline(update: Update, text: str) -> None:
+	loop = asyncio.get_running_loop()
+
+	def on_update(kind: str, result) -> None:
+		# Called from the pipeline thread once caption-only rows are in the sheet
+		if kind == "provisional":
+			start_idx, end_idx, items = result
+			asyncio.run_coroutine_threadsafe(update.message.reply_text(
+				f"⚡ Added {len(items)} provisional item(s) from the caption. Rows: {start_idx}-{end_idx}\n"
+				f"Refining with transcript/OCR…"
+			), loop)
+
 	try:
-		start_idx, end_idx, items = process_reel_url(text)
+		start_idx, end_idx, items = await asyncio.to_thread(process_reel_url, text, on_update=on_update)
 		count = len(items)
 		await update.message.reply_text(
 			f"✅ Done — added {count} item(s) to sheet. Rows: {start_idx}-{end_idx}\n\n"
@@ -110,30 +215,73 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
 		)
 	except ValueError as e:
 		logger.error("bot.process.validation.failed", error=str(e))
-		await update.message.reply_text(f"⚠️ Validation error: {str(e)}")
+		await update.message.reply_text(_failure_text("ValueError", str(e)))
 	except PermissionError as e:
 		logger.error("bot.process.permission.failed", error=str(e))
-		# Send the helpful error message about sharing the sheet
-		error_msg = str(e)
-		await update.message.reply_text(f"⚠️ {error_msg[:1000]}")
+		await update.message.reply_text(_failure_text("PermissionError", str(e)))
 	except FileNotFoundError as e:
 		logger.error("bot.process.file_not_found", error=str(e))
-		await update.message.reply_text("⚠️ File not found error. Check Docker logs for details.")
+		await update.message.reply_text(_failure_text("FileNotFoundError", str(e)))
 	except Exception as e:
 		logger.error("bot.process.failed", error=str(e), error_type=type(e).__name__)
-		error_msg = str(e)
-		# Truncate long error messages but keep important parts
-		if len(error_msg) > 500:
-			error_msg = error_msg[:500] + "... (see logs for full error)"
-		await update.message.reply_text(f"⚠️ Failed to process: {error_msg}")
+		await update.message.reply_text(_failure_text(type(e).__name__, str(e)))
 
 
-async def run_telegram_bot() -> None:
+async def _report_job(update: Update, job_id: str) -> None:
+	"""Follow a queued job in the shared store and relay its progress/outcome to the chat.
+
+	Gives up after JOB_REPORT_TIMEOUT, so a queue nobody works on doesn't
+	leave a poller running per message forever.
+	"""
 	settings = get_settings()
-	configure_logging(settings.log_level)
+	store = get_job_store(settings)
+	reported_progress = False
+	deadline = time.monotonic() + settings.job_report_timeout
+	while True:
+		await asyncio.sleep(settings.worker_poll_interval)
+		job = await asyncio.to_thread(store.get, job_id)
+		if job is None:
+			return
+		if time.monotonic() > deadline and job["status"] in ("queued", "running"):
+			logger.warn("bot.job.report.timeout", job_id=job_id, status=job["status"])
+			if job["status"] == "queued":
+				await update.message.reply_text("⌛ No worker has picked this reel up yet. Please send the link again later.")
+			else:
+				await update.message.reply_text("⌛ This reel is taking longer than usual; its rows will still appear in the sheet when it finishes.")
+			return
+		progress = job.get("progress")
+		if progress and not reported_progress:
+			reported_progress = True
+			await update.message.reply_text(
+				f"⚡ Added {progress['count']} provisional item(s) from the caption. Rows: {progress['start_index']}-{progress['end_index']}\n"
+				f"Refining with transcript/OCR…"
+			)
+		if job["status"] == "done":
+			result = job["result"]
+			await update.message.reply_text(
+				f"✅ Done — added {result['count']} item(s) to sheet. Rows: {result['start_index']}-{result['end_index']}\n\n"
+				f"📊 Use /sheet to view your spreadsheet"
+			)
+			return
+		if job["status"] == "failed":
+			await update.message.reply_text(_failure_text(job.get("error_type") or "", job.get("error") or ""))
+			return
+
+
+def build_application(settings, updater: bool = True) -> Application:
 	if not settings.telegram_token:
 		raise RuntimeError("TELEGRAM_TOKEN not set")
-	app: Application = ApplicationBuilder().token(settings.telegram_token).build()
+	builder = (
+		ApplicationBuilder()
+		.token(settings.telegram_token)
+		.concurrent_updates(ChatOrderedUpdateProcessor(max(1, settings.bot_concurrent_updates)))
+	)
+	if settings.telegram_api_url:
+		base = settings.telegram_api_url.rstrip("/")
+		builder = builder.base_url(f"{base}/bot").base_file_url(f"{base}/file/bot")
+	if not updater:
+		builder = builder.updater(None)
+	app: Application = builder.build()
 	app.add_handler(CommandHandler("start", start))
 	app.add_handler(CommandHandler("help", help_cmd))
 	app.add_handler(CommandHandler("health", health))
@@ -141,6 +289,51 @@ async def run_telegram_bot() -> None:
 	app.add_handler(CommandHandler("download", download))
 	app.add_handler(CommandHandler("sheet", sheet))
 	app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
+	return app
+
+
+def webhook_secret(settings) -> str:
+	"""Secret Telegram echoes in X-Telegram-Bot-Api-Secret-Token; derived from the token unless set."""
+	if settings.telegram_webhook_secret:
+		return settings.telegram_webhook_secret
+	return hashlib.sha256(f"webhook:{settings.telegram_token}".encode()).hexdigest()[:32]
+
+
+async def start_webhook_bot(webhook_url: str) -> Application:
+	"""Start the bot without an updater, on the caller's event loop; updates arrive via `feed_update`."""
+	settings = get_settings()
+	configure_logging(settings.log_level)
+	app = build_application(settings, updater=False)
+	secret = webhook_secret(settings)
+	app.bot_data["webhook_secret"] = secret
+	await app.initialize()
+	await app.bot.set_webhook(
+		url=webhook_url,
+		secret_token=secret,
+		allowed_updates=Update.ALL_TYPES,
+		max_connections=max(1, settings.bot_concurrent_updates),
+	)
+	await app.start()
+	logger.info("bot.webhook.started", url=webhook_url)
+	return app
+
+
+async def stop_webhook_bot(app: Application) -> None:
+	# The webhook stays registered, so Telegram holds updates until the next start
+	await app.stop()
+	await app.shutdown()
+
+
+async def feed_update(app: Application, data: Dict[str, Any]) -> None:
+	"""Hand a webhook payload to the application; processing happens in the background."""
+	update = Update.de_json(data, app.bot)
+	await app.update_queue.put(update)
+
+
+async def run_telegram_bot() -> None:
+	settings = get_settings()
+	configure_logging(settings.log_level)
+	app = build_application(settings)
 	logger.info("bot.starting")
 	# Manage lifecycle within existing event loop
 	max_retries = 3
@@ -0,0 +1,133 @@
+from __future__ import annotations
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator
+
+from .logging_setup import logger
+from .utils import ensure_dir, file_lock
+
+
+_SHORTCODE_RE = re.compile(r"instagram\.com/(?:reel|p)/([A-Za-z0-9_-]+)")
+
+
+def job_id_for_url(reel_url: str) -> str:
+	"""Stable job ID for a reel, so a retry of the same link finds its checkpoint."""
+	m = _SHORTCODE_RE.search(reel_url or "")
+	key = m.group(1) if m else (reel_url or "").strip().rstrip("/")
+	return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+
+class CheckpointStore:
+	"""Per-job directory holding downloaded/intermediate files and a state.json checkpoint.
+
+	A run `claim`s its job ID first, so two runs of the same job (the same reel
+	sent twice, or a worker and the one that took over its lease) never share
+	the work dir at once. Claims are kept alive by a heartbeat and go stale
+	after `claim_ttl` seconds, so a crashed run doesn't block its job for good.
+	"""
+
+	def __init__(self, root: str, claim_ttl: float = 60.0):
+		self.root = root
+		self.claim_ttl = claim_ttl
+		ensure_dir(root)
+
+	def _lock_path(self, job_id: str) -> str:
+		# Outside the job dir: clear() removes that while others may wait on the lock
+		return os.path.join(self.root, ".locks", f"{job_id}.lock")
+
+	def lock(self, job_id: str):
+		"""Short-lived exclusive lock on one job's checkpoint, across threads and processes."""
+		return file_lock(self._lock_path(job_id))
+
+	def _try_claim(self, job_id: str, token: str) -> bool:
+		path = os.path.join(self.root, ".locks", f"{job_id}.claim")
+		with self.lock(job_id):
+			try:
+				with open(path, "r", encoding="utf-8") as f:
+					held = f.read().strip()
+				if held != token and time.time() - os.path.getmtime(path) < self.claim_ttl:
+					return False
+			except FileNotFoundError:
+				pass
+			with open(path, "w", encoding="utf-8") as f:
+				f.write(token)
+			return True
+
+	def _release(self, job_id: str, token: str) -> None:
+		path = os.path.join(self.root, ".locks", f"{job_id}.claim")
+		with self.lock(job_id):
+			try:
+				with open(path, "r", encoding="utf-8") as f:
+					if f.read().strip() != token:
+						return
+				os.remove(path)
+			except FileNotFoundError:
+				pass
+
+	@contextmanager
+	def claim(self, job_id: str, poll_s: float = 0.5) -> Iterator[None]:
+		"""Hold `job_id` for the block, waiting while another live run holds it."""
+		token = uuid.uuid4().hex
+		waited = time.monotonic()
+		logged = False
+		while not self._try_claim(job_id, token):
+			if not logged:
+				logger.info("checkpoint.claim.waiting", job_id=job_id)
+				logged = True
+			time.sleep(poll_s)
+		if logged:
+			logger.info("checkpoint.claim.acquired", job_id=job_id, waited_s=round(time.monotonic() - waited, 2))
+		stop = threading.Event()
+
+		def heartbeat() -> None:
+			while not stop.wait(self.claim_ttl / 4):
+				if not self._try_claim(job_id, token):
+					logger.warn("checkpoint.claim.lost", job_id=job_id)
+					return
+
+		beat = threading.Thread(target=heartbeat, name=f"claim-{job_id}", daemon=True)
+		beat.start()
+		try:
+			yield
+		finally:
+			stop.set()
+			beat.join()
+			self._release(job_id, token)
+
+	def job_dir(self, job_id: str) -> str:
+		path = os.path.join(self.root, job_id)
+		ensure_dir(path)
+		return path
+
+	def _state_path(self, job_id: str) -> str:
+		return os.path.join(self.root, job_id, "state.json")
+
+	def load(self, job_id: str) -> Dict[str, Any]:
+		path = self._state_path(job_id)
+		if not os.path.exists(path):
+			return {}
+		try:
+			with open(path, "r", encoding="utf-8") as f:
+				return json.load(f)
+		except (OSError, ValueError) as e:
+			# A torn/corrupt checkpoint just means starting over
+			logger.warn("checkpoint.load.failed", job_id=job_id, error=str(e))
+			return {}
+
+	def save(self, job_id: str, state: Dict[str, Any]) -> None:
+		path = self._state_path(job_id)
+		ensure_dir(os.path.dirname(path))
+		tmp = path + ".tmp"
+		with open(tmp, "w", encoding="utf-8") as f:
+			json.dump(state, f, ensure_ascii=False, default=str)
+		os.replace(tmp, path)
+
+	def clear(self, job_id: str) -> None:
+		shutil.rmtree(os.path.join(self.root, job_id), ignore_errors=True)
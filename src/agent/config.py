@@ -1,3 +1,4 @@
+import functools
 import os
 from pydantic import BaseModel
 
@@ -11,16 +12,72 @@ class Settings(BaseModel):
 	openai_api_key: str | None = os.getenv("OPENAI_API_KEY")
 	use_llm: bool = os.getenv("USE_LLM", "false").lower() in ("1", "true", "yes")
 	google_maps_api_key: str | None = os.getenv("GOOGLE_MAPS_API_KEY")
+	nominatim_url: str = os.getenv("NOMINATIM_URL", "https://nominatim.openstreetmap.org")
 	whisper_model: str = os.getenv("WHISPER_MODEL", "whisper-1")
 	whisper_backend: str = os.getenv("WHISPER_BACKEND", "local")  # local | openai
 	whisper_local_model: str = os.getenv("WHISPER_LOCAL_MODEL", "small")
+	whisper_workers: int = int(os.getenv("WHISPER_WORKERS", "1"))  # >1: transcribe silence-delimited chunks in parallel
+	whisper_cpu_budget: int = int(os.getenv("WHISPER_CPU_BUDGET", "0"))  # total whisper threads; 0 = all cores when chunking
+	whisper_chunk_s: float = float(os.getenv("WHISPER_CHUNK_S", "30"))
+	ocr_cache: bool = os.getenv("OCR_CACHE", "true").lower() in ("1", "true", "yes")
+	ocr_cache_path: str | None = os.getenv("OCR_CACHE_PATH")  # default: $TEMP_DIR/ocr_cache.json
+	ocr_cache_max_entries: int = int(os.getenv("OCR_CACHE_MAX_ENTRIES", "5000"))
+	ocr_cache_max_distance: int = int(os.getenv("OCR_CACHE_MAX_DISTANCE", "8"))  # Hamming bits (of 256) for a "same frame" match
+	ocr_cache_flush_every: int = int(os.getenv("OCR_CACHE_FLUSH_EVERY", "50"))  # new entries before the file is rewritten
+	ocr_cache_flush_s: float = float(os.getenv("OCR_CACHE_FLUSH_S", "60"))
+	vad_gate: bool = os.getenv("VAD_GATE", "true").lower() in ("1", "true", "yes")
+	vad_min_speech_ratio: float = float(os.getenv("VAD_MIN_SPEECH_RATIO", "0.1"))
 	temp_dir: str = os.getenv("TEMP_DIR", "/tmp/ai_agent")
+	download_concurrency: int = int(os.getenv("DOWNLOAD_CONCURRENCY", "2"))
+	download_min_height: int = int(os.getenv("DOWNLOAD_MIN_HEIGHT", "480"))  # smallest video height still good for OCR
+	telegram_webhook_url: str | None = os.getenv("TELEGRAM_WEBHOOK_URL")  # public base URL of the API; enables webhook mode
+	telegram_webhook_secret: str | None = os.getenv("TELEGRAM_WEBHOOK_SECRET")  # default: derived from the token
+	telegram_api_url: str | None = os.getenv("TELEGRAM_API_URL")  # Bot API server, default api.telegram.org
+	bot_concurrent_updates: int = int(os.getenv("BOT_CONCURRENT_UPDATES", "16"))  # across chats; each chat stays ordered
+	archive: bool = os.getenv("ARCHIVE", "true").lower() in ("1", "true", "yes")  # Parquet copy of every row written
+	archive_path: str | None = os.getenv("ARCHIVE_PATH")  # default: $TEMP_DIR/archive
+	archive_compact_files: int = int(os.getenv("ARCHIVE_COMPACT_FILES", "32"))  # merge a day's files (in the background) once it has this many
+	cpu_budget: int = int(os.getenv("CPU_BUDGET", "0"))  # threads shared by ffmpeg/whisper/OpenCV/OCR; 0 = all cores
+	memory_budget_mb: int = int(os.getenv("MEMORY_BUDGET_MB", "0"))  # 0 = not limited
+	max_whisper_decodes: int = int(os.getenv("MAX_WHISPER_DECODES", "1"))
+	max_ocr_procs: int = int(os.getenv("MAX_OCR_PROCS", "2"))  # concurrent tesseract processes
+	cv2_threads: int = int(os.getenv("CV2_THREADS", "1"))
+	max_active_jobs: int = int(os.getenv("MAX_ACTIVE_JOBS", "2"))  # reels processed at once by the bot
+	max_queued_jobs: int = int(os.getenv("MAX_QUEUED_JOBS", "20"))  # waiting behind them before new ones are refused
+	price_lookup: bool = os.getenv("PRICE_LOOKUP", "true").lower() in ("1", "true", "yes")
+	price_providers: str = os.getenv("PRICE_PROVIDERS", "")  # e.g. "serpapi,json:https://host/search?q={query}"
+	serpapi_api_key: str | None = os.getenv("SERPAPI_API_KEY")
+	price_country: str | None = os.getenv("PRICE_COUNTRY")  # two-letter market for shopping results
+	price_currency: str | None = os.getenv("PRICE_CURRENCY")  # e.g. "INR"; default: that of the best match
+	price_timeout_s: float = float(os.getenv("PRICE_TIMEOUT_S", "8"))  # whole-reel budget for price lookups
+	price_request_timeout_s: float = float(os.getenv("PRICE_REQUEST_TIMEOUT_S", "4"))
+	price_domain_concurrency: int = int(os.getenv("PRICE_DOMAIN_CONCURRENCY", "4"))
+	price_domain_rate: float = float(os.getenv("PRICE_DOMAIN_RATE", "2"))  # requests/s per provider domain
+	price_cache_path: str | None = os.getenv("PRICE_CACHE_PATH")  # default: $TEMP_DIR/prices.sqlite3
+	price_cache_ttl_h: float = float(os.getenv("PRICE_CACHE_TTL_H", "72"))
+	price_cache_negative_ttl_h: float = float(os.getenv("PRICE_CACHE_NEGATIVE_TTL_H", "6"))
 	admin_chat_id: str | None = os.getenv("ADMIN_CHAT_ID")
 	log_level: str = os.getenv("LOG_LEVEL", "INFO")
+	log_async: bool = os.getenv("LOG_ASYNC", "true").lower() in ("1", "true", "yes")  # write logs from a background thread
+	log_buffer: int = int(os.getenv("LOG_BUFFER", "10000"))  # queued lines before new ones are dropped
+	log_sample_rates: str = os.getenv("LOG_SAMPLE_RATES", "ocr.frame=0.1,sheets.row=0.05")  # event=fraction kept
+	log_rate_limit: float = float(os.getenv("LOG_RATE_LIMIT", "100"))  # per debug (or sampled) event name per second; 0 = off
+	progressive_results: bool = os.getenv("PROGRESSIVE_RESULTS", "false").lower() in ("1", "true", "yes")
+	job_queue: bool = os.getenv("JOB_QUEUE", "false").lower() in ("1", "true", "yes")  # bot/API enqueue, BOT_MODE=worker processes
+	job_backend: str = os.getenv("JOB_BACKEND", "sqlite")  # see jobs.register_job_backend
+	job_store_path: str | None = os.getenv("JOB_STORE_PATH")  # default: $TEMP_DIR/jobs.sqlite3
+	job_max_attempts: int = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+	job_visibility_timeout: float = float(os.getenv("JOB_VISIBILITY_TIMEOUT", "300"))
+	worker_concurrency: int = int(os.getenv("WORKER_CONCURRENCY", "1"))
+	worker_poll_interval: float = float(os.getenv("WORKER_POLL_INTERVAL", "2"))
+	job_report_timeout: float = float(os.getenv("JOB_REPORT_TIMEOUT", "1800"))  # seconds the bot follows a queued job
+	trace_dump: bool = os.getenv("TRACE_DUMP", "false").lower() in ("1", "true", "yes")
 
 	class Config:
 		arbitrary_types_allowed = True
 
 
+@functools.lru_cache(maxsize=1)
 def get_settings() -> Settings:
+	# Settings only reads the environment at import time, so one instance per process is enough
 	return Settings()
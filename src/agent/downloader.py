@@ -1,56 +1,116 @@
 from __future__ import annotations
-import json
+import functools
 import os
-import subprocess
-import tempfile
-from typing import Optional, Dict, Any
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, List
 
 from .config import get_settings
 from .logging_setup import logger
+from .tracing import in_context, span
 
 
-def _run(cmd: list[str]) -> subprocess.CompletedProcess:
-	return subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=False)
+# Everything downloaded is only used for 16 kHz audio and a handful of OCR
+# frames: prefer a single progressive file (no ffmpeg merge) at the lowest
+# resolution that is still readable, and the smallest file among equals.
+# FORMAT_SORT ranks smaller resolutions as "better", so when nothing reaches
+# min_height the fallback takes the "worst" (w/wv*), i.e. the tallest left.
+FORMAT_SORT = ["+res", "+size", "+br"]
+
+
+def _format_selector(min_height: int) -> str:
+	return f"b[height>={min_height}]/bv*[height>={min_height}]+ba/w/wv*+ba"
+
+
+_BULKY_INFO_KEYS = ("formats", "thumbnails", "requested_downloads", "requested_formats", "http_headers")
+_local = threading.local()
+_slots: threading.BoundedSemaphore | None = None
+_slots_lock = threading.Lock()
+
+
+def _download_slots() -> threading.BoundedSemaphore:
+	global _slots
+	with _slots_lock:
+		if _slots is None:
+			_slots = threading.BoundedSemaphore(max(1, get_settings().download_concurrency))
+		return _slots
+
+
+def _ydl():
+	"""Long-lived YoutubeDL per thread: extractors and the HTTP session (connection pool) are reused."""
+	ydl = getattr(_local, "ydl", None)
+	if ydl is None:
+		from yt_dlp import YoutubeDL
+		settings = get_settings()
+		ydl = YoutubeDL({
+			"quiet": True,
+			"no_warnings": True,
+			"noprogress": True,
+			"outtmpl": "%(id)s.%(ext)s",
+			"format": _format_selector(settings.download_min_height),
+			"format_sort": FORMAT_SORT,
+			"retries": 3,
+			"socket_timeout": 30,
+		})
+		_local.ydl = ydl
+		logger.info("download.ytdlp.instance.created", thread=threading.current_thread().name)
+	return ydl
 
 
 def download_reel(url: str, out_dir: Optional[str] = None) -> Dict[str, Any]:
+	with _download_slots(), span("download") as sp:
+		result = _download_reel(url, out_dir)
+		video_path = result.get("video_path")
+		if video_path and os.path.exists(video_path):
+			sp["bytes"] = os.path.getsize(video_path)
+		return result
+
+
+@functools.lru_cache(maxsize=1)
+def _pool() -> ThreadPoolExecutor:
+	# Persistent so each worker thread keeps its YoutubeDL instance between batches
+	return ThreadPoolExecutor(max_workers=max(1, get_settings().download_concurrency), thread_name_prefix="download")
+
+
+def probe_reel(url: str) -> Dict[str, Any]:
+	"""Caption and metadata only (no media download), for the progressive fast path."""
+	with span("download.probe"):
+		try:
+			info = _ydl().extract_info(url, download=False, process=False)
+			info = _ydl().sanitize_info(info)
+			meta = {k: v for k, v in info.items() if k not in _BULKY_INFO_KEYS}
+			return {"caption": meta.get("description") or meta.get("title") or "", "metadata": meta}
+		except Exception as e:
+			logger.warn("download.probe.failed", error=str(e)[:500])
+			return {"caption": None, "metadata": {}}
+
+
+def download_many(urls: List[str], out_dirs: List[str]) -> List[Dict[str, Any]]:
+	"""Download several reels concurrently (bounded by DOWNLOAD_CONCURRENCY), results in input order."""
+	return list(_pool().map(in_context(download_reel), urls, out_dirs))
+
+
+def _download_reel(url: str, out_dir: Optional[str] = None) -> Dict[str, Any]:
 	settings = get_settings()
 	workdir = out_dir or settings.temp_dir
 	os.makedirs(workdir, exist_ok=True)
 	logger.info("download.start", url=url)
 
 	# Try yt-dlp first
-	out_tmpl = os.path.join(workdir, "%(id)s.%(ext)s")
-	cmd = [
-		"yt-dlp",
-		"--no-call-home",
-		"--no-progress",
-		"--write-info-json",
-		"-o", out_tmpl,
-		url,
-	]
-	res = _run(cmd)
-	if res.returncode == 0:
-		logger.info("download.ytdlp.ok")
-		# Find info json
-		info_json = None
-		for fn in os.listdir(workdir):
-			if fn.endswith(".info.json"):
-				info_json = os.path.join(workdir, fn)
-				break
-		video_path = None
-		for fn in os.listdir(workdir):
-			if fn.endswith((".mp4", ".mkv", ".webm")):
-				video_path = os.path.join(workdir, fn)
-				break
-		meta = {}
-		if info_json and os.path.exists(info_json):
-			with open(info_json, "r", encoding="utf-8") as f:
-				meta = json.load(f)
+	try:
+		ydl = _ydl()
+		ydl.params["paths"] = {"home": workdir}
+		info = ydl.sanitize_info(ydl.extract_info(url, download=True))
+		downloads = info.get("requested_downloads") or []
+		video_path = downloads[0].get("filepath") if downloads else None
+		if video_path and not os.path.exists(video_path):
+			video_path = None
+		logger.info("download.ytdlp.ok", format_id=info.get("format_id"), height=info.get("height"))
+		meta = {k: v for k, v in info.items() if k not in _BULKY_INFO_KEYS}
 		caption = meta.get("description") or meta.get("title") or ""
 		return {"video_path": video_path, "caption": caption, "metadata": meta}
-
-	logger.warn("download.ytdlp.failed", stderr=res.stderr[:500])
+	except Exception as e:
+		logger.warn("download.ytdlp.failed", error=str(e)[:500])
 
 	# Fallback: instaloader (may require public content)
 	try:
@@ -1,39 +1,30 @@
 from __future__ import annotations
-import math
-import requests
-from typing import Dict, Any
+from typing import Dict, Any, List
 
 from .config import get_settings
 from .logging_setup import logger
+from .tracing import span
 
 
-def _haversine(lat1, lon1, lat2, lon2):
-	R = 6371.0
-	phi1, phi2 = math.radians(lat1), math.radians(lat2)
-	dphi = math.radians(lat2 - lat1)
-	dlam = math.radians(lon2 - lon1)
-	a = math.sin(dphi/2)**2 + math.cos(phi1)*math.cos(phi2)*math.sin(dlam/2)**2
-	c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-	return R * c
-
-
-def enrich_place(item: Dict[str, Any], origin_lat: float | None = None, origin_lng: float | None = None) -> Dict[str, Any]:
+def enrich_place(item: Dict[str, Any]) -> Dict[str, Any]:
 	settings = get_settings()
 	name = (item.get("item_name") or "").strip()
 	if not name:
 		return item
+	import requests
 	try:
 		params = {
 			"q": name,
 			"format": "json",
 			"limit": 1,
 		}
-		r = requests.get(
-			"https://nominatim.openstreetmap.org/search",
-			params=params,
-			timeout=15,
-			headers={"User-Agent": "reel-extractor-ai-agent/1.0 (contact: admin@example.com)"},
-		)
+		with span("geocode.search"):
+			r = requests.get(
+				f"{settings.nominatim_url.rstrip('/')}/search",
+				params=params,
+				timeout=15,
+				headers={"User-Agent": "reel-extractor-ai-agent/1.0 (contact: admin@example.com)"},
+			)
 		if r.status_code != 200:
 			logger.warn("nominatim.search.failed", code=r.status_code)
 			return item
@@ -45,19 +36,18 @@ def enrich_place(item: Dict[str, Any], origin_lat: float | None = None, origin_l
 		lng = float(best.get("lon"))
 		item["lat"], item["lng"] = lat, lng
 		# Optional reverse to get address components
-		rv = requests.get(
-			"https://nominatim.openstreetmap.org/reverse",
-			params={"lat": lat, "lon": lng, "format": "json", "zoom": 14},
-			headers={"User-Agent": "reel-extractor-ai-agent/1.0 (contact: admin@example.com)"},
-			timeout=15,
-		)
+		with span("geocode.reverse"):
+			rv = requests.get(
+				f"{settings.nominatim_url.rstrip('/')}/reverse",
+				params={"lat": lat, "lon": lng, "format": "json", "zoom": 14},
+				headers={"User-Agent": "reel-extractor-ai-agent/1.0 (contact: admin@example.com)"},
+				timeout=15,
+			)
 		if rv.status_code == 200:
 			addr = (rv.json() or {}).get("address", {})
 			item.setdefault("city", addr.get("city") or addr.get("town") or addr.get("village"))
 			item.setdefault("state", addr.get("state"))
 			item.setdefault("country", addr.get("country"))
-		if origin_lat and origin_lng:
-			item["distance_km"] = round(_haversine(origin_lat, origin_lng, lat, lng), 2)
 		item["processing_status"] = item.get("processing_status", "done")
 		item["confidence"] = max(float(item.get("confidence", 0.5)), 0.7)
 	except Exception as e:
@@ -65,19 +55,39 @@ def enrich_place(item: Dict[str, Any], origin_lat: float | None = None, origin_l
 	return item
 
 
+def enrich_products(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+	"""Fill price/price_source/purchase_link for products without a price, looking
+	them all up at once (see prices.PriceEngine). Priced products are marked
+	done; unpriced ones stay in review.
+	"""
+	todo = [it for it in items if not it.get("price") and (it.get("item_name") or "").strip()]
+	engine = None
+	if todo and get_settings().price_lookup:
+		from .prices import get_price_engine
+		engine = get_price_engine()
+	offers = engine.lookup_many([(it.get("brand_or_category"), it.get("item_name")) for it in todo]) if engine else [None] * len(todo)
+	for it, offer in zip(todo, offers):
+		if offer:
+			it["price"] = f"{offer['price']:.2f} {offer['currency']}".strip()
+			it["price_source"] = offer["source"]
+			if not it.get("purchase_link"):
+				it["purchase_link"] = offer["url"]
+			it["processing_status"] = "done"
+		else:
+			it["processing_status"] = "review"
+		it["confidence"] = float(it.get("confidence", 0.5))
+	return items
+
+
 def enrich_product(item: Dict[str, Any]) -> Dict[str, Any]:
-	# Placeholder: set price source and leave lookup for future web-scrape
-	if not item.get("price"):
-		item["price_source"] = "web-scrape"
-		item.setdefault("processing_status", "review")
-		item["confidence"] = float(item.get("confidence", 0.5))
-	return item
+	return enrich_products([item])[0]
 
 
-def enrich_item(item: Dict[str, Any], origin_lat: float | None = None, origin_lng: float | None = None) -> Dict[str, Any]:
+def enrich_item(item: Dict[str, Any]) -> Dict[str, Any]:
+	# Distances are computed for all items at once by geo.annotate_distances
 	type_ = (item.get("type") or "").lower()
 	if type_ in ("place", "hotel"):
-		return enrich_place(item, origin_lat, origin_lng)
+		return enrich_place(item)
 	elif type_ == "product":
 		return enrich_product(item)
 	return item
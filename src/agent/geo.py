@@ -0,0 +1,208 @@
+from __future__ import annotations
+import csv
+import math
+import os
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+from .logging_setup import logger
+from .utils import SHEET_HEADERS
+
+
+EARTH_RADIUS_KM = 6371.0
+_GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+_LAT_COL = SHEET_HEADERS.index("Lat")
+_LNG_COL = SHEET_HEADERS.index("Lng")
+
+
+def haversine_matrix(lats1, lngs1, lats2, lngs2) -> np.ndarray:
+	"""Great-circle distances (km) between every point in set 1 and every point in set 2.
+
+	Returns an array of shape (len(set1), len(set2)).
+	"""
+	phi1 = np.radians(np.asarray(lats1, dtype=np.float64))[:, None]
+	lam1 = np.radians(np.asarray(lngs1, dtype=np.float64))[:, None]
+	phi2 = np.radians(np.asarray(lats2, dtype=np.float64))[None, :]
+	lam2 = np.radians(np.asarray(lngs2, dtype=np.float64))[None, :]
+	a = np.sin((phi2 - phi1) / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin((lam2 - lam1) / 2) ** 2
+	return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+	return float(haversine_matrix([lat1], [lng1], [lat2], [lng2])[0, 0])
+
+
+def _coord(value: Any) -> float:
+	try:
+		return float(value)
+	except (TypeError, ValueError):
+		return math.nan
+
+
+def annotate_distances(items: List[Dict[str, Any]], origin_lat: float | None, origin_lng: float | None) -> List[Dict[str, Any]]:
+	"""Set distance_km on every geocoded item against a single origin, in one vectorized pass."""
+	if origin_lat is None or origin_lng is None or not items:
+		return items
+	lats = np.array([_coord(it.get("lat")) for it in items])
+	lngs = np.array([_coord(it.get("lng")) for it in items])
+	mask = ~(np.isnan(lats) | np.isnan(lngs))
+	if not mask.any():
+		return items
+	dists = haversine_matrix(lats[mask], lngs[mask], [origin_lat], [origin_lng])[:, 0]
+	for idx, d in zip(np.flatnonzero(mask), dists):
+		items[idx]["distance_km"] = round(float(d), 2)
+	return items
+
+
+def geohash_encode(lats, lngs, precision: int = 5) -> np.ndarray:
+	"""Vectorized geohash encoding; returns an array of strings of length `precision`."""
+	lats = np.asarray(lats, dtype=np.float64)
+	lngs = np.asarray(lngs, dtype=np.float64)
+	lat_lo, lat_hi = np.full(lats.shape, -90.0), np.full(lats.shape, 90.0)
+	lng_lo, lng_hi = np.full(lngs.shape, -180.0), np.full(lngs.shape, 180.0)
+	chars = np.zeros((precision,) + lats.shape, dtype=np.int64)
+	for bit in range(precision * 5):
+		if bit % 2 == 0:
+			mid = (lng_lo + lng_hi) / 2
+			on = lngs >= mid
+			lng_lo = np.where(on, mid, lng_lo)
+			lng_hi = np.where(on, lng_hi, mid)
+		else:
+			mid = (lat_lo + lat_hi) / 2
+			on = lats >= mid
+			lat_lo = np.where(on, mid, lat_lo)
+			lat_hi = np.where(on, lat_hi, mid)
+		chars[bit // 5] = (chars[bit // 5] << 1) | on
+	alphabet = np.array(list(_GEOHASH_ALPHABET))
+	out = alphabet[chars[0]]
+	for c in chars[1:]:
+		out = np.char.add(out, alphabet[c])
+	return out
+
+
+def _cell_size(precision: int) -> Tuple[float, float]:
+	bits = precision * 5
+	lng_bits = (bits + 1) // 2
+	lat_bits = bits // 2
+	return 180.0 / (1 << lat_bits), 360.0 / (1 << lng_bits)
+
+
+class GeoIndex:
+	"""Geohash-bucketed point index for radius and nearest-neighbour queries.
+
+	Buckets narrow the candidate set; exact distances are then computed with
+	`haversine_matrix` over the candidates only.
+	"""
+
+	# Above this many cells a radius query just scans every point (still vectorized).
+	max_query_cells = 256
+
+	def __init__(self, lats: Sequence[float], lngs: Sequence[float], payloads: Sequence[Any] | None = None, precision: int = 4):
+		self.lats = np.asarray(lats, dtype=np.float64)
+		self.lngs = np.asarray(lngs, dtype=np.float64)
+		self.payloads = list(payloads) if payloads is not None else list(range(len(self.lats)))
+		self.precision = precision
+		self.cell_lat, self.cell_lng = _cell_size(precision)
+		self.buckets: Dict[str, np.ndarray] = {}
+		if len(self.lats):
+			keys, inverse = np.unique(geohash_encode(self.lats, self.lngs, precision), return_inverse=True)
+			order = np.argsort(inverse, kind="stable")
+			splits = np.cumsum(np.bincount(inverse, minlength=len(keys)))[:-1]
+			for key, members in zip(keys, np.split(order, splits)):
+				self.buckets[str(key)] = members
+
+	def __len__(self) -> int:
+		return len(self.lats)
+
+	@classmethod
+	def from_items(cls, items: Iterable[Dict[str, Any]], precision: int = 4) -> "GeoIndex":
+		lats, lngs, payloads = [], [], []
+		for it in items:
+			lat, lng = _coord(it.get("lat")), _coord(it.get("lng"))
+			if math.isnan(lat) or math.isnan(lng):
+				continue
+			lats.append(lat)
+			lngs.append(lng)
+			payloads.append(it)
+		return cls(lats, lngs, payloads, precision=precision)
+
+	@classmethod
+	def from_rows(cls, rows: Iterable[List[Any]], precision: int = 4) -> "GeoIndex":
+		"""Build from sheet-shaped rows (see SHEET_HEADERS); rows without coordinates are skipped."""
+		lats, lngs, payloads = [], [], []
+		for row in rows:
+			if len(row) <= _LNG_COL:
+				continue
+			lat, lng = _coord(row[_LAT_COL]), _coord(row[_LNG_COL])
+			if math.isnan(lat) or math.isnan(lng):
+				continue
+			lats.append(lat)
+			lngs.append(lng)
+			payloads.append(dict(zip(SHEET_HEADERS, row)))
+		return cls(lats, lngs, payloads, precision=precision)
+
+	def _candidates(self, lat: float, lng: float, radius_km: float) -> np.ndarray:
+		dlat = math.degrees(radius_km / EARTH_RADIUS_KM)
+		cos_lat = math.cos(math.radians(min(89.9, abs(lat) + dlat)))
+		dlng = min(180.0, dlat / max(cos_lat, 1e-9))
+		i0 = math.floor((max(-90.0, lat - dlat) + 90.0) / self.cell_lat)
+		i1 = math.floor((min(90.0, lat + dlat) + 90.0) / self.cell_lat)
+		j0 = math.floor((lng - dlng + 180.0) / self.cell_lng)
+		j1 = math.floor((lng + dlng + 180.0) / self.cell_lng)
+		n_lng_cells = round(360.0 / self.cell_lng)
+		j_count = min(j1 - j0 + 1, n_lng_cells)
+		if (i1 - i0 + 1) * j_count > self.max_query_cells:
+			return np.arange(len(self.lats))
+		rows = np.arange(i0, i1 + 1)
+		cols = (np.arange(j0, j0 + j_count) % n_lng_cells)
+		grid_i, grid_j = np.meshgrid(rows, cols, indexing="ij")
+		centre_lat = np.minimum(-90.0 + (grid_i.ravel() + 0.5) * self.cell_lat, 90.0)
+		centre_lng = -180.0 + (grid_j.ravel() + 0.5) * self.cell_lng
+		members = [self.buckets[k] for k in set(geohash_encode(centre_lat, centre_lng, self.precision).tolist()) if k in self.buckets]
+		if not members:
+			return np.empty(0, dtype=np.int64)
+		return np.concatenate(members)
+
+	def within(self, lat: float, lng: float, radius_km: float) -> List[Tuple[Any, float]]:
+		"""All points within `radius_km` of (lat, lng), closest first, as (payload, distance_km)."""
+		if not len(self.lats):
+			return []
+		cand = self._candidates(lat, lng, radius_km)
+		if not len(cand):
+			return []
+		dists = haversine_matrix(self.lats[cand], self.lngs[cand], [lat], [lng])[:, 0]
+		keep = dists <= radius_km
+		cand, dists = cand[keep], dists[keep]
+		order = np.argsort(dists, kind="stable")
+		return [(self.payloads[i], round(float(d), 2)) for i, d in zip(cand[order], dists[order])]
+
+	def nearest(self, lat: float, lng: float, k: int = 5) -> List[Tuple[Any, float]]:
+		"""The `k` closest points to (lat, lng), closest first, as (payload, distance_km)."""
+		if not len(self.lats) or k <= 0:
+			return []
+		dists = haversine_matrix(self.lats, self.lngs, [lat], [lng])[:, 0]
+		k = min(k, len(dists))
+		top = np.argpartition(dists, k - 1)[:k]
+		top = top[np.argsort(dists[top], kind="stable")]
+		return [(self.payloads[i], round(float(dists[i]), 2)) for i in top]
+
+
+_backup_index_cache: Dict[str, Tuple[float, GeoIndex]] = {}
+
+
+def load_backup_index(path: str) -> GeoIndex:
+	"""GeoIndex over the local CSV mirror, rebuilt only when the file changes."""
+	if not os.path.exists(path):
+		return GeoIndex([], [])
+	mtime = os.path.getmtime(path)
+	cached = _backup_index_cache.get(path)
+	if cached and cached[0] == mtime:
+		return cached[1]
+	with open(path, "r", newline="", encoding="utf-8") as f:
+		reader = csv.reader(f)
+		rows = [r for r in reader if r and r[0] != "Index"]
+	index = GeoIndex.from_rows(rows)
+	_backup_index_cache[path] = (mtime, index)
+	logger.info("geo.index.built", path=path, points=len(index), buckets=len(index.buckets))
+	return index
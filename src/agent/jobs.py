@@ -0,0 +1,220 @@
+from __future__ import annotations
+import json
+import os
+import sqlite3
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Protocol
+
+from .logging_setup import logger
+from .utils import ensure_dir
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+	id TEXT PRIMARY KEY,
+	reel_url TEXT NOT NULL,
+	payload TEXT NOT NULL DEFAULT '{}',
+	status TEXT NOT NULL,              -- queued | running | done | failed
+	attempts INTEGER NOT NULL DEFAULT 0,
+	max_attempts INTEGER NOT NULL,
+	available_at REAL NOT NULL,        -- not leased before this (retry backoff)
+	lease_owner TEXT,
+	lease_expires REAL,
+	progress TEXT,
+	result TEXT,
+	error TEXT,
+	error_type TEXT,
+	created_at REAL NOT NULL,
+	updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, available_at, created_at);
+"""
+
+_JSON_FIELDS = ("payload", "progress", "result")
+
+
+class JobBackend(Protocol):
+	"""What the bot, the API and workers need from a job queue.
+
+	JobStore (SQLite) is built in and serves the processes of one host.
+	Spreading workers over several hosts takes a networked backend
+	(Postgres, Redis...) implementing these methods, added with
+	register_job_backend() and selected with JOB_BACKEND.
+	"""
+
+	def enqueue(self, reel_url: str, payload: Dict[str, Any] | None = None) -> str: ...
+	def lease(self, worker_id: str, visibility_timeout: float) -> Dict[str, Any] | None: ...
+	def heartbeat(self, job_id: str, worker_id: str, visibility_timeout: float) -> bool: ...
+	def set_progress(self, job_id: str, worker_id: str, progress: Dict[str, Any]) -> None: ...
+	def complete(self, job_id: str, worker_id: str, result: Dict[str, Any]) -> bool: ...
+	def fail(self, job_id: str, worker_id: str, error: BaseException, retry: bool = True, backoff_s: float = 5.0) -> str: ...
+	def get(self, job_id: str) -> Dict[str, Any] | None: ...
+	def position(self, job_id: str) -> int: ...
+	def counts(self) -> Dict[str, int]: ...
+	def recent(self, limit: int = 20) -> List[Dict[str, Any]]: ...
+
+
+class JobStore:
+	"""Durable pipeline job queue in SQLite with lease-based delivery.
+
+	Workers lease a job for `visibility_timeout` seconds and must heartbeat
+	to keep it; a job whose lease runs out (crashed or hung worker) becomes
+	visible again and is retried until `max_attempts` is reached. Every call
+	opens its own connection, so one store can be shared by threads and by
+	any number of processes on the same host (the file must be on a local
+	disk; WAL mode does not work over network filesystems).
+	"""
+
+	def __init__(self, path: str, max_attempts: int = 3):
+		self.path = path
+		self.max_attempts = max_attempts
+		ensure_dir(os.path.dirname(path) or ".")
+		with self._conn() as conn:
+			conn.execute("PRAGMA journal_mode=WAL")
+			conn.executescript(_SCHEMA)
+
+	@contextmanager
+	def _conn(self) -> Iterator[sqlite3.Connection]:
+		conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+		conn.row_factory = sqlite3.Row
+		try:
+			yield conn
+		finally:
+			conn.close()
+
+	@contextmanager
+	def _tx(self) -> Iterator[sqlite3.Connection]:
+		# BEGIN IMMEDIATE takes the write lock up front, so select-then-update is atomic across processes
+		with self._conn() as conn:
+			conn.execute("BEGIN IMMEDIATE")
+			try:
+				yield conn
+				conn.execute("COMMIT")
+			except BaseException:
+				conn.execute("ROLLBACK")
+				raise
+
+	@staticmethod
+	def _row(row: sqlite3.Row | None) -> Dict[str, Any] | None:
+		if row is None:
+			return None
+		job = dict(row)
+		for key in _JSON_FIELDS:
+			job[key] = json.loads(job[key]) if job[key] else None
+		return job
+
+	def enqueue(self, reel_url: str, payload: Dict[str, Any] | None = None) -> str:
+		job_id = uuid.uuid4().hex[:16]
+		now = time.time()
+		with self._conn() as conn:
+			conn.execute(
+				"INSERT INTO jobs (id, reel_url, payload, status, max_attempts, available_at, created_at, updated_at) VALUES (?, ?, ?, 'queued', ?, ?, ?, ?)",
+				(job_id, reel_url, json.dumps(payload or {}), self.max_attempts, now, now, now),
+			)
+		logger.info("jobs.enqueued", job_id=job_id)
+		return job_id
+
+	def lease(self, worker_id: str, visibility_timeout: float) -> Dict[str, Any] | None:
+		now = time.time()
+		with self._tx() as conn:
+			# Expired leases that already used every attempt are failed, not redelivered
+			conn.execute(
+				"UPDATE jobs SET status='failed', error='lease expired on final attempt', error_type='LeaseExpired', lease_owner=NULL, updated_at=? "
+				"WHERE status='running' AND lease_expires < ? AND attempts >= max_attempts",
+				(now, now),
+			)
+			row = conn.execute(
+				"SELECT id FROM jobs WHERE (status='queued' AND available_at <= ?) OR (status='running' AND lease_expires < ?) "
+				"ORDER BY created_at LIMIT 1",
+				(now, now),
+			).fetchone()
+			if row is None:
+				return None
+			conn.execute(
+				"UPDATE jobs SET status='running', lease_owner=?, lease_expires=?, attempts=attempts+1, updated_at=? WHERE id=?",
+				(worker_id, now + visibility_timeout, now, row["id"]),
+			)
+			job = self._row(conn.execute("SELECT * FROM jobs WHERE id=?", (row["id"],)).fetchone())
+		logger.info("jobs.leased", job_id=job["id"], worker=worker_id, attempt=job["attempts"])
+		return job
+
+	def heartbeat(self, job_id: str, worker_id: str, visibility_timeout: float) -> bool:
+		"""Extend the lease; False means the job was taken over and the worker should stop."""
+		now = time.time()
+		with self._conn() as conn:
+			cur = conn.execute(
+				"UPDATE jobs SET lease_expires=?, updated_at=? WHERE id=? AND lease_owner=? AND status='running'",
+				(now + visibility_timeout, now, job_id, worker_id),
+			)
+			return cur.rowcount == 1
+
+	def set_progress(self, job_id: str, worker_id: str, progress: Dict[str, Any]) -> None:
+		with self._conn() as conn:
+			conn.execute(
+				"UPDATE jobs SET progress=?, updated_at=? WHERE id=? AND lease_owner=?",
+				(json.dumps(progress, default=str), time.time(), job_id, worker_id),
+			)
+
+	def complete(self, job_id: str, worker_id: str, result: Dict[str, Any]) -> bool:
+		with self._conn() as conn:
+			cur = conn.execute(
+				"UPDATE jobs SET status='done', result=?, error=NULL, error_type=NULL, lease_owner=NULL, lease_expires=NULL, updated_at=? "
+				"WHERE id=? AND lease_owner=? AND status='running'",
+				(json.dumps(result, default=str), time.time(), job_id, worker_id),
+			)
+			return cur.rowcount == 1
+
+	def fail(self, job_id: str, worker_id: str, error: BaseException, retry: bool = True, backoff_s: float = 5.0) -> str:
+		"""Record a failure; the job is re-queued (with backoff) while attempts remain. Returns the new status."""
+		now = time.time()
+		with self._tx() as conn:
+			row = conn.execute("SELECT attempts, max_attempts FROM jobs WHERE id=? AND lease_owner=?", (job_id, worker_id)).fetchone()
+			if row is None:
+				return "lost"
+			status = "queued" if retry and row["attempts"] < row["max_attempts"] else "failed"
+			conn.execute(
+				"UPDATE jobs SET status=?, error=?, error_type=?, available_at=?, lease_owner=NULL, lease_expires=NULL, updated_at=? WHERE id=?",
+				(status, str(error)[:2000], type(error).__name__, now + backoff_s * row["attempts"], now, job_id),
+			)
+		logger.warn("jobs.failed", job_id=job_id, status=status, error=str(error)[:200])
+		return status
+
+	def get(self, job_id: str) -> Dict[str, Any] | None:
+		with self._conn() as conn:
+			return self._row(conn.execute("SELECT * FROM jobs WHERE id=?", (job_id,)).fetchone())
+
+	def position(self, job_id: str) -> int:
+		"""1-based place among queued jobs (0 if not queued)."""
+		with self._conn() as conn:
+			row = conn.execute("SELECT status, created_at FROM jobs WHERE id=?", (job_id,)).fetchone()
+			if row is None or row["status"] != "queued":
+				return 0
+			ahead = conn.execute("SELECT COUNT(*) FROM jobs WHERE status='queued' AND created_at < ?", (row["created_at"],)).fetchone()[0]
+			return ahead + 1
+
+	def counts(self) -> Dict[str, int]:
+		with self._conn() as conn:
+			return {r["status"]: r["n"] for r in conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status")}
+
+	def recent(self, limit: int = 20) -> List[Dict[str, Any]]:
+		with self._conn() as conn:
+			return [self._row(r) for r in conn.execute("SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,))]
+
+
+# name -> factory(settings)
+JOB_BACKENDS: Dict[str, Callable[[Any], JobBackend]] = {
+	"sqlite": lambda settings: JobStore(settings.job_store_path or os.path.join(settings.temp_dir, "jobs.sqlite3"), max_attempts=settings.job_max_attempts),
+}
+
+
+def register_job_backend(name: str, factory: Callable[[Any], JobBackend]) -> None:
+	JOB_BACKENDS[name] = factory
+
+
+def get_job_store(settings) -> JobBackend:
+	factory = JOB_BACKENDS.get(settings.job_backend)
+	if factory is None:
+		raise ValueError(f"Unknown JOB_BACKEND {settings.job_backend!r}; known: {', '.join(sorted(JOB_BACKENDS))}")
+	return factory(settings)
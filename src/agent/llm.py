@@ -4,6 +4,7 @@ from typing import Any, Dict, List
 
 from .config import get_settings
 from .logging_setup import logger
+from .tracing import span
 
 
 SYSTEM_PROMPT = (
@@ -49,11 +50,12 @@ def extract_items_with_llm(source_blob: str) -> List[Dict[str, Any]]:
 			{"role": "system", "content": SYSTEM_PROMPT},
 			{"role": "user", "content": source_blob[:18000]},
 		]
-		resp = client.chat.completions.create(
-			model="gpt-4o-mini",
-			messages=messages,
-			temperature=0.2,
-		)
+		with span("llm.openai", input_chars=len(messages[1]["content"])):
+			resp = client.chat.completions.create(
+				model="gpt-4o-mini",
+				messages=messages,
+				temperature=0.2,
+			)
 		text = resp.choices[0].message.content
 		try:
 			data = json.loads(text)
@@ -1,21 +1,212 @@
+from __future__ import annotations
+import atexit
 import logging
-import os
+import queue
+import random
+import sys
+import threading
+import time
+from typing import Any, Dict, List
+
 import structlog
+from prometheus_client import Counter
+
+
+LOG_DROPPED = Counter("reel_log_events_dropped_total", "Log events not written", ["reason"])
+# Bound once: labels() lookups would cost more than the sampling saves
+_SAMPLED_OUT = LOG_DROPPED.labels("sampled")
+_RATE_LIMITED = LOG_DROPPED.labels("rate_limited")
+_BUFFER_FULL = LOG_DROPPED.labels("buffer_full")
+
+
+def _json_dumps():
+	try:
+		import orjson
+	except ImportError:
+		import json
+
+		def dumps(obj: Any, default=None) -> bytes:
+			return json.dumps(obj, default=default).encode("utf-8")
+		return dumps
+
+	def dumps(obj: Any, default=None) -> bytes:
+		return orjson.dumps(obj, default=default, option=orjson.OPT_NON_STR_KEYS)
+	return dumps
+
+
+class AsyncLogSink:
+	"""Bounded queue of rendered log lines, written out by one background thread.
+
+	Logging callers never wait on stdout: when the buffer is full the line is
+	dropped and counted, and the writer later reports the total in a
+	`log.dropped` event.
+	"""
+
+	def __init__(self, stream=None, max_buffer: int = 10_000, batch_size: int = 256):
+		self.stream = stream
+		self.batch_size = batch_size
+		self.dropped = 0
+		self.written = 0
+		self._reported = 0
+		self._queue: "queue.Queue[bytes]" = queue.Queue(max_buffer)
+		self._drop_lock = threading.Lock()
+		self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+		self._thread.start()
+
+	def put(self, line: bytes) -> None:
+		try:
+			self._queue.put_nowait(line)
+		except queue.Full:
+			with self._drop_lock:
+				self.dropped += 1
+			_BUFFER_FULL.inc()
+
+	def _write(self, data: bytes) -> None:
+		out = self.stream or sys.stdout
+		buf = getattr(out, "buffer", None) if self.stream is None else out
+		if buf is not None:
+			buf.write(data)
+		else:
+			out.write(data.decode("utf-8", "replace"))
+		out.flush()
+
+	def _run(self) -> None:
+		while True:
+			batch: List[bytes] = [self._queue.get()]
+			while len(batch) < self.batch_size:
+				try:
+					batch.append(self._queue.get_nowait())
+				except queue.Empty:
+					break
+			taken = len(batch)
+			dropped = self.dropped
+			if dropped != self._reported:
+				batch.append(b'{"event":"log.dropped","level":"warning","count":%d}' % (dropped - self._reported))
+				self._reported = dropped
+			try:
+				self._write(b"\n".join(batch) + b"\n")
+				self.written += taken
+			except Exception:
+				# Nowhere left to report it; count and keep draining
+				LOG_DROPPED.labels("write_error").inc(taken)
+			finally:
+				for _ in range(taken):
+					self._queue.task_done()
+
+	def flush(self, timeout: float = 2.0) -> bool:
+		"""Wait until everything queued so far has been written; False on timeout."""
+		deadline = time.monotonic() + timeout
+		while self._queue.unfinished_tasks:
+			if time.monotonic() > deadline:
+				return False
+			time.sleep(0.001)
+		return True
+
+
+class QueueLogger:
+	"""structlog logger that hands rendered lines to an AsyncLogSink."""
+
+	def __init__(self, sink: AsyncLogSink):
+		self._sink = sink
+
+	def msg(self, message: bytes) -> None:
+		self._sink.put(message)
+
+	log = debug = info = warn = warning = error = critical = exception = fatal = msg
+
+
+class EventSampler:
+	"""structlog processor that thins out high-volume events.
+
+	Events listed in `rates` are kept with that probability (and tagged with
+	`sample_rate` so counts can be scaled back up). Debug events, and events
+	listed in `rates` at any level, are also capped at `rate_limit` per second
+	per event name. Other info events, warnings and errors always pass.
+	"""
+
+	_ALWAYS = frozenset(("warn", "warning", "error", "critical", "exception", "fatal"))
+
+	def __init__(self, rates: Dict[str, float] | None = None, rate_limit: float = 0.0):
+		self.rates = rates or {}
+		self.rate_limit = rate_limit
+		self._buckets: Dict[str, List[float]] = {}
+		self._lock = threading.Lock()
+
+	def _allow(self, event: str) -> bool:
+		now = time.monotonic()
+		with self._lock:
+			bucket = self._buckets.get(event)
+			if bucket is None:
+				bucket = self._buckets[event] = [self.rate_limit, now]
+			tokens = min(self.rate_limit, bucket[0] + (now - bucket[1]) * self.rate_limit)
+			bucket[1] = now
+			if tokens < 1:
+				bucket[0] = tokens
+				return False
+			bucket[0] = tokens - 1
+			return True
+
+	def __call__(self, logger: Any, method_name: str, event_dict: Dict[str, Any]) -> Dict[str, Any]:
+		if method_name in self._ALWAYS:
+			return event_dict
+		event = event_dict.get("event")
+		rate = self.rates.get(event)
+		if rate is not None and rate < 1:
+			if random.random() >= rate:
+				_SAMPLED_OUT.inc()
+				raise structlog.DropEvent
+			event_dict["sample_rate"] = rate
+		limited = method_name == "debug" or rate is not None
+		if limited and self.rate_limit > 0 and not self._allow(event):
+			_RATE_LIMITED.inc()
+			raise structlog.DropEvent
+		return event_dict
+
+
+def parse_sample_rates(spec: str) -> Dict[str, float]:
+	""""ocr.frame=0.1,sheets.row=0.01" -> {"ocr.frame": 0.1, "sheets.row": 0.01}"""
+	rates = {}
+	for part in (spec or "").split(","):
+		name, _, value = part.partition("=")
+		if name.strip() and value.strip():
+			rates[name.strip()] = float(value)
+	return rates
+
+
+_sink: AsyncLogSink | None = None
 
 
 def configure_logging(level: str = "INFO") -> None:
+	global _sink
+	from .config import get_settings
+	settings = get_settings()
 	logging.basicConfig(level=getattr(logging, level.upper(), logging.INFO))
+	if settings.log_async:
+		# One writer thread per process, however many entry points configure logging
+		if _sink is None:
+			_sink = AsyncLogSink(max_buffer=settings.log_buffer)
+			atexit.register(_sink.flush)
+		logger_factory = lambda *args: QueueLogger(_sink)  # noqa: E731
+	else:
+		logger_factory = structlog.BytesLoggerFactory()
 	structlog.configure(
 		processors=[
+			# Sample first, so dropped events skip timestamping and rendering
+			EventSampler(parse_sample_rates(settings.log_sample_rates), settings.log_rate_limit),
 			structlog.processors.TimeStamper(fmt="iso"),
 			structlog.stdlib.add_log_level,
 			structlog.processors.StackInfoRenderer(),
 			structlog.processors.format_exc_info,
-			structlog.processors.JSONRenderer(),
+			structlog.processors.JSONRenderer(serializer=_json_dumps()),
 		],
 		wrapper_class=structlog.make_filtering_bound_logger(getattr(logging, level.upper(), logging.INFO)),
+		logger_factory=logger_factory,
 		cache_logger_on_first_use=True,
 	)
 
 
+def flush_logs(timeout: float = 2.0) -> bool:
+	return _sink.flush(timeout) if _sink is not None else True
+
+
 logger = structlog.get_logger()
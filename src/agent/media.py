@@ -1,42 +1,68 @@
 from __future__ import annotations
+import atexit
+import functools
 import os
 import shutil
 import subprocess
 import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Any
 
-import cv2
-import pytesseract
 from .config import get_settings
 from .logging_setup import logger
+from .scheduler import cpu_budget, task
+from .tracing import CACHE_LOOKUPS, in_context, span
 from .utils import ensure_dir
 
-# Set tesseract path - default to /usr/bin/tesseract (Docker/Linux) or use env var
-_tess_cmd = os.getenv("TESSERACT_CMD")
-if not _tess_cmd:
-	# Try common Linux paths
-	for path in ["/usr/bin/tesseract", "/usr/local/bin/tesseract"]:
-		if os.path.exists(path):
-			_tess_cmd = path
-			break
-if _tess_cmd:
-	pytesseract.pytesseract.tesseract_cmd = _tess_cmd
-	logger.info("tesseract.path.set", path=_tess_cmd)
-else:
-	logger.warn("tesseract.not.found")
-
-# Check for ffmpeg - try common paths
-_ffmpeg_path = shutil.which("ffmpeg")
-if not _ffmpeg_path:
-	# Try common Linux paths
-	for path in ["/usr/bin/ffmpeg", "/usr/local/bin/ffmpeg"]:
-		if os.path.exists(path):
-			_ffmpeg_path = path
-			break
-if _ffmpeg_path:
-	logger.info("ffmpeg.path.set", path=_ffmpeg_path)
-else:
-	logger.warn("ffmpeg.not.found.in.path")
+# cv2, pytesseract and faster-whisper are imported on first use so that
+# API-only processes never pay for them.
+
+
+@functools.lru_cache(maxsize=1)
+def _pytesseract():
+	import pytesseract
+	# Tesseract's OpenMP otherwise spins up a thread per core for every page;
+	# parallelism comes from running several tesseract processes instead
+	os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+	# Set tesseract path - default to /usr/bin/tesseract (Docker/Linux) or use env var
+	tess_cmd = os.getenv("TESSERACT_CMD")
+	if not tess_cmd:
+		# Try common Linux paths
+		for path in ["/usr/bin/tesseract", "/usr/local/bin/tesseract"]:
+			if os.path.exists(path):
+				tess_cmd = path
+				break
+	if tess_cmd:
+		pytesseract.pytesseract.tesseract_cmd = tess_cmd
+		logger.info("tesseract.path.set", path=tess_cmd)
+	else:
+		logger.warn("tesseract.not.found")
+	return pytesseract
+
+
+@functools.lru_cache(maxsize=1)
+def _ffmpeg_path() -> str | None:
+	# Check for ffmpeg - try common paths
+	ffmpeg_path = shutil.which("ffmpeg")
+	if not ffmpeg_path:
+		# Try common Linux paths
+		for path in ["/usr/bin/ffmpeg", "/usr/local/bin/ffmpeg"]:
+			if os.path.exists(path):
+				ffmpeg_path = path
+				break
+	if ffmpeg_path:
+		logger.info("ffmpeg.path.set", path=ffmpeg_path)
+	else:
+		logger.warn("ffmpeg.not.found.in.path")
+	return ffmpeg_path
+
+
+@functools.lru_cache(maxsize=2)
+def _whisper_model(model_size: str, cpu_threads: int = 0, num_workers: int = 1):
+	# num_workers > 1 keeps that many model replicas so concurrent transcribe() calls run in parallel
+	from faster_whisper import WhisperModel
+	logger.info("whisper.model.loading", model=model_size, cpu_threads=cpu_threads, num_workers=num_workers)
+	return WhisperModel(model_size, device="cpu", compute_type="int8", cpu_threads=cpu_threads, num_workers=num_workers)
 
 
 def extract_audio(video_path: str, out_dir: str) -> str | None:
@@ -45,13 +71,16 @@ def extract_audio(video_path: str, out_dir: str) -> str | None:
 		return None
 	ensure_dir(out_dir)
 	audio_path = os.path.join(out_dir, "audio.wav")
-	ffmpeg_cmd = _ffmpeg_path or "ffmpeg"
+	ffmpeg_cmd = _ffmpeg_path() or "ffmpeg"
 	cmd = [
 		ffmpeg_cmd, "-y", "-i", video_path,
 		"-vn", "-ac", "1", "-ar", "16000", "-f", "wav", audio_path
 	]
 	try:
-		res = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, timeout=120)
+		with task("ffmpeg"), span("ffmpeg.audio") as sp:
+			res = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, timeout=120)
+			if res.returncode == 0 and os.path.exists(audio_path):
+				sp["bytes"] = os.path.getsize(audio_path)
 		if res.returncode != 0:
 			logger.error("ffmpeg.audio.failed", returncode=res.returncode, stderr=res.stderr[:200])
 			return None
@@ -70,7 +99,108 @@ def extract_audio(video_path: str, out_dir: str) -> str | None:
 		return None
 
 
-def transcribe_audio(audio_path: str) -> str:
+def detect_speech(audio_path: str, audio=None) -> Dict[str, Any] | None:
+	"""VAD pre-pass; None when gating is disabled or the audio can't be analysed."""
+	settings = get_settings()
+	if not settings.vad_gate:
+		return None
+	try:
+		from .vad import detect_speech as _detect
+		with task("vad"), span("vad") as sp:
+			speech = _detect(audio_path, settings.vad_min_speech_ratio, audio)
+			sp.update(method=speech["method"], speech_ratio=speech["speech_ratio"], decision=speech["decision"], skipped_s=speech["skipped_s"])
+		logger.info("vad.done", method=speech["method"], speech_ratio=speech["speech_ratio"], decision=speech["decision"], skipped_s=speech["skipped_s"], elapsed_s=speech["elapsed_s"])
+		return speech
+	except Exception as e:
+		logger.warn("vad.failed", error=str(e))
+		return None
+
+
+def _segment_dicts(segments, offset: float = 0.0) -> List[Dict[str, Any]]:
+	return [
+		{"start": round(offset + seg.start, 2), "end": round(offset + seg.end, 2), "text": seg.text.strip()}
+		for seg in segments if getattr(seg, "text", "").strip()
+	]
+
+
+def _transcribe_chunk(model, audio, chunk: List[List[float]], clip: bool) -> List[Dict[str, Any]]:
+	from .vad import SAMPLE_RATE
+	start, end = chunk[0][0], chunk[-1][1]
+	piece = audio[int(start * SAMPLE_RATE):int(end * SAMPLE_RATE)]
+	if clip:
+		segments, _ = model.transcribe(piece, beam_size=1, clip_timestamps=[round(t - start, 3) for seg in chunk for t in seg])
+	else:
+		segments, _ = model.transcribe(piece, beam_size=1)
+	return _segment_dicts(segments, offset=start)
+
+
+def _transcribe_local(audio_path: str, speech: Dict[str, Any] | None, audio=None) -> List[Dict[str, Any]]:
+	settings = get_settings()
+	workers = max(1, settings.whisper_workers)
+	if workers > 1:
+		budget = settings.whisper_cpu_budget or cpu_budget(settings)
+		threads = max(1, budget // workers)
+	elif settings.whisper_cpu_budget:
+		threads = settings.whisper_cpu_budget
+	else:
+		# CTranslate2's own default is 4; never more than a fair share of the CPU budget
+		threads = max(1, min(4, cpu_budget(settings) // max(1, settings.max_whisper_decodes)))
+	model = _whisper_model(settings.whisper_local_model, threads, workers)
+	with task("whisper", cpu=threads * workers):
+		return _decode(model, audio_path, speech, workers, threads, audio)
+
+
+def _decode(model, audio_path: str, speech: Dict[str, Any] | None, workers: int, threads: int, audio=None) -> List[Dict[str, Any]]:
+	"""Run whisper over `audio` (the PCM of `audio_path`, loaded here if None).
+
+	Only a VAD "clip" decision limits decoding to the speech segments; otherwise
+	segments (or, without VAD, energy segments) just place the chunk cuts.
+	"""
+	settings = get_settings()
+	speech_segments = (speech or {}).get("segments")
+	clip = (speech or {}).get("decision") == "clip"
+	if workers > 1:
+		from .vad import SAMPLE_RATE, energy_segments, load_pcm, plan_chunks
+		if audio is None:
+			audio = load_pcm(audio_path)
+		duration = len(audio) / SAMPLE_RATE
+		if duration > settings.whisper_chunk_s:
+			if speech_segments is None:
+				speech_segments = energy_segments(audio)
+			chunks = plan_chunks(speech_segments, settings.whisper_chunk_s, None if clip else duration)
+			if len(chunks) > 1:
+				with span("whisper.chunks", items=len(chunks), workers=workers, cpu_threads=threads):
+					with ThreadPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+						# map() keeps chunk order, so segments come back already stitched
+						parts = list(pool.map(in_context(lambda c: _transcribe_chunk(model, audio, c, clip)), chunks))
+				return [seg for part in parts for seg in part]
+	source = audio if audio is not None else audio_path
+	clips = [t for seg in speech_segments or [] for t in seg] if clip else []
+	if clips:
+		segments, info = model.transcribe(source, beam_size=1, clip_timestamps=clips)
+	else:
+		segments, info = model.transcribe(source, beam_size=1)
+	return _segment_dicts(segments)
+
+
+def transcribe_segments(audio_path: str, speech: Dict[str, Any] | None = None, raise_errors: bool = False, audio=None) -> List[Dict[str, Any]]:
+	"""Timestamped transcript segments ({start, end, text}) for `audio_path`.
+
+	With a detect_speech() result, music-only clips are skipped and the local
+	backend decodes only the speech segments. `audio` is the already-loaded
+	PCM, if any. Failures are logged and give [] unless `raise_errors`.
+	"""
+	decision = (speech or {}).get("decision", "full")
+	with span("whisper", vad=decision, skipped_s=(speech or {}).get("skipped_s", 0.0)) as sp:
+		if decision == "skip":
+			logger.info("whisper.skipped.no_speech", speech_ratio=speech.get("speech_ratio"), skipped_s=speech.get("skipped_s"))
+			return []
+		segments = _transcribe(audio_path, speech, raise_errors, audio)
+		sp["items"] = len(segments)
+		return segments
+
+
+def _transcribe(audio_path: str, speech: Dict[str, Any] | None, raise_errors: bool, audio=None) -> List[Dict[str, Any]]:
 	settings = get_settings()
 	backend = settings.whisper_backend.lower()
 	if backend == "openai":
@@ -82,23 +212,28 @@ def transcribe_audio(audio_path: str) -> str:
 					model=settings.whisper_model,
 					file=f,
 				)
-			return resp.text or ""
+			text = (resp.text or "").strip()
+			return [{"start": 0.0, "end": None, "text": text}] if text else []
 		except Exception as e:
 			logger.warn("whisper.openai.failed", error=str(e))
 	# default: local faster-whisper
 	try:
-		from faster_whisper import WhisperModel
-		model_size = settings.whisper_local_model
-		model = WhisperModel(model_size, device="cpu", compute_type="int8")
-		segments, info = model.transcribe(audio_path, beam_size=1)
-		text_parts = [seg.text.strip() for seg in segments if getattr(seg, "text", "").strip()]
-		return " ".join(text_parts)
+		return _transcribe_local(audio_path, speech, audio)
 	except Exception as e:
 		logger.error("whisper.local.failed", error=str(e))
-		return ""
+		if raise_errors:
+			raise
+		return []
+
+
+def transcribe_audio(audio_path: str, speech: Dict[str, Any] | None = None) -> str:
+	return " ".join(seg["text"] for seg in transcribe_segments(audio_path, speech))
 
 
 def extract_keyframes(video_path: str, out_dir: str, max_frames: int = 8) -> List[str]:
+	import cv2
+	threads = max(1, get_settings().cv2_threads)
+	cv2.setNumThreads(threads)
 	ensure_dir(out_dir)
 	cap = cv2.VideoCapture(video_path)
 	if not cap.isOpened():
@@ -109,47 +244,126 @@ def extract_keyframes(video_path: str, out_dir: str, max_frames: int = 8) -> Lis
 	interval = max(1, length // max_frames)
 	idx = 0
 	count = 0
-	while count < max_frames:
-		cap.set(cv2.CAP_PROP_POS_FRAMES, idx)
-		ok, frame = cap.read()
-		if not ok:
-			break
-		# Use os.path.join and normalize path (handles Windows/Linux differences)
-		frame_path = os.path.normpath(os.path.join(out_dir, f"frame_{count:02d}.png"))
-		cv2.imwrite(frame_path, frame)
-		if os.path.exists(frame_path):
-			frames.append(frame_path)
-		count += 1
-		idx += interval
+	with task("keyframes", cpu=threads), span("keyframes") as sp:
+		while count < max_frames:
+			cap.set(cv2.CAP_PROP_POS_FRAMES, idx)
+			ok, frame = cap.read()
+			if not ok:
+				break
+			# Use os.path.join and normalize path (handles Windows/Linux differences)
+			frame_path = os.path.normpath(os.path.join(out_dir, f"frame_{count:02d}.png"))
+			cv2.imwrite(frame_path, frame)
+			if os.path.exists(frame_path):
+				frames.append(frame_path)
+			count += 1
+			idx += interval
+		sp["items"] = len(frames)
 	cap.release()
 	return frames
 
 
+@functools.lru_cache(maxsize=1)
+def _ocr_cache():
+	settings = get_settings()
+	if not settings.ocr_cache:
+		return None
+	from .ocr_cache import OcrCache
+	path = settings.ocr_cache_path or os.path.join(settings.temp_dir, "ocr_cache.json")
+	cache = OcrCache(
+		path,
+		max_entries=settings.ocr_cache_max_entries,
+		max_distance=settings.ocr_cache_max_distance,
+		flush_every=settings.ocr_cache_flush_every,
+		flush_interval_s=settings.ocr_cache_flush_s,
+	)
+	# Flushes are batched; write what is left when the process exits
+	atexit.register(_flush_quietly, cache)
+	return cache
+
+
+def _flush_quietly(cache) -> None:
+	try:
+		cache.flush()
+	except OSError as e:
+		logger.warn("ocr_cache.flush.failed", error=str(e))
+
+
 def ocr_images(image_paths: List[str]) -> str:
+	pytesseract = _pytesseract()
+	cache = _ocr_cache()
+	if cache is not None:
+		from .ocr_cache import dhash_file
 	texts = []
-	for p in image_paths:
+	hits = 0
+	with span("ocr", items=len(image_paths)) as sp:
+		for p in image_paths:
+			try:
+				# Recurring title cards/overlays are served from the perceptual-hash cache
+				h = dhash_file(p) if cache is not None else None
+				text = cache.get(h) if h is not None else None
+				cache_hit = text is not None
+				if cache_hit:
+					hits += 1
+				else:
+					with task("ocr"):
+						text = pytesseract.image_to_string(p) or ""
+					if h is not None:
+						cache.put(h, text)
+				logger.debug("ocr.frame", path=p, cache_hit=cache_hit, chars=len(text.strip()))
+				if text.strip():
+					texts.append(text.strip())
+			except Exception as e:
+				logger.warn("ocr.image.failed", path=p, error=str(e))
+		if cache is not None:
+			sp["cache_hits"] = hits
+			CACHE_LOOKUPS.labels("ocr", "hit").inc(hits)
+			CACHE_LOOKUPS.labels("ocr", "miss").inc(len(image_paths) - hits)
+	if cache is not None:
 		try:
-			text = pytesseract.image_to_string(p) or ""
-			if text.strip():
-				texts.append(text.strip())
-		except Exception as e:
-			logger.warn("ocr.image.failed", path=p, error=str(e))
+			cache.maybe_flush()
+		except OSError as e:
+			logger.warn("ocr_cache.flush.failed", error=str(e))
 	return "\n".join(texts)
 
 
 def process_media(video_path: str, work_dir: str) -> Dict[str, Any]:
+	"""Transcript, OCR text and keyframes for a video.
+
+	Steps that fail are logged and skipped; their names are listed in `failed`
+	so the caller can retry them later.
+	"""
+	failed: List[str] = []
 	audio_path = extract_audio(video_path, work_dir) if video_path else None
+	if video_path and not audio_path:
+		failed.append("audio")
 	transcript = ""
+	transcript_segments: List[Dict[str, Any]] = []
+	speech = None
 	if audio_path and os.path.exists(audio_path):
+		# Decoded once, shared by VAD and whisper
+		try:
+			from .vad import load_pcm
+			audio = load_pcm(audio_path)
+		except Exception as e:
+			logger.warn("audio.load.failed", error=str(e))
+			audio = None
+		speech = detect_speech(audio_path, audio)
 		try:
-			transcript = transcribe_audio(audio_path)
+			transcript_segments = transcribe_segments(audio_path, speech, raise_errors=True, audio=audio)
+			transcript = " ".join(seg["text"] for seg in transcript_segments)
 		except Exception as e:
 			logger.warn("whisper.failed", error=str(e))
+			failed.append("whisper")
 	frames = extract_keyframes(video_path, work_dir) if video_path else []
+	if video_path and not frames:
+		failed.append("keyframes")
 	ocr_text = ocr_images(frames) if frames else ""
 	return {
+		"failed": failed,
 		"transcript": transcript,
+		"transcript_segments": transcript_segments,
 		"ocr_text": ocr_text,
 		"frames": frames,
 		"audio_path": audio_path,
+		"speech": speech,
 	}
@@ -0,0 +1,202 @@
+from __future__ import annotations
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from .logging_setup import logger
+from .utils import ensure_dir, file_lock
+
+
+# 16x16 gradient grid = 256-bit hash. 8x8 (64 bits) merges different cards on
+# the same background; at 32x32 JPEG re-encoding alone flips ~2% of the bits,
+# so the same frame from another download stops matching.
+HASH_SIZE = 16
+HASH_BITS = HASH_SIZE * HASH_SIZE
+# Default match threshold as a share of the hash: re-encoded or rescaled copies
+# of a frame stay within ~2.5% of the bits.
+MAX_DISTANCE_RATIO = 1 / 32
+
+
+def dhash(gray: np.ndarray, size: int = HASH_SIZE) -> int:
+	"""size*size-bit difference hash of a grayscale image (any resolution)."""
+	import cv2
+	small = cv2.resize(gray, (size + 1, size), interpolation=cv2.INTER_AREA).astype(np.int16)
+	bits = (small[:, 1:] > small[:, :-1]).ravel()
+	return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def dhash_file(path: str, size: int = HASH_SIZE) -> int | None:
+	import cv2
+	gray = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+	if gray is None:
+		return None
+	return dhash(gray, size)
+
+
+def _hamming(a: int, b: int) -> int:
+	return (a ^ b).bit_count()
+
+
+class OcrCache:
+	"""Perceptual-hash -> OCR text cache with Hamming-distance lookup.
+
+	Near-duplicate lookup uses multi-index hashing: the hash is cut into
+	`max_distance + 1` blocks, and by pigeonhole any hash within `max_distance`
+	bits shares at least one block exactly, so only those buckets are checked.
+	Entries are evicted least-recently-used beyond `max_entries`. `maybe_flush`
+	writes to `path` once `flush_every` new entries or `flush_interval_s`
+	seconds have built up; `flush` writes unconditionally.
+	"""
+
+	def __init__(
+		self,
+		path: str | None = None,
+		max_entries: int = 5000,
+		max_distance: int | None = None,
+		hash_bits: int = HASH_BITS,
+		flush_every: int = 50,
+		flush_interval_s: float = 60.0,
+	):
+		self.path = path
+		self.max_entries = max_entries
+		self.max_distance = max_distance if max_distance is not None else int(hash_bits * MAX_DISTANCE_RATIO)
+		self.hash_bits = hash_bits
+		self.flush_every = flush_every
+		self.flush_interval_s = flush_interval_s
+		n_blocks = self.max_distance + 1
+		edges = np.linspace(0, hash_bits, n_blocks + 1).astype(int)
+		self._blocks: List[Tuple[int, int]] = [(int(lo), (1 << int(hi - lo)) - 1) for lo, hi in zip(edges[:-1], edges[1:])]
+		self._entries: "OrderedDict[int, str]" = OrderedDict()
+		self._index: List[Dict[int, set]] = [{} for _ in self._blocks]
+		self._lock = threading.Lock()
+		self._flush_lock = threading.Lock()
+		self._pending = 0
+		self._flushed_at = time.monotonic()
+		self.hits = 0
+		self.misses = 0
+		if path and os.path.exists(path):
+			self._load()
+
+	def _keys(self, h: int) -> List[int]:
+		return [(h >> shift) & mask for shift, mask in self._blocks]
+
+	def _add(self, h: int, text: str) -> None:
+		if h in self._entries:
+			self._entries.move_to_end(h)
+			self._entries[h] = text
+			return
+		self._entries[h] = text
+		for table, key in zip(self._index, self._keys(h)):
+			table.setdefault(key, set()).add(h)
+		while len(self._entries) > self.max_entries:
+			old, _ = self._entries.popitem(last=False)
+			for table, key in zip(self._index, self._keys(old)):
+				bucket = table.get(key)
+				if bucket is not None:
+					bucket.discard(old)
+					if not bucket:
+						del table[key]
+
+	def get(self, h: int) -> str | None:
+		with self._lock:
+			best, best_d = None, self.max_distance + 1
+			if h in self._entries:
+				best, best_d = h, 0
+			else:
+				for table, key in zip(self._index, self._keys(h)):
+					for cand in table.get(key, ()):
+						d = _hamming(h, cand)
+						if d < best_d:
+							best, best_d = cand, d
+			if best is None:
+				self.misses += 1
+				return None
+			self.hits += 1
+			self._entries.move_to_end(best)
+			return self._entries[best]
+
+	def put(self, h: int, text: str) -> None:
+		with self._lock:
+			self._add(h, text)
+			self._pending += 1
+
+	def __len__(self) -> int:
+		return len(self._entries)
+
+	def stats(self) -> Dict[str, float]:
+		lookups = self.hits + self.misses
+		return {
+			"entries": len(self._entries),
+			"hits": self.hits,
+			"misses": self.misses,
+			"hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+		}
+
+	def _read(self) -> List[List[str]]:
+		"""Entries stored at `path`, oldest first ([] if missing or incompatible)."""
+		try:
+			with open(self.path, "r", encoding="utf-8") as f:
+				data = json.load(f)
+		except FileNotFoundError:
+			return []
+		if data.get("hash_bits") != self.hash_bits:
+			logger.warn("ocr_cache.load.incompatible", path=self.path, hash_bits=data.get("hash_bits"))
+			return []
+		return data.get("entries", [])
+
+	def _load(self) -> None:
+		try:
+			# Stored oldest-first, so replaying keeps LRU order
+			for h, text in self._read():
+				self._add(int(h, 16), text)
+			logger.info("ocr_cache.loaded", path=self.path, entries=len(self._entries))
+		except (OSError, ValueError) as e:
+			logger.warn("ocr_cache.load.failed", path=self.path, error=str(e))
+
+	def maybe_flush(self) -> bool:
+		"""Flush if enough entries or time have built up; True if it wrote."""
+		if not self._pending:
+			return False
+		if self._pending < self.flush_every and time.monotonic() - self._flushed_at < self.flush_interval_s:
+			return False
+		self.flush()
+		return True
+
+	def flush(self) -> None:
+		"""Write entries to `path`, merged with whatever other processes saved there.
+
+		Other processes' entries are kept as older than this one's; the merge
+		runs under a lock file, and each writer renames in its own temp file.
+		"""
+		if not self.path or not self._pending:
+			return
+		with self._flush_lock:
+			with self._lock:
+				ours = [[f"{h:x}", text] for h, text in self._entries.items()]
+				self._pending = 0
+				self._flushed_at = time.monotonic()
+			dir_ = os.path.dirname(self.path) or "."
+			ensure_dir(dir_)
+			with file_lock(self.path + ".lock"):
+				try:
+					theirs = self._read()
+				except (OSError, ValueError) as e:
+					logger.warn("ocr_cache.merge.failed", path=self.path, error=str(e))
+					theirs = []
+				mine = {h for h, _ in ours}
+				merged = [e for e in theirs if e[0] not in mine] + ours
+				payload = {"hash_bits": self.hash_bits, "entries": merged[-self.max_entries:]}
+				fd, tmp = tempfile.mkstemp(dir=dir_, prefix=os.path.basename(self.path) + ".", suffix=".tmp")
+				try:
+					with os.fdopen(fd, "w", encoding="utf-8") as f:
+						json.dump(payload, f, ensure_ascii=False)
+					os.replace(tmp, self.path)
+				except BaseException:
+					os.unlink(tmp)
+					raise
@@ -1,17 +1,31 @@
 from __future__ import annotations
 import os
-from typing import Any, Dict, List, Tuple
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Tuple
 
+from .checkpoints import CheckpointStore, job_id_for_url
 from .config import get_settings
 from .logging_setup import logger
-from .downloader import download_reel
+from .downloader import download_reel, probe_reel
 from .media import process_media
 from .llm import extract_items_with_llm
-from .enrich import enrich_item
+from .enrich import enrich_item, enrich_products
 from .sheets import SheetsClient, local_csv_backup
+from .tracing import in_context, job_trace, span
 from .utils import now_iso, ensure_dir
 
 
+# Stage output key: the stage fell back to partial results. Its outputs are
+# used, but it is not checkpointed as done, so a resume retries it.
+DEGRADED = "_degraded"
+
+
+class Cancelled(RuntimeError):
+	"""The run was told to stop between stages (e.g. its job lease was lost)."""
+
+
 def item_to_row(global_index: int, timestamp: str, reel_url: str, item: Dict[str, Any]) -> List[Any]:
 	return [
 		global_index,
@@ -38,25 +52,35 @@ def item_to_row(global_index: int, timestamp: str, reel_url: str, item: Dict[str
 	]
 
 
-def process_reel_url(reel_url: str, origin_lat: float | None = None, origin_lng: float | None = None) -> Tuple[int, int, List[Dict[str, Any]]]:
-	settings = get_settings()
-	ensure_dir(settings.temp_dir)
+def _stage_download(ctx: Dict[str, Any]) -> Dict[str, Any]:
 	try:
-		meta = download_reel(reel_url, settings.temp_dir)
+		meta = download_reel(ctx["reel_url"], ctx["work_dir"])
 	except Exception as e:
 		logger.error("pipeline.download.failed", error=str(e))
 		raise
-	caption = meta.get("caption") or ""
-	video_path = meta.get("video_path")
+	return {"caption": meta.get("caption") or "", "video_path": meta.get("video_path")}
+
+
+def _stage_media(ctx: Dict[str, Any]) -> Dict[str, Any]:
+	video_path = ctx.get("video_path")
 	media = {"transcript": "", "ocr_text": ""}
 	if video_path and os.path.exists(video_path):
 		try:
-			media = process_media(video_path, settings.temp_dir)
+			media = process_media(video_path, ctx["work_dir"])
 		except Exception as e:
 			logger.error("pipeline.media.failed", error=str(e), error_type=type(e).__name__)
 			# Continue with empty media if processing fails
-			media = {"transcript": "", "ocr_text": ""}
-	
+			media = {"transcript": "", "ocr_text": "", "failed": [type(e).__name__]}
+	out = {"media": media}
+	if media.get("failed"):
+		# Carry on with what we have, but a resumed job runs media again
+		out[DEGRADED] = media["failed"]
+	return out
+
+
+def _stage_extract(ctx: Dict[str, Any]) -> Dict[str, Any]:
+	caption = ctx.get("caption") or ""
+	media = ctx.get("media") or {}
 	source_blob = "\n\n".join(filter(None, [
 		f"caption: {caption}",
 		f"transcript: {media.get('transcript','')}" if media.get('transcript') else "",
@@ -71,14 +95,36 @@ def process_reel_url(reel_url: str, origin_lat: float | None = None, origin_lng:
 	
 	if not items:
 		raise ValueError("No items extracted from reel")
-	
-	for it in items:
-		it["source_text"] = (caption or "")[:200]
-		try:
-			it = enrich_item(it, origin_lat, origin_lng)
-		except Exception as e:
-			logger.warn("pipeline.enrich.failed", item=it.get("item_name"), error=str(e))
+	return {"items": items}
+
+
+def _stage_enrich(ctx: Dict[str, Any]) -> Dict[str, Any]:
+	caption = ctx.get("caption") or ""
+	items = ctx["items"]
+	products = [it for it in items if (it.get("type") or "").lower() == "product"]
+	# Price lookups (bounded by PRICE_TIMEOUT_S) run while places are geocoded
+	with ThreadPoolExecutor(max_workers=1) as pool:
+		pricing = pool.submit(in_context(enrich_products), products) if products else None
+		for it in items:
+			it["source_text"] = caption[:200]
+			if any(it is p for p in products):
+				continue
+			try:
+				it = enrich_item(it)
+			except Exception as e:
+				logger.warn("pipeline.enrich.failed", item=it.get("item_name"), error=str(e))
+		if pricing is not None:
+			try:
+				pricing.result()
+			except Exception as e:
+				logger.warn("pipeline.enrich.products.failed", error=str(e))
+	if ctx.get("origin_lat") is not None and ctx.get("origin_lng") is not None:
+		from .geo import annotate_distances
+		annotate_distances(items, ctx["origin_lat"], ctx["origin_lng"])
+	return {"items": items}
 
+
+def _choose_sheet_id(settings, items: List[Dict[str, Any]]) -> str:
 	# Choose sheet by domain
 	sheet_id = settings.google_sheet_id
 	if any((it.get("type") or "").lower() in ("place", "hotel") for it in items) and settings.sheet_travel_id:
@@ -88,14 +134,11 @@ def process_reel_url(reel_url: str, origin_lat: float | None = None, origin_lng:
 
 	if not sheet_id:
 		raise ValueError("No Google Sheet ID configured")
+	return sheet_id
 
-	# Build rows with correct global Index
-	timestamp = now_iso()
-	
-	# Get client and calculate next index
-	client = SheetsClient(sheet_id=sheet_id)
+
+def _next_index(client: SheetsClient) -> int:
 	next_index = 1
-	
 	try:
 		# Try to get the last row to calculate next index
 		last_rows = client.get_last_n_rows(n=1, sheet_name="Sheet1")
@@ -113,27 +156,337 @@ def process_reel_url(reel_url: str, origin_lat: float | None = None, origin_lng:
 		logger.warn("pipeline.index.calc.failed", error=str(e))
 		# Start from 1 if we can't calculate
 		next_index = 1
-	
+	return next_index
+
+
+def _backup_once(ctx: Dict[str, Any], rows: List[List[Any]]) -> None:
+	# Retries of a failed job must not append the same rows to the CSV twice
+	if ctx.get("backup_written"):
+		return
+	settings = ctx["settings"]
+	local_csv_backup(os.path.join(settings.temp_dir, "backup.csv"), rows)
+	if settings.archive:
+		try:
+			from .archive import get_archive
+			get_archive(settings).append_rows(rows)
+		except Exception as e:
+			logger.warn("pipeline.archive.failed", error=str(e))
+	ctx["state"]["data"]["backup_written"] = True
+
+
+def _append_once(ctx: Dict[str, Any], key: str, client: SheetsClient, rows: List[List[Any]]) -> Dict[str, Any]:
+	"""Append `rows` unless this job already has; returns {"result", "start_index"}.
+
+	Under the job's lock, cancellation is checked right before the write and
+	the outcome is saved to the checkpoint right after it, so a retried or
+	taken-over job finds the rows already there instead of appending them again.
+	"""
+	store, job_id, state = ctx["store"], ctx["job_id"], ctx["state"]
+	with store.lock(job_id):
+		appended = state.setdefault("appended", {})
+		done = appended.get(key) or store.load(job_id).get("appended", {}).get(key)
+		if done:
+			logger.info("pipeline.append.skipped", job_id=job_id, key=key, start_index=done["start_index"])
+			appended[key] = done
+			return done
+		cancel = ctx.get("cancel")
+		if cancel is not None and cancel.is_set():
+			logger.warn("pipeline.cancelled", job_id=job_id, append=key)
+			raise Cancelled(f"cancelled before appending {key} rows")
+		appended[key] = {"result": client.append_rows(rows, sheet_name="Sheet1"), "start_index": rows[0][0]}
+		store.save(job_id, state)
+		return appended[key]
+
+
+def _stage_persist(ctx: Dict[str, Any]) -> Dict[str, Any]:
+	items = ctx["items"]
+	reel_url = ctx["reel_url"]
+	client = SheetsClient(sheet_id=_choose_sheet_id(ctx["settings"], items))
+
+	# Build rows with correct global Index
+	timestamp = now_iso()
+	next_index = _next_index(client)
 	rows = []
 	for i, it in enumerate(items, start=0):
 		global_idx = next_index + i
 		rows.append(item_to_row(global_idx, timestamp, reel_url, it))
 
 	try:
-		result = client.append_rows(rows, sheet_name="Sheet1")
-		updates = result.get("updates", {})
+		appended = _append_once(ctx, "persist", client, rows)
+		if appended["start_index"] != next_index:
+			next_index = appended["start_index"]
+			rows = [item_to_row(next_index + i, timestamp, reel_url, it) for i, it in enumerate(items)]
+		updates = appended["result"].get("updates", {})
 		updated_range = updates.get("updatedRange", "unknown")
 		logger.info("pipeline.sheets.success", range=updated_range, rows=len(rows))
+	except Cancelled:
+		raise
 	except Exception as e:
 		logger.error("pipeline.sheets.failed", error=str(e))
 		# Still backup locally
-		backup_path = os.path.join(settings.temp_dir, "backup.csv")
-		local_csv_backup(backup_path, rows)
+		_backup_once(ctx, rows)
 		raise
 	
 	# Fallback/local backup
-	backup_path = os.path.join(settings.temp_dir, "backup.csv")
-	local_csv_backup(backup_path, rows)
+	_backup_once(ctx, rows)
 
 	# Return start and end index
-	return (next_index, next_index + len(rows) - 1, items)
+	return {"start_index": next_index, "end_index": next_index + len(rows) - 1}
+
+
+# --- progressive mode: caption-only rows first, refined in place once media is done
+
+_A1_ROWS_RE = re.compile(r"![A-Z]+(\d+)(?::[A-Z]+(\d+))?$")
+
+
+def _stage_probe(ctx: Dict[str, Any]) -> Dict[str, Any]:
+	meta = probe_reel(ctx["reel_url"])
+	return {"caption": meta.get("caption") or ""}
+
+
+def _stage_quick_extract(ctx: Dict[str, Any]) -> Dict[str, Any]:
+	if not (ctx.get("caption") or "").strip():
+		return {"provisional_items": []}
+	try:
+		items = _stage_extract({**ctx, "media": {}})["items"]
+	except ValueError:
+		return {"provisional_items": []}
+	items = _stage_enrich({**ctx, "items": items})["items"]
+	for it in items:
+		it["processing_status"] = "provisional"
+	return {"provisional_items": items}
+
+
+def _stage_provisional(ctx: Dict[str, Any]) -> Dict[str, Any]:
+	items = ctx.get("provisional_items") or []
+	if not items:
+		return {"provisional": None}
+	sheet_id = _choose_sheet_id(ctx["settings"], items)
+	client = SheetsClient(sheet_id=sheet_id)
+	next_index = _next_index(client)
+	timestamp = now_iso()
+	rows = [item_to_row(next_index + i, timestamp, ctx["reel_url"], it) for i, it in enumerate(items)]
+	appended = _append_once(ctx, "provisional", client, rows)
+	if appended["start_index"] != next_index:
+		next_index = appended["start_index"]
+		rows = [item_to_row(next_index + i, timestamp, ctx["reel_url"], it) for i, it in enumerate(items)]
+	updated_range = appended["result"].get("updates", {}).get("updatedRange") or ""
+	m = _A1_ROWS_RE.search(updated_range)
+	if not m:
+		logger.warn("pipeline.provisional.range.unknown", range=updated_range)
+	on_update = ctx.get("on_update")
+	if on_update:
+		try:
+			on_update("provisional", (next_index, next_index + len(rows) - 1, items))
+		except Exception as e:
+			logger.warn("pipeline.on_update.failed", error=str(e))
+	return {"provisional": {
+		"sheet_id": sheet_id,
+		"range": updated_range,
+		"first_row": int(m.group(1)) if m else None,
+		"start_index": next_index,
+		"rows": rows,
+	}}
+
+
+def _stage_refined_extract(ctx: Dict[str, Any]) -> Dict[str, Any]:
+	try:
+		return _stage_extract(ctx)
+	except ValueError:
+		# The job fails here, so caption-only rows would otherwise stay "provisional" for good
+		prov = ctx.get("provisional")
+		if prov and prov.get("first_row"):
+			rows = [list(row[:-1]) + ["failed"] for row in prov["rows"]]
+			try:
+				SheetsClient(sheet_id=prov["sheet_id"]).update_rows(prov["first_row"], rows, sheet_name="Sheet1")
+				logger.warn("pipeline.provisional.failed", range=prov["range"], rows=len(rows))
+			except Exception as e:
+				logger.error("pipeline.provisional.mark_failed.failed", error=str(e))
+		raise
+
+
+def _item_key(name: Any, kind: Any) -> Tuple[str, str]:
+	# Refinement may reorder, rename slightly or drop items; match on what stays put
+	return " ".join(re.findall(r"[a-z0-9]+", str(name or "").lower())), str(kind or "").lower()
+
+
+def _stage_refine(ctx: Dict[str, Any]) -> Dict[str, Any]:
+	prov = ctx.get("provisional")
+	if not prov or not prov.get("first_row"):
+		return _stage_persist(ctx)
+	items = ctx["items"]
+	client = SheetsClient(sheet_id=prov["sheet_id"])
+	timestamp = now_iso()
+	sheet_id = _choose_sheet_id(ctx["settings"], items)
+	if sheet_id != prov["sheet_id"]:
+		# The refined types belong in another sheet: retire every provisional row there
+		logger.info("pipeline.refine.sheet_changed", old=prov["sheet_id"], new=sheet_id)
+		client.update_rows(prov["first_row"], [list(old[:-1]) + ["superseded"] for old in prov["rows"]], sheet_name="Sheet1")
+		return _stage_persist(ctx)
+
+	# Refined items replace the provisional row with the same name and type;
+	# provisional rows nobody matched are flagged (Index stays contiguous)
+	slots: Dict[Tuple[str, str], List[int]] = {}
+	for pos, old in enumerate(prov["rows"]):
+		slots.setdefault(_item_key(old[5], old[4]), []).append(pos)
+	updated: List[Any] = [list(old[:-1]) + ["superseded"] for old in prov["rows"]]
+	final_rows, extra = [], []
+	for it in items:
+		free = slots.get(_item_key(it.get("item_name"), it.get("type")))
+		if free:
+			pos = free.pop(0)
+			updated[pos] = item_to_row(prov["rows"][pos][0], timestamp, ctx["reel_url"], it)
+			final_rows.append(updated[pos])
+		else:
+			extra.append(it)
+	superseded = len(prov["rows"]) - len(final_rows)
+	try:
+		client.update_rows(prov["first_row"], updated, sheet_name="Sheet1")
+		if extra:
+			next_index = _next_index(client)
+			extra_rows = [item_to_row(next_index + i, timestamp, ctx["reel_url"], it) for i, it in enumerate(extra)]
+			appended = _append_once(ctx, "refine", client, extra_rows)
+			if appended["start_index"] != next_index:
+				next_index = appended["start_index"]
+				extra_rows = [item_to_row(next_index + i, timestamp, ctx["reel_url"], it) for i, it in enumerate(extra)]
+			final_rows += extra_rows
+		logger.info("pipeline.refine.success", range=prov["range"], updated=len(items) - len(extra), superseded=superseded, appended=len(extra))
+	except Exception as e:
+		logger.error("pipeline.refine.failed", error=str(e))
+		_backup_once(ctx, final_rows)
+		raise
+	_backup_once(ctx, final_rows)
+	indexes = [row[0] for row in final_rows]
+	return {"start_index": min(indexes), "end_index": max(indexes)}
+
+
+# Linear stage graph: (name, function, names of stages whose outputs it reads)
+STAGES: List[Tuple[str, Callable[[Dict[str, Any]], Dict[str, Any]], Tuple[str, ...]]] = [
+	("download", _stage_download, ()),
+	("media", _stage_media, ("download",)),
+	("extract", _stage_extract, ("download", "media")),
+	("enrich", _stage_enrich, ("download", "extract")),
+	("persist", _stage_persist, ("enrich",)),
+]
+
+
+PROGRESSIVE_STAGES: List[Tuple[str, Callable[[Dict[str, Any]], Dict[str, Any]], Tuple[str, ...]]] = [
+	("probe", _stage_probe, ()),
+	("quick_extract", _stage_quick_extract, ("probe",)),
+	("provisional", _stage_provisional, ("quick_extract",)),
+	("download", _stage_download, ()),
+	("media", _stage_media, ("download",)),
+	("extract", _stage_refined_extract, ("download", "media", "provisional")),
+	("enrich", _stage_enrich, ("download", "extract")),
+	("refine", _stage_refine, ("provisional", "enrich")),
+]
+
+
+def _stages_for(mode: str):
+	return PROGRESSIVE_STAGES if mode == "progressive" else STAGES
+
+
+def stage_graph(progressive: bool = False) -> List[Dict[str, Any]]:
+	return [{"name": name, "depends_on": list(deps)} for name, _, deps in _stages_for("progressive" if progressive else "standard")]
+
+
+def _run_stages(store: CheckpointStore, job_id: str, state: Dict[str, Any], ctx: Dict[str, Any]) -> Dict[str, Any]:
+	stages = state.setdefault("stages", {})
+	data = state.setdefault("data", {})
+	ran = set()
+	for name, fn, deps in _stages_for(state.get("mode", "standard")):
+		# A stage whose inputs were just recomputed (e.g. a degraded media retry) runs again too
+		if stages.get(name, {}).get("status") == "done" and not ran.intersection(deps):
+			logger.info("pipeline.stage.skipped", job_id=job_id, stage=name)
+			continue
+		cancel = ctx.get("cancel")
+		if cancel is not None and cancel.is_set():
+			logger.warn("pipeline.cancelled", job_id=job_id, stage=name)
+			raise Cancelled(f"cancelled before stage {name}")
+		ran.add(name)
+		stage_ctx = {**ctx, **data, "state": state}
+		started = time.perf_counter()
+		try:
+			with span(f"stage.{name}"):
+				out = fn(stage_ctx)
+		except Exception as e:
+			stages[name] = {
+				"status": "failed",
+				"error": str(e)[:500],
+				"duration_s": round(time.perf_counter() - started, 3),
+				"attempts": stages.get(name, {}).get("attempts", 0) + 1,
+			}
+			store.save(job_id, state)
+			raise
+		degraded = out.pop(DEGRADED, None)
+		data.update(out)
+		stages[name] = {
+			"status": "degraded" if degraded else "done",
+			"duration_s": round(time.perf_counter() - started, 3),
+			"finished_at": now_iso(),
+			"attempts": stages.get(name, {}).get("attempts", 0) + 1,
+		}
+		if degraded:
+			stages[name]["degraded"] = degraded
+		store.save(job_id, state)
+		logger.info("pipeline.stage.done", job_id=job_id, stage=name, duration_s=stages[name]["duration_s"], degraded=degraded)
+	return state
+
+
+def process_reel_url(
+	reel_url: str,
+	origin_lat: float | None = None,
+	origin_lng: float | None = None,
+	job_id: str | None = None,
+	progressive: bool | None = None,
+	on_update: Callable[[str, Tuple[int, int, List[Dict[str, Any]]]], None] | None = None,
+	cancel: Any = None,
+) -> Tuple[int, int, List[Dict[str, Any]]]:
+	"""Run (or resume) the pipeline for one reel and return (start_index, end_index, items).
+
+	In progressive mode (PROGRESSIVE_RESULTS, or `progressive=True`) caption-only
+	rows are written first and reported through `on_update("provisional", ...)`;
+	they are then overwritten in place once transcript/OCR extraction finishes.
+
+	`cancel` is anything with is_set() (a threading.Event, worker.LeaseCheck);
+	once set, the run stops with `Cancelled` before its next stage or sheet
+	append, leaving the checkpoint in place.
+	"""
+	settings = get_settings()
+	ensure_dir(settings.temp_dir)
+	store = CheckpointStore(os.path.join(settings.temp_dir, "jobs"))
+	job_id = job_id or job_id_for_url(reel_url)
+	# Runs sharing a job ID share its checkpoint and work dir (e.g. two chats
+	# sending the same reel): one at a time, so a finishing run can't clear
+	# media another is still using. Other reels are never held up.
+	with store.claim(job_id):
+		state = store.load(job_id)
+		if state.get("reel_url") not in (None, reel_url):
+			state = {}
+		if state:
+			logger.info("pipeline.resume", job_id=job_id, done=[n for n, s in state.get("stages", {}).items() if s.get("status") == "done"])
+		state.setdefault("job_id", job_id)
+		state.setdefault("reel_url", reel_url)
+		# A resumed job keeps the mode it started with, so provisional rows are never re-appended
+		if progressive is None:
+			progressive = settings.progressive_results
+		state.setdefault("mode", "progressive" if progressive else "standard")
+		ctx = {
+			"reel_url": reel_url,
+			"origin_lat": origin_lat,
+			"origin_lng": origin_lng,
+			"settings": settings,
+			"work_dir": store.job_dir(job_id),
+			"on_update": on_update,
+			"cancel": cancel,
+			"store": store,
+			"job_id": job_id,
+		}
+		dump_dir = os.path.join(settings.temp_dir, "traces") if settings.trace_dump else None
+		with job_trace(job_id, dump_dir):
+			state = _run_stages(store, job_id, state, ctx)
+		data = state["data"]
+		logger.info("pipeline.done", job_id=job_id, timings={n: s.get("duration_s") for n, s in state["stages"].items()})
+		# Job finished; drop its checkpoint and media so a later resend starts fresh
+		store.clear(job_id)
+		return (data["start_index"], data["end_index"], data["items"])
@@ -0,0 +1,402 @@
+from __future__ import annotations
+import functools
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+from urllib.parse import quote_plus, urlparse
+
+from .config import get_settings
+from .logging_setup import logger
+from .tracing import CACHE_LOOKUPS, in_context, span
+from .utils import ensure_dir
+
+
+_TOKEN_RE = re.compile(r"[0-9a-z]+")
+
+
+def _tokens(text: str | None) -> List[str]:
+	text = unicodedata.normalize("NFKD", text or "").encode("ascii", "ignore").decode().lower()
+	return _TOKEN_RE.findall(text)
+
+
+def product_key(brand: str | None, name: str | None) -> str:
+	"""Cache key for a product: "Nike Air-Max 90" + "NIKE" and "air max 90 nike" match."""
+	return " ".join(sorted(set(_tokens(brand) + _tokens(name))))
+
+
+# Title words that mark an accessory for the product rather than the product
+_ACCESSORY_WORDS = frozenset(("case", "cover", "laces", "strap", "band", "charger", "cable", "sticker", "skin", "protector", "replacement", "compatible", "for"))
+
+
+def _match_score(key: str, title: str | None) -> float:
+	"""Share of the product's words found in an offer title; 0 if a model number
+	is missing or different ("Air Max 95" is not an "Air Max 90") or the title
+	names an accessory ("case for ...") the product itself doesn't.
+	"""
+	wanted = set(key.split())
+	if not wanted:
+		return 0.0
+	found = set(_tokens(title))
+	if any(w not in found for w in wanted if any(c.isdigit() for c in w)):
+		return 0.0
+	if (found & _ACCESSORY_WORDS) - wanted:
+		return 0.0
+	return len(wanted & found) / len(wanted)
+
+
+_CURRENCY_SYMBOLS = {"₹": "INR", "Rs": "INR", "RS": "INR", "$": "USD", "US$": "USD", "€": "EUR", "£": "GBP", "¥": "JPY"}
+_CURRENCY_RE = re.compile(r"US\$|[$€£¥₹]|\bR[Ss]\b|\b[A-Z]{3}\b")
+
+
+def _currency(value: Any) -> str:
+	"""ISO code from a currency field or price string ("inr", "₹7,999", "Rs 7,999", "EUR 12"); "" if unknown."""
+	text = str(value or "").strip()
+	if re.fullmatch(r"[A-Za-z]{3}", text):
+		return text.upper()
+	m = _CURRENCY_RE.search(text)
+	return _CURRENCY_SYMBOLS.get(m.group(0), m.group(0)) if m else ""
+
+
+def _parse_price(value: Any) -> float | None:
+	if isinstance(value, (int, float)):
+		return float(value)
+	m = re.search(r"\d[\d,]*(?:\.\d+)?", str(value or ""))
+	return float(m.group(0).replace(",", "")) if m else None
+
+
+# ---------------------------------------------------------------- providers
+
+class PriceProvider:
+	"""One price/link source. `lookup` returns offers as dicts with title,
+	price (float), currency, url and source; HTTP goes through `session`, which
+	the engine pools and rate-limits per `domain`.
+	"""
+
+	name = "base"
+	domain = ""
+
+	def lookup(self, query: str, session, timeout: float) -> List[Dict[str, Any]]:
+		raise NotImplementedError
+
+
+class JsonSearchProvider(PriceProvider):
+	"""Generic JSON search endpoint: GET `url_template` with {query} filled in,
+	answering {"results": [{"title", "price", "currency", "url", "source"}, ...]}.
+	"""
+
+	def __init__(self, url_template: str, name: str | None = None):
+		self.url_template = url_template
+		self.domain = urlparse(url_template).netloc
+		self.name = name or self.domain
+
+	def lookup(self, query: str, session, timeout: float) -> List[Dict[str, Any]]:
+		r = session.get(self.url_template.format(query=quote_plus(query)), timeout=timeout)
+		r.raise_for_status()
+		offers = []
+		for res in (r.json() or {}).get("results", []):
+			price = _parse_price(res.get("price"))
+			if price is not None:
+				offers.append({
+					"title": res.get("title"),
+					"price": price,
+					"currency": _currency(res.get("currency") or res.get("price")),
+					"url": res.get("url"),
+					"source": res.get("source") or self.name,
+				})
+		return offers
+
+
+class SerpApiShoppingProvider(PriceProvider):
+	"""Google Shopping results through SerpAPI (needs SERPAPI_API_KEY)."""
+
+	name = "google-shopping"
+	domain = "serpapi.com"
+
+	def __init__(self, api_key: str, country: str | None = None):
+		self.api_key = api_key
+		self.country = country
+
+	def lookup(self, query: str, session, timeout: float) -> List[Dict[str, Any]]:
+		params = {"engine": "google_shopping", "q": query, "api_key": self.api_key}
+		if self.country:
+			params["gl"] = self.country
+		r = session.get("https://serpapi.com/search.json", params=params, timeout=timeout)
+		r.raise_for_status()
+		offers = []
+		for res in (r.json() or {}).get("shopping_results", []):
+			price = _parse_price(res.get("extracted_price", res.get("price")))
+			if price is not None:
+				offers.append({
+					"title": res.get("title"),
+					"price": price,
+					"currency": _currency(res.get("price")),  # e.g. "₹7,999.00"
+					"url": res.get("product_link") or res.get("link"),
+					"source": res.get("source") or self.name,
+				})
+		return offers
+
+
+# name -> factory(arg, settings); "json:<url template>" passes the URL as arg
+PROVIDER_FACTORIES: Dict[str, Callable[[str, Any], PriceProvider | None]] = {
+	"json": lambda arg, settings: JsonSearchProvider(arg),
+	"serpapi": lambda arg, settings: SerpApiShoppingProvider(settings.serpapi_api_key, settings.price_country) if settings.serpapi_api_key else None,
+}
+
+
+def register_provider(name: str, factory: Callable[[str, Any], PriceProvider | None]) -> None:
+	PROVIDER_FACTORIES[name] = factory
+
+
+def providers_from_spec(spec: str, settings) -> List[PriceProvider]:
+	"""PRICE_PROVIDERS, e.g. "serpapi,json:https://prices.example.com/search?q={query}"."""
+	providers = []
+	for part in (spec or "").split(","):
+		part = part.strip()
+		if not part:
+			continue
+		name, _, arg = part.partition(":")
+		factory = PROVIDER_FACTORIES.get(name)
+		if factory is None:
+			logger.warn("prices.provider.unknown", provider=name)
+			continue
+		provider = factory(arg, settings)
+		if provider is None:
+			logger.warn("prices.provider.unconfigured", provider=name)
+			continue
+		providers.append(provider)
+	return providers
+
+
+# ---------------------------------------------------------------- cache
+
+class PriceCache:
+	"""Persistent product-key -> best offer cache in SQLite with TTLs.
+
+	Misses (no offer found) are cached too, for a shorter `negative_ttl_s`, so an
+	unknown product doesn't hit every provider on every reel.
+	"""
+
+	def __init__(self, path: str, ttl_s: float, negative_ttl_s: float):
+		self.path = path
+		self.ttl_s = ttl_s
+		self.negative_ttl_s = negative_ttl_s
+		ensure_dir(os.path.dirname(path) or ".")
+		with self._conn() as conn:
+			conn.execute("PRAGMA journal_mode=WAL")
+			conn.execute("CREATE TABLE IF NOT EXISTS prices (key TEXT PRIMARY KEY, offer TEXT, fetched_at REAL NOT NULL)")
+
+	@contextmanager
+	def _conn(self) -> Iterator[sqlite3.Connection]:
+		conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+		try:
+			yield conn
+		finally:
+			conn.close()
+
+	def get(self, key: str) -> Tuple[bool, Dict[str, Any] | None]:
+		"""(hit, offer); a hit with offer None is a cached miss."""
+		with self._conn() as conn:
+			row = conn.execute("SELECT offer, fetched_at FROM prices WHERE key=?", (key,)).fetchone()
+		if row is None:
+			return False, None
+		offer = json.loads(row[0]) if row[0] else None
+		ttl = self.ttl_s if offer else self.negative_ttl_s
+		if time.time() - row[1] > ttl:
+			return False, None
+		return True, offer
+
+	def put(self, key: str, offer: Dict[str, Any] | None) -> None:
+		with self._conn() as conn:
+			conn.execute(
+				"INSERT OR REPLACE INTO prices (key, offer, fetched_at) VALUES (?, ?, ?)",
+				(key, json.dumps(offer) if offer else None, time.time()),
+			)
+
+
+# ---------------------------------------------------------------- engine
+
+class _DomainGate:
+	"""Per-domain concurrency cap plus a request-spacing rate limit."""
+
+	def __init__(self, concurrency: int, rate_per_s: float):
+		self.slots = threading.BoundedSemaphore(max(1, concurrency))
+		self.interval = 1.0 / rate_per_s if rate_per_s > 0 else 0.0
+		self._next = 0.0
+		self._lock = threading.Lock()
+
+	@contextmanager
+	def enter(self, deadline: float) -> Iterator[bool]:
+		"""Yields False (without waiting) if the request could not start before `deadline`."""
+		if not self.slots.acquire(timeout=max(0.0, deadline - time.monotonic())):
+			yield False
+			return
+		try:
+			with self._lock:
+				now = time.monotonic()
+				start = max(now, self._next)
+				if start >= deadline:
+					start = None
+				else:
+					self._next = start + self.interval
+			if start is None:
+				yield False
+				return
+			if start > now:
+				time.sleep(start - now)
+			yield True
+		finally:
+			self.slots.release()
+
+
+class PriceEngine:
+	"""Looks products up across all providers concurrently.
+
+	Each domain gets its own pooled HTTP session, concurrency cap and rate
+	limit. A whole batch shares one `timeout_s` deadline: whatever has not
+	answered by then is abandoned, so enrichment never holds a reel up for long.
+	"""
+
+	def __init__(
+		self,
+		providers: List[PriceProvider],
+		cache: PriceCache | None = None,
+		timeout_s: float = 8.0,
+		request_timeout_s: float = 4.0,
+		domain_concurrency: int = 4,
+		domain_rate: float = 2.0,
+		max_workers: int = 16,
+		currency: str | None = None,
+	):
+		self.providers = providers
+		self.currency = currency
+		self.cache = cache
+		self.timeout_s = timeout_s
+		self.request_timeout_s = request_timeout_s
+		self.domain_concurrency = domain_concurrency
+		self.domain_rate = domain_rate
+		self._sessions: Dict[str, Any] = {}
+		self._gates: Dict[str, _DomainGate] = {}
+		self._lock = threading.Lock()
+		self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="prices")
+
+	def _session(self, domain: str):
+		with self._lock:
+			if domain not in self._sessions:
+				import requests
+				from requests.adapters import HTTPAdapter
+				session = requests.Session()
+				adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.domain_concurrency)
+				session.mount("http://", adapter)
+				session.mount("https://", adapter)
+				session.headers["User-Agent"] = "reel-extractor-ai-agent/1.0"
+				self._sessions[domain] = session
+				self._gates[domain] = _DomainGate(self.domain_concurrency, self.domain_rate)
+			return self._sessions[domain], self._gates[domain]
+
+	def _query_provider(self, provider: PriceProvider, query: str, deadline: float) -> List[Dict[str, Any]] | None:
+		"""Offers from one provider; None if the deadline passed before it could be asked."""
+		session, gate = self._session(provider.domain)
+		with gate.enter(deadline) as admitted:
+			if not admitted:
+				logger.debug("prices.provider.skipped", provider=provider.name, reason="deadline")
+				return None
+			timeout = max(0.1, min(self.request_timeout_s, deadline - time.monotonic()))
+			with span(f"prices.{provider.name}"):
+				return provider.lookup(query, session, timeout)
+
+	def lookup_many(self, products: List[Tuple[str | None, str | None]]) -> List[Dict[str, Any] | None]:
+		"""Best offer (or None) for each (brand, name), in order."""
+		deadline = time.monotonic() + self.timeout_s
+		keys = [product_key(brand, name) for brand, name in products]
+		results: Dict[str, Dict[str, Any] | None] = {}
+		pending: Dict[Any, Tuple[str, PriceProvider]] = {}
+		offers: Dict[str, List[Dict[str, Any]]] = {}
+		answered: Dict[str, int] = {}
+		for (brand, name), key in zip(products, keys):
+			if not key or key in results or key in offers:
+				continue
+			if self.cache is not None:
+				hit, offer = self.cache.get(key)
+				CACHE_LOOKUPS.labels("prices", "hit" if hit else "miss").inc()
+				if hit:
+					results[key] = offer
+					continue
+			# "Nike" + "Nike Air Max 90" searches for the name alone
+			query = name or ""
+			if brand and not set(_tokens(brand)) <= set(_tokens(name)):
+				query = f"{brand} {query}".strip()
+			offers[key] = []
+			answered[key] = 0
+			for provider in self.providers:
+				pending[self._pool.submit(in_context(self._query_provider), provider, query, deadline)] = (key, provider)
+		futures = set(pending)
+		while futures:
+			done, futures = wait(futures, timeout=max(0.0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+			if not done:
+				break
+			for fut in done:
+				key, provider = pending[fut]
+				try:
+					found = fut.result()
+				except Exception as e:
+					logger.warn("prices.provider.failed", provider=provider.name, error=str(e))
+					continue
+				if found is not None:
+					offers[key].extend(found)
+					answered[key] += 1
+		if futures:
+			logger.warn("prices.timeout", unanswered=len(futures), timeout_s=self.timeout_s)
+		for key, found in offers.items():
+			best = _best_offer(key, found, self.currency)
+			results[key] = best
+			# Cache only complete answers; a timed-out or failed provider may know the price next time
+			if self.cache is not None and answered[key] == len(self.providers):
+				self.cache.put(key, best)
+		return [results.get(key) for key in keys]
+
+
+def _best_offer(key: str, offers: List[Dict[str, Any]], currency: str | None = None, min_score: float = 0.8) -> Dict[str, Any] | None:
+	"""Best-matching offer, cheapest among equally good matches.
+
+	Prices are only compared within one currency: `currency` if given,
+	otherwise the one most of the best-scoring offers are in (chosen on match
+	score alone, never on price). Offers of unknown currency are dropped.
+	"""
+	scored = [(_match_score(key, o.get("title")), o) for o in offers if o.get("currency")]
+	scored = [(score, o) for score, o in scored if score >= min_score]
+	if currency:
+		currency = currency.upper()
+	elif scored:
+		best = max(score for score, _ in scored)
+		# most_common keeps first-seen order on ties, i.e. provider order
+		currency = Counter(o["currency"] for score, o in scored if score == best).most_common(1)[0][0]
+	same = [(score, o) for score, o in scored if o["currency"] == currency]
+	if not same:
+		return None
+	return min(same, key=lambda so: (-so[0], so[1]["price"]))[1]
+
+
+@functools.lru_cache(maxsize=1)
+def get_price_engine() -> PriceEngine | None:
+	settings = get_settings()
+	providers = providers_from_spec(settings.price_providers, settings)
+	if not providers:
+		return None
+	path = settings.price_cache_path or os.path.join(settings.temp_dir, "prices.sqlite3")
+	return PriceEngine(
+		providers,
+		cache=PriceCache(path, settings.price_cache_ttl_h * 3600, settings.price_cache_negative_ttl_h * 3600),
+		timeout_s=settings.price_timeout_s,
+		request_timeout_s=settings.price_request_timeout_s,
+		domain_concurrency=settings.price_domain_concurrency,
+		domain_rate=settings.price_domain_rate,
+		currency=settings.price_currency,
+	)
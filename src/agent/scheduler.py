@@ -0,0 +1,237 @@
+from __future__ import annotations
+import functools
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Dict, Iterator, List
+
+from prometheus_client import Counter, Gauge
+
+from .config import get_settings
+from .logging_setup import logger
+from .tracing import SPAN_SECONDS, span
+
+
+RESOURCE_IN_USE = Gauge("reel_resource_in_use", "Units of a scheduled resource currently held", ["resource"])
+TASKS_WAITING = Gauge("reel_tasks_waiting", "Tasks waiting for resources", ["task"])
+JOBS_ACTIVE = Gauge("reel_jobs_active", "Reels being processed by this process")
+JOBS_QUEUED = Gauge("reel_jobs_queued", "Reels waiting for admission in this process")
+JOBS_REJECTED = Counter("reel_jobs_rejected_total", "Reels turned away because the intake queue was full")
+
+
+# Typical footprint of one run of each heavy task. whisper's and keyframes' cpu
+# is filled in per call from the thread counts they are actually given.
+TASK_COSTS: Dict[str, Dict[str, float]] = {
+	"ffmpeg": {"cpu": 1, "memory_mb": 100},
+	"vad": {"cpu": 1, "memory_mb": 150},
+	"whisper": {"whisper": 1, "memory_mb": 800},
+	"keyframes": {"cpu": 1, "memory_mb": 250},
+	"ocr": {"ocr": 1, "cpu": 1, "memory_mb": 150},
+}
+
+
+class Overloaded(RuntimeError):
+	"""The intake queue is full; the caller should retry later."""
+
+
+class ResourceScheduler:
+	"""Grants tasks bundles of resources (cpu threads, whisper decodes, OCR
+	processes, memory MB) against fixed budgets.
+
+	A task gets all of its resources at once or waits, so there is no
+	hold-and-wait deadlock. Waiters are served first-come-first-served per
+	resource: a task that cannot be served yet reserves the resources it is
+	short of, and later tasks may only overtake it using the others.
+	"""
+
+	def __init__(self, budgets: Dict[str, float]):
+		# A budget of 0 (or less) means "not limited"
+		self.budgets = {k: v for k, v in budgets.items() if v and v > 0}
+		self.in_use: Dict[str, float] = {k: 0.0 for k in self.budgets}
+		self._cond = threading.Condition()
+		self._waiting: List[Dict[str, Any]] = []
+
+	def _clamp(self, needs: Dict[str, float]) -> Dict[str, float]:
+		# A single task asking for more than the whole budget would wait forever
+		return {k: min(v, self.budgets[k]) for k, v in needs.items() if k in self.budgets and v > 0}
+
+	def _grant(self) -> None:
+		avail = {k: self.budgets[k] - self.in_use[k] for k in self.budgets}
+		for waiter in self._waiting:
+			needs = waiter["needs"]
+			short = [k for k, v in needs.items() if avail[k] < v]
+			if not short:
+				waiter["granted"] = True
+				for k, v in needs.items():
+					self.in_use[k] += v
+					avail[k] -= v
+			else:
+				# Reserve only what it is short of: later tasks may still use the
+				# rest, since this one could not run with it anyway
+				for k in short:
+					avail[k] -= needs[k]
+		self._waiting = [w for w in self._waiting if not w["granted"]]
+
+	@contextmanager
+	def acquire(self, task: str, **needs: float) -> Iterator[Dict[str, float]]:
+		"""Hold `needs` (e.g. cpu=4, whisper=1) for the block; waits until they fit.
+
+		The wait is recorded as a `wait.<task>` span, so queue time and service
+		time (the task's own span) show up separately in traces and /metrics.
+		"""
+		needs = self._clamp(needs)
+		waiter = {"needs": needs, "granted": False}
+		with span(f"wait.{task}", **needs):
+			with self._cond:
+				self._waiting.append(waiter)
+				self._grant()
+				if not waiter["granted"]:
+					TASKS_WAITING.labels(task).inc()
+					try:
+						while not waiter["granted"]:
+							self._cond.wait()
+							self._grant()
+					finally:
+						TASKS_WAITING.labels(task).dec()
+				for k, v in needs.items():
+					RESOURCE_IN_USE.labels(k).set(self.in_use[k])
+		try:
+			yield needs
+		finally:
+			with self._cond:
+				for k, v in needs.items():
+					self.in_use[k] -= v
+					RESOURCE_IN_USE.labels(k).set(self.in_use[k])
+				self._grant()
+				self._cond.notify_all()
+
+
+class Ticket:
+	def __init__(self, admission: "Admission", on_admit: Callable[[], None] | None = None):
+		self._admission = admission
+		self._on_admit = on_admit
+		self.admitted = False
+		self.left = False
+		self.created = time.perf_counter()
+
+	def position(self) -> int:
+		"""1-based place in the intake queue; 0 once admitted."""
+		return self._admission._position(self)
+
+	def wait(self, timeout: float | None = None) -> bool:
+		return self._admission._wait(self, timeout)
+
+	def leave(self) -> None:
+		self._admission._leave(self)
+
+
+class Admission:
+	"""FIFO intake gate: at most `max_active` reels run at once, at most
+	`max_queued` wait behind them, and anything beyond that is refused.
+	"""
+
+	def __init__(self, max_active: int, max_queued: int):
+		self.max_active = max(1, max_active)
+		self.max_queued = max(0, max_queued)
+		self.active = 0
+		self._queue: Deque[Ticket] = deque()
+		self._cond = threading.Condition()
+
+	def _promote(self) -> None:
+		while self._queue and self.active < self.max_active:
+			ticket = self._queue.popleft()
+			ticket.admitted = True
+			self.active += 1
+			waited = time.perf_counter() - ticket.created
+			SPAN_SECONDS.labels("wait.admission").observe(waited)
+			if waited > 0.01:
+				logger.info("admission.admitted", waited_s=round(waited, 3))
+			if ticket._on_admit is not None:
+				ticket._on_admit()
+		JOBS_ACTIVE.set(self.active)
+		JOBS_QUEUED.set(len(self._queue))
+		self._cond.notify_all()
+
+	def join(self, on_admit: Callable[[], None] | None = None) -> Ticket:
+		"""Take a place in line; raises Overloaded when the queue is full.
+
+		`on_admit` is called (under the gate's lock, possibly before join()
+		returns) when the ticket is let in, for callers that can't block a thread.
+		"""
+		with self._cond:
+			if self.active >= self.max_active and len(self._queue) >= self.max_queued:
+				JOBS_REJECTED.inc()
+				raise Overloaded(f"{len(self._queue)} reels already queued")
+			ticket = Ticket(self, on_admit)
+			self._queue.append(ticket)
+			self._promote()
+			return ticket
+
+	def _position(self, ticket: Ticket) -> int:
+		with self._cond:
+			if ticket.admitted:
+				return 0
+			try:
+				return self._queue.index(ticket) + 1
+			except ValueError:
+				return 0
+
+	def _wait(self, ticket: Ticket, timeout: float | None) -> bool:
+		with self._cond:
+			self._cond.wait_for(lambda: ticket.admitted or ticket.left, timeout)
+			return ticket.admitted
+
+	def _leave(self, ticket: Ticket) -> None:
+		with self._cond:
+			if ticket.left:
+				return
+			ticket.left = True
+			if ticket.admitted:
+				self.active -= 1
+			else:
+				try:
+					self._queue.remove(ticket)
+				except ValueError:
+					pass
+			self._promote()
+
+	@contextmanager
+	def slot(self) -> Iterator[Ticket]:
+		ticket = self.join()
+		try:
+			ticket.wait()
+			yield ticket
+		finally:
+			ticket.leave()
+
+
+def cpu_budget(settings) -> int:
+	return settings.cpu_budget or os.cpu_count() or 1
+
+
+@functools.lru_cache(maxsize=1)
+def get_scheduler() -> ResourceScheduler:
+	settings = get_settings()
+	budgets = {
+		"cpu": cpu_budget(settings),
+		"memory_mb": settings.memory_budget_mb,
+		"whisper": settings.max_whisper_decodes,
+		"ocr": settings.max_ocr_procs,
+	}
+	logger.info("scheduler.budgets", **budgets)
+	return ResourceScheduler(budgets)
+
+
+@contextmanager
+def task(name: str, **needs: float) -> Iterator[Dict[str, float]]:
+	"""Run a block as task `name` under the process-wide budgets (see TASK_COSTS)."""
+	with get_scheduler().acquire(name, **{**TASK_COSTS.get(name, {}), **needs}) as granted:
+		yield granted
+
+
+@functools.lru_cache(maxsize=1)
+def get_admission() -> Admission:
+	settings = get_settings()
+	return Admission(settings.max_active_jobs, settings.max_queued_jobs)
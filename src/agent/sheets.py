@@ -5,14 +5,24 @@ import json
 import os
 from typing import List, Dict, Any
 
-from google.oauth2.service_account import Credentials
-from googleapiclient.discovery import build
-
 from .config import get_settings
 from .logging_setup import logger
+from .tracing import span
 from .utils import ensure_dir, SHEET_HEADERS
 
 
+def _normalize_rows(values: List[List[Any]]) -> List[List[Any]]:
+	# Prepare data - ensure all rows have exactly 21 columns (matching headers)
+	normalized_values = []
+	for row in values:
+		# Pad or truncate to exactly 21 columns
+		normalized_row = list(row[:21])  # Take first 21
+		while len(normalized_row) < 21:  # Pad with empty strings if needed
+			normalized_row.append("")
+		normalized_values.append(normalized_row)
+	return normalized_values
+
+
 class SheetsClient:
 	def __init__(self, sheet_id: str | None = None):
 		self.settings = get_settings()
@@ -31,6 +41,8 @@ class SheetsClient:
 				f"And the file exists in your mounted secrets folder."
 			)
 		try:
+			from google.oauth2.service_account import Credentials
+			from googleapiclient.discovery import build
 			self.creds = Credentials.from_service_account_file(
 				self.settings.google_sa_json_path,
 				scopes=["https://www.googleapis.com/auth/spreadsheets"],
@@ -48,13 +60,14 @@ class SheetsClient:
 		"""Check if headers exist, create/update them if not. Returns True if headers were created/updated."""
 		try:
 			# Check first row for headers
-			result = (
-				self.service.spreadsheets().values().get(
-					spreadsheetId=self.sheet_id,
-					range=f"{sheet_name}!A1:U1",
+			with span("sheets.headers"):
+				result = (
+					self.service.spreadsheets().values().get(
+						spreadsheetId=self.sheet_id,
+						range=f"{sheet_name}!A1:U1",
+					)
+					.execute()
 				)
-				.execute()
-			)
 			values = result.get("values", [])
 			
 			# Check if headers exist and are correct
@@ -110,32 +123,29 @@ class SheetsClient:
 		# Ensure headers exist first
 		self._ensure_headers(sheet_name)
 		
-		# Prepare data - ensure all rows have exactly 21 columns (matching headers)
-		normalized_values = []
-		for row in values:
-			# Pad or truncate to exactly 21 columns
-			normalized_row = list(row[:21])  # Take first 21
-			while len(normalized_row) < 21:  # Pad with empty strings if needed
-				normalized_row.append("")
-			normalized_values.append(normalized_row)
+		normalized_values = _normalize_rows(values)
 		
 		body = {
 			"values": normalized_values
 		}
 		try:
 			# Append to column A through U (21 columns total)
-			result = (
-				self.service.spreadsheets().values().append(
-					spreadsheetId=self.sheet_id,
-					range=f"{sheet_name}!A:U",  # Changed from A:Z to A:U (21 columns)
-					valueInputOption="RAW",
-					insertDataOption="INSERT_ROWS",
-					body=body,
+			with span("sheets.append", items=len(normalized_values)):
+				result = (
+					self.service.spreadsheets().values().append(
+						spreadsheetId=self.sheet_id,
+						range=f"{sheet_name}!A:U",  # Changed from A:Z to A:U (21 columns)
+						valueInputOption="RAW",
+						insertDataOption="INSERT_ROWS",
+						body=body,
+					)
+					.execute()
 				)
-				.execute()
-			)
 			updated_range = result.get("updates", {}).get("updatedRange", "unknown")
 			logger.info("sheets.append_rows.done", updated_range=updated_range, rows=len(normalized_values))
+			for row in normalized_values:
+				# Sampled (LOG_SAMPLE_RATES), so bulk appends don't flood the log
+				logger.debug("sheets.row", index=row[0], item_type=row[4], item_name=row[5])
 			return result
 		except Exception as e:
 			error_msg = str(e)
@@ -152,15 +162,34 @@ class SheetsClient:
 				)
 			raise
 
+	def update_rows(self, first_row: int, values: List[List[Any]], sheet_name: str = "Sheet1") -> Dict[str, Any]:
+		"""Overwrite rows starting at 1-based sheet row `first_row` (e.g. rows tracked from an earlier append)."""
+		normalized_values = _normalize_rows(values)
+		last_row = first_row + len(normalized_values) - 1
+		with span("sheets.update", items=len(normalized_values)):
+			result = (
+				self.service.spreadsheets().values().update(
+					spreadsheetId=self.sheet_id,
+					range=f"{sheet_name}!A{first_row}:U{last_row}",
+					valueInputOption="RAW",
+					body={"values": normalized_values},
+				)
+				.execute()
+			)
+		logger.info("sheets.update_rows.done", first_row=first_row, last_row=last_row)
+		return result
+
 	def get_last_n_rows(self, n: int = 10, sheet_name: str = "Sheet1") -> List[List[Any]]:
-		resp = (
-			self.service.spreadsheets().values().get(
-				spreadsheetId=self.sheet_id,
-				range=f"{sheet_name}!A:U",
+		with span("sheets.read") as sp:
+			resp = (
+				self.service.spreadsheets().values().get(
+					spreadsheetId=self.sheet_id,
+					range=f"{sheet_name}!A:U",
+				)
+				.execute()
 			)
-			.execute()
-		)
-		values = resp.get("values", [])
+			values = resp.get("values", [])
+			sp["items"] = len(values)
 		if not values:
 			return []
 		# Skip header row if first row starts with "Index"
@@ -0,0 +1,107 @@
+from __future__ import annotations
+import contextvars
+import functools
+import json
+import os
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List
+
+from prometheus_client import Counter, Histogram
+
+from .logging_setup import logger
+from .utils import ensure_dir
+
+
+SPAN_SECONDS = Histogram(
+	"reel_span_duration_seconds",
+	"Wall time of traced pipeline operations",
+	["span"],
+	buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300),
+)
+SPAN_ERRORS = Counter("reel_span_errors_total", "Traced operations that raised", ["span"])
+SPAN_BYTES = Counter("reel_span_bytes_total", "Bytes read or produced by traced operations", ["span"])
+SPAN_ITEMS = Counter("reel_span_items_total", "Items (frames, rows, segments...) handled by traced operations", ["span"])
+CACHE_LOOKUPS = Counter("reel_cache_lookups_total", "Cache lookups made inside traced operations", ["span", "result"])
+
+# Spans recorded for the job running in the current context (None = not collecting)
+_current_trace: contextvars.ContextVar[List[Dict[str, Any]] | None] = contextvars.ContextVar("reel_trace", default=None)
+
+
+@contextmanager
+def span(name: str, **attrs: Any) -> Iterator[Dict[str, Any]]:
+	"""Time a block and record it in the metrics registry and the current job trace.
+
+	The yielded dict can be filled in by the caller: `bytes`, `items` and
+	`cache_hit` feed the matching counters, anything else only goes to the trace.
+	"""
+	attrs = dict(attrs)
+	started = time.perf_counter()
+	wall_start = time.time()
+	error = None
+	try:
+		yield attrs
+	except BaseException as e:
+		error = type(e).__name__
+		SPAN_ERRORS.labels(name).inc()
+		raise
+	finally:
+		duration = time.perf_counter() - started
+		SPAN_SECONDS.labels(name).observe(duration)
+		if attrs.get("bytes"):
+			SPAN_BYTES.labels(name).inc(attrs["bytes"])
+		if attrs.get("items"):
+			SPAN_ITEMS.labels(name).inc(attrs["items"])
+		if "cache_hit" in attrs:
+			CACHE_LOOKUPS.labels(name, "hit" if attrs["cache_hit"] else "miss").inc()
+		trace = _current_trace.get()
+		if trace is not None:
+			record = {"span": name, "start": round(wall_start, 3), "duration_s": round(duration, 4), **attrs}
+			if error:
+				record["error"] = error
+			trace.append(record)
+
+
+def in_context(fn: Callable) -> Callable:
+	"""Wrap `fn` to run in the caller's context (current job trace included).
+
+	Executor threads start with an empty context, so spans recorded there would
+	miss the job trace. Wrap where the work is submitted:
+	`pool.map(in_context(fn), items)`. Each call gets its own copy, so the
+	wrapper can run in several threads at once.
+	"""
+	ctx = contextvars.copy_context()
+
+	@functools.wraps(fn)
+	def wrapper(*args, **kwargs):
+		return ctx.copy().run(fn, *args, **kwargs)
+	return wrapper
+
+
+def traced(name: str) -> Callable:
+	"""Decorator form of `span` for whole functions."""
+	def decorator(fn: Callable) -> Callable:
+		@functools.wraps(fn)
+		def wrapper(*args, **kwargs):
+			with span(name):
+				return fn(*args, **kwargs)
+		return wrapper
+	return decorator
+
+
+@contextmanager
+def job_trace(job_id: str, dump_dir: str | None = None) -> Iterator[List[Dict[str, Any]]]:
+	"""Collect every span of one job; optionally dump them to `<dump_dir>/<job_id>.json`."""
+	spans: List[Dict[str, Any]] = []
+	token = _current_trace.set(spans)
+	try:
+		yield spans
+	finally:
+		_current_trace.reset(token)
+		if dump_dir:
+			try:
+				ensure_dir(dump_dir)
+				with open(os.path.join(dump_dir, f"{job_id}.json"), "w", encoding="utf-8") as f:
+					json.dump({"job_id": job_id, "spans": spans}, f, default=str, indent=1)
+			except OSError as e:
+				logger.warn("trace.dump.failed", job_id=job_id, error=str(e))
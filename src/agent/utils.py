@@ -1,8 +1,10 @@
 import os
 import re
+import threading
 import time
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Any
+from typing import Any, Dict, Iterator
 
 
 REEL_URL_RE = re.compile(r"https?://(www\.)?instagram\.com/(reel|p)/[A-Za-z0-9_-]+/?")
@@ -24,6 +26,43 @@ def sleep_backoff(attempt: int) -> None:
 	time.sleep(min(60, 2 ** attempt))
 
 
+_path_locks: Dict[str, threading.Lock] = {}
+_path_locks_guard = threading.Lock()
+
+
+@contextmanager
+def file_lock(path: str) -> Iterator[None]:
+	"""Exclusive lock on `path` (created if missing) across threads and processes."""
+	path = os.path.abspath(path)
+	ensure_dir(os.path.dirname(path))
+	with _path_locks_guard:
+		lock = _path_locks.setdefault(path, threading.Lock())
+	with lock, open(path, "a+b") as f:
+		try:
+			import fcntl
+		except ImportError:  # Windows
+			import msvcrt
+			f.seek(0)
+			while True:
+				try:
+					msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+					break
+				except OSError:
+					# LK_LOCK gives up after ~10s; keep waiting
+					continue
+			try:
+				yield
+			finally:
+				f.seek(0)
+				msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+		else:
+			fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+			try:
+				yield
+			finally:
+				fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
 SHEET_HEADERS = [
 	"Index",
 	"Timestamp",
@@ -0,0 +1,132 @@
+from __future__ import annotations
+import time
+import wave
+from typing import Any, Dict, List
+
+import numpy as np
+
+from .logging_setup import logger
+
+
+SAMPLE_RATE = 16000
+
+
+def load_pcm(path: str) -> np.ndarray:
+	"""Read the 16 kHz mono s16 WAV written by extract_audio as float32 in [-1, 1]."""
+	with wave.open(path, "rb") as w:
+		if w.getsampwidth() != 2:
+			raise ValueError(f"expected 16-bit PCM, got {8 * w.getsampwidth()}-bit")
+		raw = w.readframes(w.getnframes())
+		channels = w.getnchannels()
+	pcm = np.frombuffer(raw, dtype=np.int16).astype(np.float32) / 32768.0
+	if channels > 1:
+		pcm = pcm.reshape(-1, channels).mean(axis=1)
+	return pcm
+
+
+def _merge(segments: List[List[float]], min_gap_s: float, min_len_s: float, pad_s: float, duration_s: float) -> List[List[float]]:
+	merged: List[List[float]] = []
+	for start, end in segments:
+		start, end = max(0.0, start - pad_s), min(duration_s, end + pad_s)
+		if merged and start - merged[-1][1] <= min_gap_s:
+			merged[-1][1] = max(merged[-1][1], end)
+		else:
+			merged.append([start, end])
+	return [[round(s, 2), round(e, 2)] for s, e in merged if e - s >= min_len_s]
+
+
+def energy_segments(audio: np.ndarray, sr: int = SAMPLE_RATE, frame_ms: int = 30) -> List[List[float]]:
+	"""Speech-candidate regions from frame RMS energy against an adaptive noise floor.
+
+	Cheap fallback when Silero is unavailable; it cannot tell speech from
+	music, so music-only clips will still look "voiced".
+	"""
+	frame = sr * frame_ms // 1000
+	n = len(audio) // frame
+	if n == 0:
+		return []
+	frames = audio[: n * frame].reshape(n, frame)
+	rms = np.sqrt(np.mean(frames.astype(np.float64) ** 2, axis=1))
+	db = 20 * np.log10(rms + 1e-10)
+	threshold = max(np.percentile(db, 10) + 12.0, -45.0)
+	voiced = db > threshold
+	# Rising/falling edges of the voiced mask -> [start, end) frame runs
+	edges = np.flatnonzero(np.diff(np.concatenate(([0], voiced.astype(np.int8), [0]))))
+	runs = edges.reshape(-1, 2) * frame / sr
+	return _merge(runs.tolist(), min_gap_s=0.3, min_len_s=0.25, pad_s=0.1, duration_s=len(audio) / sr)
+
+
+def silero_segments(audio: np.ndarray, sr: int = SAMPLE_RATE) -> List[List[float]]:
+	from faster_whisper.vad import VadOptions, get_speech_timestamps
+	stamps = get_speech_timestamps(audio, VadOptions(min_silence_duration_ms=1000, speech_pad_ms=200))
+	return _merge([[s["start"] / sr, s["end"] / sr] for s in stamps], min_gap_s=0.0, min_len_s=0.0, pad_s=0.0, duration_s=len(audio) / sr)
+
+
+def plan_chunks(segments: List[List[float]], target_s: float = 30.0, duration_s: float | None = None) -> List[List[List[float]]]:
+	"""Group speech segments into chunks of roughly `target_s`, cutting only in the
+	silences between segments. A single segment longer than `target_s` is split
+	into equal parts, since it has no silence to cut at.
+
+	With `duration_s`, the segments only place the cuts: each chunk is one span
+	reaching to the middle of the silence on either side, so together they
+	cover the whole clip.
+	"""
+	pieces: List[List[float]] = []
+	for start, end in segments:
+		n = max(1, int(np.ceil((end - start) / target_s)))
+		bounds = np.linspace(start, end, n + 1)
+		pieces.extend([round(float(a), 2), round(float(b), 2)] for a, b in zip(bounds[:-1], bounds[1:]))
+	chunks: List[List[List[float]]] = []
+	for piece in pieces:
+		if chunks and piece[1] - chunks[-1][0][0] <= target_s:
+			chunks[-1].append(piece)
+		else:
+			chunks.append([piece])
+	if duration_s is not None:
+		cuts = [0.0] + [round((a[-1][1] + b[0][0]) / 2, 2) for a, b in zip(chunks, chunks[1:])] + [round(duration_s, 2)]
+		chunks = [[[start, end]] for start, end in zip(cuts[:-1], cuts[1:])]
+	return chunks
+
+
+def detect_speech(audio_path: str, min_speech_ratio: float = 0.1, audio: np.ndarray | None = None) -> Dict[str, Any]:
+	"""Measure how much of a clip is speech and decide whether to transcribe it.
+
+	Returns method, duration_s, speech_s, speech_ratio, segments ([[start, end], ...]
+	in seconds), decision, skip, skipped_s and elapsed_s. decision is "skip"
+	(no speech to transcribe), "clip" (decode only `segments`) or "full". Only
+	Silero decides: the energy fallback hears music as speech and silence-only
+	gaps, so its segments are kept for chunk planning and the clip is decoded
+	in full. Pass `audio` if the PCM is already loaded.
+	"""
+	started = time.perf_counter()
+	if audio is None:
+		audio = load_pcm(audio_path)
+	duration = len(audio) / SAMPLE_RATE
+	try:
+		segments = silero_segments(audio)
+		method = "silero"
+	except Exception as e:
+		logger.warn("vad.silero.failed", error=str(e))
+		segments = energy_segments(audio)
+		method = "energy"
+	speech_s = float(sum(e - s for s, e in segments))
+	ratio = speech_s / duration if duration else 0.0
+	if method != "silero":
+		decision, skipped_s = "full", 0.0
+		if ratio < min_speech_ratio:
+			logger.info("vad.energy.not_skipping", speech_ratio=round(ratio, 3))
+	elif ratio < min_speech_ratio:
+		decision, skipped_s = "skip", duration
+	else:
+		decision, skipped_s = "clip", duration - speech_s
+	return {
+		"method": method,
+		"duration_s": round(duration, 2),
+		"speech_s": round(speech_s, 2),
+		"speech_ratio": round(ratio, 3),
+		"segments": segments,
+		"decision": decision,
+		"skip": decision == "skip",
+		"skipped_s": round(skipped_s, 2),
+		"elapsed_s": round(time.perf_counter() - started, 3),
+	}
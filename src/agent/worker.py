@@ -0,0 +1,125 @@
+from __future__ import annotations
+import os
+import signal
+import socket
+import threading
+from typing import Any, Dict
+
+from .config import get_settings
+from .jobs import JobBackend, get_job_store
+from .logging_setup import configure_logging, logger
+from .pipeline import Cancelled, process_reel_url
+
+
+# Failures that a retry cannot fix (bad input / configuration)
+NON_RETRYABLE = (ValueError, PermissionError, FileNotFoundError)
+
+
+class LeaseCheck:
+	"""Cancel flag handed to process_reel_url: set once the job's lease is lost.
+
+	is_set() re-checks (and extends) the lease in the store, so the check the
+	pipeline makes right before a sheet write is current, not up to a
+	heartbeat interval old.
+	"""
+
+	def __init__(self, store: JobBackend, job_id: str, worker_id: str, timeout: float):
+		self.store = store
+		self.job_id = job_id
+		self.worker_id = worker_id
+		self.timeout = timeout
+		self._lost = threading.Event()
+
+	def is_set(self) -> bool:
+		if not self._lost.is_set() and not self.store.heartbeat(self.job_id, self.worker_id, self.timeout):
+			# Another worker owns the job now; stop before writing any more rows
+			logger.warn("worker.lease.lost", job_id=self.job_id, worker=self.worker_id)
+			self._lost.set()
+		return self._lost.is_set()
+
+	def wait(self, timeout: float | None = None) -> bool:
+		return self._lost.wait(timeout)
+
+
+def _heartbeat(lease: LeaseCheck, done: threading.Event) -> None:
+	while not done.wait(lease.timeout / 3):
+		if lease.is_set():
+			return
+
+
+def run_job(store: JobBackend, job: Dict[str, Any], worker_id: str) -> None:
+	settings = get_settings()
+	job_id = job["id"]
+	payload = job.get("payload") or {}
+	done = threading.Event()
+	lease = LeaseCheck(store, job_id, worker_id, settings.job_visibility_timeout)
+	beat = threading.Thread(target=_heartbeat, args=(lease, done), daemon=True)
+	beat.start()
+
+	def on_update(kind: str, result) -> None:
+		start_idx, end_idx, items = result
+		store.set_progress(job_id, worker_id, {"kind": kind, "start_index": start_idx, "end_index": end_idx, "count": len(items)})
+
+	try:
+		start_idx, end_idx, items = process_reel_url(
+			job["reel_url"],
+			payload.get("origin_lat"),
+			payload.get("origin_lng"),
+			job_id=job_id,  # retries of this job resume from its pipeline checkpoint
+			on_update=on_update,
+			cancel=lease,
+		)
+		if not store.complete(job_id, worker_id, {"start_index": start_idx, "end_index": end_idx, "count": len(items)}):
+			logger.warn("worker.complete.lost", job_id=job_id, worker=worker_id)
+		logger.info("worker.job.done", job_id=job_id, worker=worker_id)
+	except Cancelled:
+		# The lease (and the job's outcome) belongs to the new owner
+		logger.warn("worker.job.abandoned", job_id=job_id, worker=worker_id)
+	except Exception as e:
+		logger.error("worker.job.failed", job_id=job_id, worker=worker_id, error=str(e), error_type=type(e).__name__)
+		store.fail(job_id, worker_id, e, retry=not isinstance(e, NON_RETRYABLE))
+	finally:
+		done.set()
+		beat.join()
+
+
+def _work_loop(store: JobBackend, worker_id: str, stop: threading.Event) -> None:
+	settings = get_settings()
+	while not stop.is_set():
+		try:
+			job = store.lease(worker_id, settings.job_visibility_timeout)
+		except Exception as e:
+			logger.error("worker.lease.failed", worker=worker_id, error=str(e))
+			job = None
+		if job is None:
+			stop.wait(settings.worker_poll_interval)
+			continue
+		run_job(store, job, worker_id)
+
+
+def run_worker(worker_id: str | None = None, concurrency: int | None = None, stop: threading.Event | None = None) -> None:
+	"""Pull jobs from the shared store until stopped (SIGTERM/SIGINT, or `stop`).
+
+	Start as many of these processes (BOT_MODE=worker) as the load needs, on
+	the host holding the store: SQLite's WAL mode needs a local disk, so the
+	store cannot be shared over a network filesystem.
+	"""
+	settings = get_settings()
+	configure_logging(settings.log_level)
+	store = get_job_store(settings)
+	worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+	concurrency = concurrency or settings.worker_concurrency
+	stop = stop or threading.Event()
+	if threading.current_thread() is threading.main_thread():
+		for sig in (signal.SIGTERM, signal.SIGINT):
+			signal.signal(sig, lambda *_: stop.set())
+	logger.info("worker.starting", worker=worker_id, concurrency=concurrency, backend=settings.job_backend)
+	loops = [
+		threading.Thread(target=_work_loop, args=(store, f"{worker_id}-{i}", stop), name=f"worker-{i}")
+		for i in range(max(1, concurrency))
+	]
+	for t in loops:
+		t.start()
+	for t in loops:
+		t.join()
+	logger.info("worker.stopped", worker=worker_id)
@@ -0,0 +1,21 @@
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+
+@pytest.fixture
+def local_server():
+	"""Factory: serve(handler_class) starts a threaded HTTP server on a free local port and returns its base URL."""
+	servers = []
+
+	def serve(handler):
+		server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+		threading.Thread(target=server.serve_forever, daemon=True).start()
+		servers.append(server)
+		return f"http://127.0.0.1:{server.server_address[1]}"
+
+	yield serve
+	for server in servers:
+		server.shutdown()
+		server.server_close()
@@ -0,0 +1,112 @@
+import csv
+import json
+import os
+import threading
+
+import pytest
+
+from src.agent.archive import COLUMNS, ItemArchive, wait_for_compactions
+from src.agent.utils import SHEET_HEADERS
+
+
+def _row(index, day, item_type, country, confidence):
+	row = [""] * len(SHEET_HEADERS)
+	values = {
+		"Index": index,
+		"Timestamp": f"{day}T12:00:00",
+		"Item Type": item_type,
+		"Item Name": f"item {index}",
+		"Country": country,
+		"Lat": "48.85",
+		"Confidence": confidence,
+		"Key_Specs/Features": ["a", "b"],
+	}
+	for header, value in values.items():
+		row[SHEET_HEADERS.index(header)] = value
+	return row
+
+
+def test_query_filters_and_projects(tmp_path):
+	archive = ItemArchive(str(tmp_path / "archive"))
+	archive.append_rows([
+		_row(1, "2025-01-01", "place", "France", 0.9),
+		_row(2, "2025-01-01", "product", "France", 0.9),
+		_row(3, "2025-02-01", "place", "Italy", 0.4),
+		_row(4, "2025-03-01", "place", "France", 0.8),
+	])
+	assert archive.partitions() == ["2025-01-01", "2025-02-01", "2025-03-01"]
+	table = archive.query(columns=["index", "country"], item_type="place", since="2025-01-15", min_confidence=0.5)
+	assert table.column_names == ["index", "country"]
+	assert table.to_pylist() == [{"index": 4, "country": "France"}]
+	row = archive.query(country=["France"], until="2025-01-01", item_type="product").to_pylist()[0]
+	assert row["lat"] == 48.85 and row["distance_km"] is None
+	assert row["key_specs_features"] == '["a", "b"]'
+	assert archive.query(limit=2).num_rows == 2
+	with pytest.raises(ValueError):
+		archive.query(columns=["nope"])
+
+
+def test_compaction_merges_files_without_losing_rows(tmp_path):
+	archive = ItemArchive(str(tmp_path / "archive"), compact_files=3)
+	for i in range(3):
+		archive.append_rows([_row(i, "2025-01-01", "place", "France", 0.5)])
+	part_dir = tmp_path / "archive" / "date=2025-01-01"
+	# The third append hit the threshold and queued a merge in the background
+	wait_for_compactions()
+	assert len(os.listdir(part_dir)) == 1
+	archive.append_rows([_row(3, "2025-01-01", "place", "France", 0.5)])
+	assert len(os.listdir(part_dir)) == 2
+	assert archive.compact() == 2
+	assert len(os.listdir(part_dir)) == 1
+	assert sorted(archive.query(columns=["index"]).column("index").to_pylist()) == list(range(4))
+
+
+def test_concurrent_appends_compact_each_row_once(tmp_path):
+	root = str(tmp_path / "archive")
+	errors = []
+
+	def append(worker):
+		for i in range(10):
+			try:
+				# A fresh instance per append, as _backup_once does
+				ItemArchive(root, compact_files=2).append_rows([_row(worker * 100 + i, "2025-01-01", "place", "France", 0.5)])
+			except Exception as e:
+				errors.append(e)
+
+	threads = [threading.Thread(target=append, args=(w,)) for w in range(4)]
+	for t in threads:
+		t.start()
+	for t in threads:
+		t.join()
+	assert errors == []
+	wait_for_compactions()
+	indexes = ItemArchive(root).query(columns=["index"]).column("index").to_pylist()
+	assert sorted(indexes) == sorted(w * 100 + i for w in range(4) for i in range(10))
+
+
+def test_interrupted_compaction_never_shows_rows_twice(tmp_path):
+	import pyarrow.parquet as pq
+	archive = ItemArchive(str(tmp_path / "archive"))
+	for i in range(2):
+		archive.append_rows([_row(i, "2025-01-01", "place", "France", 0.5)])
+	part_dir = tmp_path / "archive" / "date=2025-01-01"
+	inputs = sorted(os.listdir(part_dir))
+	# Crashed after renaming the merged file in, before deleting its inputs
+	merged = archive._write(pq.read_table([str(part_dir / f) for f in inputs]), str(part_dir), "compact")
+	(part_dir / "_replaced.json").write_text(json.dumps({os.path.basename(merged): inputs}))
+	assert sorted(archive.query(columns=["index"]).column("index").to_pylist()) == [0, 1]
+	assert archive.compact() == 0
+	assert os.listdir(part_dir) == [os.path.basename(merged)]
+
+
+def test_import_csv_backfills_backup(tmp_path):
+	path = tmp_path / "backup.csv"
+	with open(path, "w", newline="", encoding="utf-8") as f:
+		writer = csv.writer(f)
+		writer.writerow(SHEET_HEADERS)
+		writer.writerows([_row(1, "2025-01-01", "place", "France", "0.7"), _row(2, "2025-01-02", "hotel", "Spain", "")])
+	archive = ItemArchive(str(tmp_path / "archive"))
+	assert archive.import_csv(str(path)) == 2
+	table = archive.query()
+	assert table.column_names == COLUMNS
+	assert sorted(table.column("confidence").to_pylist(), key=str) == [0.7, None]
@@ -0,0 +1,114 @@
+import asyncio
+import json
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import parse_qsl
+
+import pytest
+from fastapi.testclient import TestClient
+from telegram import Chat, Message, Update
+
+from src.agent import api, bot
+from src.agent.config import Settings
+
+
+class _FakeTelegram(BaseHTTPRequestHandler):
+	calls = []
+
+	def do_POST(self):
+		body = self.rfile.read(int(self.headers.get("Content-Length") or 0)).decode()
+		try:
+			params = json.loads(body) if body else {}
+		except ValueError:
+			params = dict(parse_qsl(body))
+		method = self.path.rsplit("/", 1)[-1]
+		self.calls.append((method, params))
+		if method == "getMe":
+			result = {"id": 1, "is_bot": True, "first_name": "Test", "username": "test_bot"}
+		elif method == "sendMessage":
+			chat_id = int(params["chat_id"])
+			result = {"message_id": len(self.calls), "date": 0, "chat": {"id": chat_id, "type": "private"}, "text": params.get("text", "")}
+		else:
+			result = True
+		payload = json.dumps({"ok": True, "result": result}).encode()
+		self.send_response(200)
+		self.send_header("Content-Type", "application/json")
+		self.send_header("Content-Length", str(len(payload)))
+		self.end_headers()
+		self.wfile.write(payload)
+
+	def log_message(self, *args):
+		pass
+
+
+@pytest.fixture
+def fake_telegram(local_server):
+	_FakeTelegram.calls = []
+	return local_server(_FakeTelegram), _FakeTelegram.calls
+
+
+def test_webhook_updates_are_served_from_the_api(fake_telegram, tmp_path, monkeypatch):
+	url, calls = fake_telegram
+	settings = Settings(
+		telegram_token="123:abc",
+		telegram_api_url=url,
+		telegram_webhook_url="https://reels.example.com/",
+		temp_dir=str(tmp_path),
+	)
+	monkeypatch.setattr(bot, "get_settings", lambda: settings)
+	monkeypatch.setattr(api, "settings", settings)
+	monkeypatch.setattr(api.app.state, "telegram_webhook", True, raising=False)
+	update = {
+		"update_id": 1,
+		"message": {
+			"message_id": 1,
+			"date": 0,
+			"chat": {"id": 42, "type": "private"},
+			"from": {"id": 42, "is_bot": False, "first_name": "U"},
+			"text": "/start",
+			"entities": [{"type": "bot_command", "offset": 0, "length": 6}],
+		},
+	}
+	with TestClient(api.app) as client:
+		set_webhook = [p for m, p in calls if m == "setWebhook"]
+		assert set_webhook and set_webhook[0]["url"] == "https://reels.example.com/telegram/webhook"
+		secret = set_webhook[0]["secret_token"]
+		assert client.post("/telegram/webhook", json=update).status_code == 403
+		res = client.post("/telegram/webhook", json=update, headers={"X-Telegram-Bot-Api-Secret-Token": secret})
+		assert res.status_code == 200
+		deadline = time.time() + 5
+		while time.time() < deadline and not any(m == "sendMessage" for m, _ in calls):
+			time.sleep(0.05)
+	sent = [p for m, p in calls if m == "sendMessage"]
+	assert sent and int(sent[0]["chat_id"]) == 42 and sent[0]["text"].startswith("Hi!")
+
+
+def _update(update_id, chat_id):
+	chat = Chat(chat_id, Chat.PRIVATE)
+	return Update(update_id, message=Message(update_id, datetime.now(timezone.utc), chat, text=str(update_id)))
+
+
+def test_updates_run_concurrently_across_chats_but_in_order_within_a_chat():
+	events = []
+
+	async def handle(name, delay):
+		events.append(("start", name))
+		await asyncio.sleep(delay)
+		events.append(("end", name))
+
+	async def main():
+		processor = bot.ChatOrderedUpdateProcessor(4)
+		await asyncio.gather(
+			processor.process_update(_update(1, 1), handle("a1", 0.1)),
+			processor.process_update(_update(2, 1), handle("a2", 0.0)),
+			processor.process_update(_update(3, 2), handle("b1", 0.0)),
+		)
+		return processor
+
+	processor = asyncio.run(main())
+	# Chat 2 is not held up by chat 1's slow update ...
+	assert events.index(("end", "b1")) < events.index(("end", "a1"))
+	# ... while chat 1's second update waits for its first
+	assert events.index(("end", "a1")) < events.index(("start", "a2"))
+	assert not processor._chat_locks
@@ -0,0 +1,55 @@
+import functools
+from http.server import SimpleHTTPRequestHandler
+
+import pytest
+
+from src.agent import downloader
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+	def log_message(self, *args):
+		pass
+
+
+@pytest.fixture
+def fixture_server(tmp_path, local_server):
+	served = tmp_path / "served"
+	served.mkdir()
+	for name in ("a", "b", "c"):
+		(served / f"{name}.mp4").write_bytes(name.encode() * 50_000)
+	return local_server(functools.partial(_QuietHandler, directory=str(served)))
+
+
+def test_download_reel_in_process(fixture_server, tmp_path):
+	out = tmp_path / "job"
+	result = downloader.download_reel(f"{fixture_server}/a.mp4", str(out))
+	assert result["video_path"].startswith(str(out))
+	with open(result["video_path"], "rb") as f:
+		assert f.read() == b"a" * 50_000
+	assert "formats" not in result["metadata"]
+
+
+def test_download_many_keeps_order(fixture_server, tmp_path):
+	names = ["a", "b", "c"]
+	results = downloader.download_many(
+		[f"{fixture_server}/{n}.mp4" for n in names],
+		[str(tmp_path / n) for n in names],
+	)
+	for name, result in zip(names, results):
+		with open(result["video_path"], "rb") as f:
+			assert f.read(1) == name.encode()
+
+
+@pytest.mark.parametrize("heights, expected", [
+	([144, 480, 720, 1080], 480),
+	([144, 240, 360], 360),
+])
+def test_format_selector_prefers_smallest_readable_else_tallest(heights, expected):
+	from yt_dlp import YoutubeDL
+	formats = [
+		{"format_id": f"p{h}", "url": f"http://127.0.0.1/{h}.mp4", "ext": "mp4", "height": h, "width": h * 9 // 16, "vcodec": "avc1", "acodec": "mp4a", "filesize": h * 1000}
+		for h in heights
+	]
+	info = {"id": "x", "title": "x", "formats": formats, "extractor": "generic", "extractor_key": "Generic", "webpage_url": "http://127.0.0.1/x"}
+	with YoutubeDL({"quiet": True, "simulate": True, "format": downloader._format_selector(480), "format_sort": downloader.FORMAT_SORT}) as ydl:
+		assert ydl.process_ie_result(info, download=False)["height"] == expected
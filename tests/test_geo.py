@@ -0,0 +1,34 @@
+import numpy as np
+
+from src.agent.geo import GeoIndex, annotate_distances, geohash_encode, haversine_matrix
+
+
+def test_haversine_matrix_known_distance():
+	# Paris -> London, Paris -> Paris
+	d = haversine_matrix([48.8566], [2.3522], [51.5074, 48.8566], [-0.1278, 2.3522])
+	assert d.shape == (1, 2)
+	assert abs(d[0, 0] - 343.5) < 1.0
+	assert d[0, 1] == 0.0
+
+
+def test_geohash_encode_reference():
+	assert geohash_encode([57.64911], [10.40744], precision=11)[0] == "u4pruydqqvj"
+
+
+def test_annotate_distances_skips_ungeocoded():
+	items = [{"lat": 48.8566, "lng": 2.3522}, {"lat": None, "lng": None}]
+	annotate_distances(items, 51.5074, -0.1278)
+	assert abs(items[0]["distance_km"] - 343.5) < 1.0
+	assert "distance_km" not in items[1]
+
+
+def test_within_matches_brute_force():
+	rng = np.random.default_rng(0)
+	lats = rng.uniform(-60, 60, 2000)
+	lngs = rng.uniform(-180, 180, 2000)
+	index = GeoIndex(lats, lngs)
+	for lat, lng, km in [(10.0, 179.5, 500.0), (-30.0, 20.0, 50.0), (0.0, 0.0, 3000.0)]:
+		expected = set(np.flatnonzero(haversine_matrix(lats, lngs, [lat], [lng])[:, 0] <= km))
+		assert {i for i, _ in index.within(lat, lng, km)} == expected
+	nearest = index.nearest(0.0, 0.0, k=3)
+	assert [d for _, d in nearest] == sorted(d for _, d in nearest)
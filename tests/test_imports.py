@@ -0,0 +1,12 @@
+import subprocess
+import sys
+
+
+def test_entry_modules_do_not_import_heavy_backends():
+	code = (
+		"import sys, src.agent.api, src.agent.bot\n"
+		"heavy = ['cv2', 'pytesseract', 'googleapiclient', 'faster_whisper', 'numpy']\n"
+		"print(','.join(m for m in heavy if m in sys.modules))\n"
+	)
+	res = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+	assert res.stdout.strip() == ""
@@ -0,0 +1,93 @@
+import time
+
+from fastapi.testclient import TestClient
+
+from src.agent import api, worker
+from src.agent.config import Settings
+from src.agent.jobs import JobStore
+from src.agent.pipeline import Cancelled
+
+
+def test_lease_is_exclusive_and_ordered(tmp_path):
+	store = JobStore(str(tmp_path / "jobs.sqlite3"))
+	first = store.enqueue("https://www.instagram.com/reel/A/")
+	second = store.enqueue("https://www.instagram.com/reel/B/")
+	assert store.position(second) == 2
+	assert store.lease("w1", 60)["id"] == first
+	assert store.lease("w2", 60)["id"] == second
+	assert store.lease("w3", 60) is None
+	assert store.position(first) == 0
+
+
+def test_expired_lease_is_redelivered(tmp_path):
+	store = JobStore(str(tmp_path / "jobs.sqlite3"))
+	job_id = store.enqueue("https://www.instagram.com/reel/A/")
+	store.lease("w1", 0.05)
+	time.sleep(0.1)
+	job = store.lease("w2", 60)
+	assert job["id"] == job_id and job["attempts"] == 2
+	# The first worker lost its lease and can no longer finish the job
+	assert not store.heartbeat(job_id, "w1", 60)
+	assert not store.complete(job_id, "w1", {})
+	assert store.complete(job_id, "w2", {"count": 1})
+	assert store.get(job_id)["status"] == "done"
+
+
+def test_fail_requeues_until_attempts_run_out(tmp_path):
+	store = JobStore(str(tmp_path / "jobs.sqlite3"), max_attempts=2)
+	job_id = store.enqueue("https://www.instagram.com/reel/A/")
+	store.lease("w1", 60)
+	assert store.fail(job_id, "w1", RuntimeError("boom"), backoff_s=0) == "queued"
+	store.lease("w1", 60)
+	assert store.fail(job_id, "w1", RuntimeError("boom again"), backoff_s=0) == "failed"
+	job = store.get(job_id)
+	assert job["error"] == "boom again" and job["error_type"] == "RuntimeError"
+	assert store.lease("w1", 60) is None
+
+
+def test_run_job_records_progress_and_non_retryable_failures(tmp_path, monkeypatch):
+	monkeypatch.setattr(worker, "get_settings", lambda: Settings(temp_dir=str(tmp_path)))
+	store = JobStore(str(tmp_path / "jobs.sqlite3"))
+
+	def fake_process(url, lat, lng, job_id=None, on_update=None, cancel=None):
+		on_update("provisional", (2, 3, [{}, {}]))
+		if url.endswith("bad/"):
+			raise ValueError("no items")
+		return 2, 4, [{}, {}, {}]
+
+	monkeypatch.setattr(worker, "process_reel_url", fake_process)
+	ok = store.enqueue("https://www.instagram.com/reel/ok/")
+	bad = store.enqueue("https://www.instagram.com/reel/bad/")
+	for _ in range(2):
+		worker.run_job(store, store.lease("w1", 60), "w1")
+	assert store.get(ok)["status"] == "done"
+	assert store.get(ok)["result"] == {"start_index": 2, "end_index": 4, "count": 3}
+	assert store.get(ok)["progress"]["count"] == 2
+	failed = store.get(bad)
+	assert failed["status"] == "failed" and failed["attempts"] == 1
+
+
+def test_worker_stops_when_its_lease_is_taken_over(tmp_path, monkeypatch):
+	monkeypatch.setattr(worker, "get_settings", lambda: Settings(temp_dir=str(tmp_path), job_visibility_timeout=0.3))
+	store = JobStore(str(tmp_path / "jobs.sqlite3"))
+	job_id = store.enqueue("https://www.instagram.com/reel/A/")
+
+	def fake_process(url, lat, lng, job_id=None, on_update=None, cancel=None):
+		with store._conn() as conn:
+			conn.execute("UPDATE jobs SET lease_owner='w2' WHERE id=?", (job_id,))
+		assert cancel.wait(2)
+		raise Cancelled("cancelled before stage persist")
+
+	monkeypatch.setattr(worker, "process_reel_url", fake_process)
+	worker.run_job(store, store.lease("w1", 0.3), "w1")
+	job = store.get(job_id)
+	# Left to its new owner rather than failed or re-queued
+	assert job["status"] == "running" and job["lease_owner"] == "w2"
+
+
+def test_api_rejects_jobs_when_queue_is_disabled(tmp_path, monkeypatch):
+	monkeypatch.setattr(api, "settings", Settings(temp_dir=str(tmp_path), job_queue=False))
+	client = TestClient(api.app)
+	assert client.post("/jobs", params={"reel_url": "https://www.instagram.com/reel/A/"}).status_code == 503
+	monkeypatch.setattr(api, "settings", Settings(temp_dir=str(tmp_path), job_queue=True))
+	assert client.post("/jobs", params={"reel_url": "https://www.instagram.com/reel/A/"}).json()["position"] == 1
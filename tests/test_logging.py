@@ -0,0 +1,50 @@
+import io
+import threading
+
+import pytest
+import structlog
+
+from src.agent.logging_setup import AsyncLogSink, EventSampler, parse_sample_rates
+
+
+def test_sampler_drops_by_rate_and_limit_but_never_warnings():
+	sampler = EventSampler({"ocr.frame": 0.0, "sheets.row": 1.0}, rate_limit=2)
+	with pytest.raises(structlog.DropEvent):
+		sampler(None, "debug", {"event": "ocr.frame"})
+	assert sampler(None, "warning", {"event": "ocr.frame"}) == {"event": "ocr.frame"}
+	kept = 0
+	for _ in range(10):
+		try:
+			sampler(None, "debug", {"event": "sheets.row"})
+			kept += 1
+		except structlog.DropEvent:
+			pass
+	assert kept == 2
+	# Unsampled info events are never rate limited
+	for _ in range(10):
+		assert sampler(None, "info", {"event": "pipeline.stage.done"}) == {"event": "pipeline.stage.done"}
+	assert parse_sample_rates("ocr.frame=0.1, sheets.row=0.01,") == {"ocr.frame": 0.1, "sheets.row": 0.01}
+
+
+class _BlockedStream(io.BytesIO):
+	def __init__(self):
+		super().__init__()
+		self.release = threading.Event()
+
+	def write(self, data):
+		self.release.wait(5)
+		return super().write(data)
+
+
+def test_sink_never_blocks_and_reports_drops():
+	stream = _BlockedStream()
+	sink = AsyncLogSink(stream=stream, max_buffer=10)
+	# The writer is stuck on the first line; producers must not be
+	for i in range(100):
+		sink.put(b'{"i":%d}' % i)
+	stream.release.set()
+	assert sink.flush(timeout=5)
+	lines = stream.getvalue().splitlines()
+	assert sink.dropped > 0
+	assert len(lines) == 100 - sink.dropped + 1
+	assert lines[-1] == b'{"event":"log.dropped","level":"warning","count":%d}' % sink.dropped
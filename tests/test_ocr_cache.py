@@ -0,0 +1,95 @@
+import os
+import random
+
+import pytest
+
+from src.agent.ocr_cache import OcrCache, dhash
+
+
+def _flip(h, bits):
+	for b in bits:
+		h ^= 1 << b
+	return h
+
+
+def test_near_duplicate_lookup_and_lru(tmp_path):
+	path = str(tmp_path / "cache.json")
+	cache = OcrCache(path, max_entries=2, max_distance=4, hash_bits=64)
+	a, b, c = 0x0F0F0F0F0F0F0F0F, 0xFFFF0000FFFF0000, 0x123456789ABCDEF0
+	cache.put(a, "SALE 50%")
+	cache.put(b, "Cafe Aurora")
+	assert cache.get(_flip(a, [0, 17, 40, 63])) == "SALE 50%"
+	assert cache.get(_flip(a, [0, 1, 2, 3, 4])) is None
+	cache.put(c, "")  # evicts b, the least recently used
+	assert cache.get(b) is None
+	assert cache.get(c) == ""
+	assert cache.stats()["hits"] == 2
+	cache.flush()
+	assert len(OcrCache(path, max_entries=2, max_distance=4, hash_bits=64)) == 2
+
+
+def test_lookup_matches_brute_force():
+	rng = random.Random(0)
+	cache = OcrCache(max_entries=1000, max_distance=6, hash_bits=64)
+	hashes = [rng.getrandbits(64) for _ in range(500)]
+	for i, h in enumerate(hashes):
+		cache.put(h, str(i))
+	for _ in range(200):
+		base = rng.choice(hashes)
+		query = _flip(base, rng.sample(range(64), rng.randint(0, 8)))
+		close = [h for h in hashes if (h ^ query).bit_count() <= 6]
+		assert (cache.get(query) is not None) == bool(close)
+
+
+def _frame(np, cv2, seed, text):
+	rng = np.random.default_rng(seed)
+	scene = cv2.normalize(cv2.GaussianBlur(rng.random((720, 405)), (0, 0), 12), None, 40, 200, cv2.NORM_MINMAX)
+	frame = (scene + rng.normal(0, 6, scene.shape)).clip(0, 255).astype(np.uint8)
+	cv2.putText(frame, text, (20, 300), cv2.FONT_HERSHEY_SIMPLEX, 1.5, 255, 4)
+	return frame
+
+
+def test_resized_and_reencoded_frames_hit_the_cache():
+	cv2 = pytest.importorskip("cv2")
+	np = pytest.importorskip("numpy")
+	frame = _frame(np, cv2, 0, "Cafe Aurora")
+	# the same reel downloaded at another resolution, with heavier compression
+	smaller = cv2.resize(frame, (270, 480), interpolation=cv2.INTER_AREA)
+	reencoded = cv2.imdecode(cv2.imencode(".jpg", cv2.resize(frame, (540, 960)), [cv2.IMWRITE_JPEG_QUALITY, 40])[1], cv2.IMREAD_GRAYSCALE)
+	cache = OcrCache()
+	cache.put(dhash(frame), "Cafe Aurora")
+	assert cache.get(dhash(smaller)) == "Cafe Aurora"
+	assert cache.get(dhash(reencoded)) == "Cafe Aurora"
+	assert cache.get(dhash(_frame(np, cv2, 1, "Cafe Aurora"))) is None  # another scene
+
+
+def test_flush_waits_for_enough_new_entries_or_time(tmp_path):
+	path = str(tmp_path / "cache.json")
+	cache = OcrCache(path, max_distance=4, hash_bits=64, flush_every=2, flush_interval_s=3600)
+	cache.put(1, "a")
+	assert not cache.maybe_flush() and not os.path.exists(path)
+	cache.put(2, "b")
+	assert cache.maybe_flush() and len(OcrCache(path, max_distance=4, hash_bits=64)) == 2
+	cache.put(3, "c")
+	cache.flush_interval_s = 0
+	assert cache.maybe_flush() and not cache.maybe_flush()
+
+
+def test_flush_merges_entries_from_other_processes(tmp_path):
+	path = str(tmp_path / "cache.json")
+	a, b, c, d = 0x0F0F0F0F0F0F0F0F, 0xFFFF0000FFFF0000, 0x123456789ABCDEF0, 0xF0F0F0F0F0F0F0F0
+	first = OcrCache(path, max_entries=3, max_distance=4, hash_bits=64)
+	second = OcrCache(path, max_entries=3, max_distance=4, hash_bits=64)
+	first.put(a, "a")
+	second.put(b, "b")
+	second.put(c, "c")
+	first.flush()
+	second.flush()
+	merged = OcrCache(path, max_entries=3, max_distance=4, hash_bits=64)
+	assert [merged.get(h) for h in (a, b, c)] == ["a", "b", "c"]
+	# The last writer's entries count as the most recent when trimming
+	first.put(d, "d")
+	first.flush()
+	trimmed = OcrCache(path, max_entries=3, max_distance=4, hash_bits=64)
+	assert len(trimmed) == 3 and trimmed.get(d) == "d" and trimmed.get(b) is None
+	assert sorted(os.listdir(tmp_path)) == ["cache.json", "cache.json.lock"]
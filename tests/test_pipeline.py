@@ -0,0 +1,276 @@
+import os
+import threading
+import time
+
+import pytest
+
+from src.agent import pipeline
+from src.agent.config import Settings
+
+
+def test_process_reel_url_resumes_from_failed_stage(tmp_path, monkeypatch):
+	monkeypatch.setattr(pipeline, "get_settings", lambda: Settings(temp_dir=str(tmp_path)))
+	calls = []
+
+	def stage(name, out):
+		def fn(ctx):
+			calls.append(name)
+			return out
+		return fn
+
+	attempts = {"persist": 0}
+
+	def persist(ctx):
+		calls.append("persist")
+		attempts["persist"] += 1
+		if attempts["persist"] == 1:
+			raise RuntimeError("sheets down")
+		return {"start_index": 5, "end_index": 5}
+
+	monkeypatch.setattr(pipeline, "STAGES", [
+		("download", stage("download", {"caption": "c"}), ()),
+		("extract", stage("extract", {"items": [{"item_name": "x"}]}), ("download",)),
+		("persist", persist, ("extract",)),
+	])
+	url = "https://www.instagram.com/reel/ABC123/"
+	with pytest.raises(RuntimeError):
+		pipeline.process_reel_url(url)
+	assert pipeline.process_reel_url(url) == (5, 5, [{"item_name": "x"}])
+	assert calls == ["download", "extract", "persist", "persist"]
+
+
+def test_cancel_stops_before_next_stage_and_keeps_checkpoint(tmp_path, monkeypatch):
+	monkeypatch.setattr(pipeline, "get_settings", lambda: Settings(temp_dir=str(tmp_path)))
+	cancel = threading.Event()
+
+	def download(ctx):
+		cancel.set()
+		return {"caption": "c"}
+
+	monkeypatch.setattr(pipeline, "STAGES", [
+		("download", download, ()),
+		("persist", lambda ctx: pytest.fail("ran after cancel"), ("download",)),
+	])
+	with pytest.raises(pipeline.Cancelled):
+		pipeline.process_reel_url("https://www.instagram.com/reel/ABC123/", job_id="j1", cancel=cancel)
+	state = pipeline.CheckpointStore(str(tmp_path / "jobs")).load("j1")
+	assert state["stages"]["download"]["status"] == "done" and "persist" not in state["stages"]
+
+
+def test_runs_of_the_same_reel_do_not_overlap(tmp_path, monkeypatch):
+	monkeypatch.setattr(pipeline, "get_settings", lambda: Settings(temp_dir=str(tmp_path)))
+	events = []
+	first_started = threading.Event()
+
+	def download(ctx):
+		events.append("download")
+		open(os.path.join(ctx["work_dir"], "video.mp4"), "wb").close()
+		first_started.set()
+		time.sleep(0.2)
+		return {"caption": "c"}
+
+	def persist(ctx):
+		# The other run must not have cleared this run's media
+		assert os.path.exists(os.path.join(ctx["work_dir"], "video.mp4"))
+		events.append("persist")
+		return {"items": [], "start_index": 1, "end_index": 1}
+
+	monkeypatch.setattr(pipeline, "STAGES", [("download", download, ()), ("persist", persist, ("download",))])
+	url = "https://www.instagram.com/reel/ABC123/"
+	results = []
+	first = threading.Thread(target=lambda: results.append(pipeline.process_reel_url(url)))
+	first.start()
+	first_started.wait(2)
+	results.append(pipeline.process_reel_url(url))
+	first.join()
+	assert events == ["download", "persist", "download", "persist"]
+	assert len(results) == 2
+
+
+def test_other_reels_are_not_held_up_by_a_running_job(tmp_path, monkeypatch):
+	monkeypatch.setattr(pipeline, "get_settings", lambda: Settings(temp_dir=str(tmp_path)))
+	started, release = threading.Event(), threading.Event()
+
+	def download(ctx):
+		if ctx["reel_url"].endswith("SLOW/"):
+			started.set()
+			assert release.wait(5)
+		return {"items": [], "start_index": 1, "end_index": 1}
+
+	monkeypatch.setattr(pipeline, "STAGES", [("download", download, ())])
+	slow = threading.Thread(target=pipeline.process_reel_url, args=("https://www.instagram.com/reel/SLOW/",))
+	slow.start()
+	try:
+		assert started.wait(2)
+		assert pipeline.process_reel_url("https://www.instagram.com/reel/FAST/")[:2] == (1, 1)
+	finally:
+		release.set()
+		slow.join()
+
+
+def test_degraded_media_is_retried_on_resume(tmp_path, monkeypatch):
+	monkeypatch.setattr(pipeline, "get_settings", lambda: Settings(temp_dir=str(tmp_path)))
+	video = tmp_path / "v.mp4"
+	video.write_bytes(b"")
+	monkeypatch.setattr(pipeline, "download_reel", lambda url, d: {"caption": "", "video_path": str(video)})
+	media_calls = []
+
+	def process_media(path, work_dir):
+		media_calls.append(path)
+		if len(media_calls) == 1:
+			return {"transcript": "", "ocr_text": "", "failed": ["whisper"]}
+		return {"transcript": "Cafe A", "ocr_text": "", "failed": []}
+
+	monkeypatch.setattr(pipeline, "process_media", process_media)
+	monkeypatch.setattr(pipeline, "extract_items_with_llm", lambda blob: [{"type": "other", "item_name": blob}])
+	attempts = []
+
+	def persist(ctx):
+		attempts.append(ctx["items"][0]["item_name"])
+		if len(attempts) == 1:
+			raise RuntimeError("sheets down")
+		return {"start_index": 1, "end_index": 1}
+
+	monkeypatch.setattr(pipeline, "STAGES", pipeline.STAGES[:-1] + [("persist", persist, ("enrich",))])
+	url = "https://www.instagram.com/reel/ABC123/"
+	with pytest.raises(RuntimeError):
+		pipeline.process_reel_url(url, job_id="j1")
+	assert pipeline.CheckpointStore(str(tmp_path / "jobs")).load("j1")["stages"]["media"]["status"] == "degraded"
+	pipeline.process_reel_url(url, job_id="j1")
+	# media ran again, and extract/enrich re-ran on its new output
+	assert len(media_calls) == 2
+	assert "transcript: Cafe A" in attempts[1]
+
+
+class _FakeSheet:
+	rows = []
+
+	def __init__(self, sheet_id=None):
+		pass
+
+	def get_last_n_rows(self, n=10, sheet_name="Sheet1"):
+		return self.rows[-n:]
+
+	def append_rows(self, values, sheet_name="Sheet1"):
+		first = len(self.rows) + 2  # row 1 is the header
+		self.rows.extend(list(r) for r in values)
+		return {"updates": {"updatedRange": f"Sheet1!A{first}:U{first + len(values) - 1}"}}
+
+	def update_rows(self, first_row, values, sheet_name="Sheet1"):
+		for i, row in enumerate(values):
+			self.rows[first_row - 2 + i] = list(row)
+		return {}
+
+
+def test_progressive_mode_refines_provisional_rows_in_place(tmp_path, monkeypatch):
+	monkeypatch.setattr(pipeline, "get_settings", lambda: Settings(temp_dir=str(tmp_path), google_sheet_id="sheet"))
+	monkeypatch.setattr(_FakeSheet, "rows", [[1, "t", "old", 1, "other", "earlier reel"]])
+	monkeypatch.setattr(pipeline, "SheetsClient", _FakeSheet)
+	monkeypatch.setattr(pipeline, "probe_reel", lambda url: {"caption": "Cafe A and Cafe B"})
+	video = tmp_path / "v.mp4"
+	video.write_bytes(b"")
+	monkeypatch.setattr(pipeline, "download_reel", lambda url, d: {"caption": "Cafe A and Cafe B", "video_path": str(video)})
+	monkeypatch.setattr(pipeline, "process_media", lambda path, d: {"transcript": "", "ocr_text": "Cafe A"})
+	monkeypatch.setattr(pipeline, "enrich_item", lambda it: it)
+
+	def extract(blob):
+		if "ocr:" in blob or "transcript:" in blob:
+			# reordered, Cafe A dropped, Cafe B's name spelled differently, one new item
+			return [
+				{"type": "place", "item_name": "cafe  b", "city": "Lisbon", "processing_status": "done"},
+				{"type": "place", "item_name": "Cafe C", "processing_status": "done"},
+			]
+		return [{"type": "place", "item_name": "Cafe A"}, {"type": "place", "item_name": "Cafe B"}]
+
+	monkeypatch.setattr(pipeline, "extract_items_with_llm", extract)
+	updates = []
+	result = pipeline.process_reel_url("https://www.instagram.com/reel/XYZ/", progressive=True, on_update=lambda kind, res: updates.append((kind, res[:2])))
+
+	assert updates == [("provisional", (2, 3))]
+	assert result[:2] == (3, 4)
+	assert [(row[0], row[5], row[-1]) for row in _FakeSheet.rows[1:]] == [
+		(2, "Cafe A", "superseded"),
+		(3, "cafe  b", "done"),
+		(4, "Cafe C", "done"),
+	]
+	assert _FakeSheet.rows[2][7] == "Lisbon"
+
+
+def test_refinement_moves_rows_when_the_sheet_changes(tmp_path, monkeypatch):
+	monkeypatch.setattr(pipeline, "get_settings", lambda: Settings(temp_dir=str(tmp_path), google_sheet_id="sheet", sheet_travel_id="travel"))
+	sheets = {"sheet": [], "travel": []}
+
+	class Sheet(_FakeSheet):
+		def __init__(self, sheet_id=None):
+			self.rows = sheets[sheet_id]
+
+	monkeypatch.setattr(pipeline, "SheetsClient", Sheet)
+	monkeypatch.setattr(pipeline, "probe_reel", lambda url: {"caption": "Cafe A"})
+	video = tmp_path / "v.mp4"
+	video.write_bytes(b"")
+	monkeypatch.setattr(pipeline, "download_reel", lambda url, d: {"caption": "Cafe A", "video_path": str(video)})
+	monkeypatch.setattr(pipeline, "process_media", lambda path, d: {"transcript": "a cafe", "ocr_text": ""})
+	monkeypatch.setattr(pipeline, "enrich_item", lambda it: it)
+	monkeypatch.setattr(pipeline, "extract_items_with_llm", lambda blob: [{"type": "place" if "transcript:" in blob else "other", "item_name": "Cafe A"}])
+	pipeline.process_reel_url("https://www.instagram.com/reel/XYZ/", progressive=True)
+	assert [row[-1] for row in sheets["sheet"]] == ["superseded"]
+	assert [(row[4], row[5]) for row in sheets["travel"]] == [("place", "Cafe A")]
+
+
+def test_failed_refinement_marks_provisional_rows(tmp_path, monkeypatch):
+	monkeypatch.setattr(pipeline, "get_settings", lambda: Settings(temp_dir=str(tmp_path), google_sheet_id="sheet"))
+	monkeypatch.setattr(_FakeSheet, "rows", [])
+	monkeypatch.setattr(pipeline, "SheetsClient", _FakeSheet)
+	monkeypatch.setattr(pipeline, "probe_reel", lambda url: {"caption": "Cafe A"})
+	video = tmp_path / "v.mp4"
+	video.write_bytes(b"")
+	monkeypatch.setattr(pipeline, "download_reel", lambda url, d: {"caption": "Cafe A", "video_path": str(video)})
+	monkeypatch.setattr(pipeline, "process_media", lambda path, d: {"transcript": "music only", "ocr_text": ""})
+	monkeypatch.setattr(pipeline, "enrich_item", lambda it: it)
+	monkeypatch.setattr(pipeline, "extract_items_with_llm", lambda blob: [] if "transcript:" in blob else [{"type": "place", "item_name": "Cafe A"}])
+	with pytest.raises(ValueError):
+		pipeline.process_reel_url("https://www.instagram.com/reel/XYZ/", progressive=True)
+	assert [row[-1] for row in _FakeSheet.rows] == ["failed"]
+
+
+def test_persist_is_not_appended_twice_when_a_job_is_retried(tmp_path, monkeypatch):
+	monkeypatch.setattr(pipeline, "get_settings", lambda: Settings(temp_dir=str(tmp_path), google_sheet_id="sheet"))
+	monkeypatch.setattr(_FakeSheet, "rows", [])
+	monkeypatch.setattr(pipeline, "SheetsClient", _FakeSheet)
+	calls = []
+
+	def persist(ctx):
+		out = pipeline._stage_persist(ctx)
+		if not calls:
+			calls.append(1)
+			raise RuntimeError("worker died after the sheet write")
+		return out
+
+	monkeypatch.setattr(pipeline, "STAGES", [
+		("extract", lambda ctx: {"items": [{"type": "place", "item_name": "Cafe A"}]}, ()),
+		("persist", persist, ("extract",)),
+	])
+	url = "https://www.instagram.com/reel/XYZ/"
+	with pytest.raises(RuntimeError):
+		pipeline.process_reel_url(url)
+	assert pipeline.process_reel_url(url)[:2] == (1, 1)
+	assert len(_FakeSheet.rows) == 1
+
+
+def test_cancel_is_checked_right_before_the_sheet_write(tmp_path, monkeypatch):
+	monkeypatch.setattr(pipeline, "get_settings", lambda: Settings(temp_dir=str(tmp_path), google_sheet_id="sheet"))
+	monkeypatch.setattr(_FakeSheet, "rows", [])
+	monkeypatch.setattr(pipeline, "SheetsClient", _FakeSheet)
+	cancel = threading.Event()
+
+	def extract(ctx):
+		return {"items": [{"type": "place", "item_name": "Cafe A"}]}
+
+	def persist(ctx):
+		cancel.set()  # lease lost while the rows were being built
+		return pipeline._stage_persist(ctx)
+
+	monkeypatch.setattr(pipeline, "STAGES", [("extract", extract, ()), ("persist", persist, ("extract",))])
+	with pytest.raises(pipeline.Cancelled):
+		pipeline.process_reel_url("https://www.instagram.com/reel/XYZ/", cancel=cancel)
+	assert _FakeSheet.rows == []
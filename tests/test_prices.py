@@ -0,0 +1,132 @@
+import json
+import time
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from src.agent import enrich, prices
+from src.agent.prices import JsonSearchProvider, PriceCache, PriceEngine, _best_offer, _currency, product_key
+
+
+class _StubShop(BaseHTTPRequestHandler):
+	requests = []
+	catalog = {
+		"/shop-a": [{"title": "Nike Air Max 90 sneakers", "price": "Rs 7,999", "currency": "INR", "url": "https://a.example/am90"}],
+		"/shop-b": [
+			{"title": "Nike Air Max 90", "price": 7499, "currency": "INR", "url": "https://b.example/am90"},
+			{"title": "Phone case", "price": 199, "currency": "INR", "url": "https://b.example/case"},
+		],
+	}
+
+	def do_GET(self):
+		url = urlparse(self.path)
+		query = parse_qs(url.query).get("q", [""])[0]
+		self.requests.append((url.path, query, time.monotonic()))
+		if url.path == "/slow":
+			time.sleep(1.0)
+		results = self.catalog.get(url.path, []) if "air max" in query.lower() else []
+		body = json.dumps({"results": results}).encode()
+		self.send_response(200)
+		self.send_header("Content-Type", "application/json")
+		self.send_header("Content-Length", str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+
+	def log_message(self, *args):
+		pass
+
+
+@pytest.fixture
+def shop(local_server):
+	_StubShop.requests = []
+	return local_server(_StubShop)
+
+
+def _provider(base, path):
+	return JsonSearchProvider(f"{base}{path}?q={{query}}", name=path.strip("/"))
+
+
+def test_product_key_normalizes_brand_and_name():
+	assert product_key("NIKE", "Nike Air-Max 90") == product_key(None, "air max 90 nike") == "90 air max nike"
+
+
+def test_best_offer_ranks_match_before_price_within_one_currency():
+	key = product_key("Nike", "Air Max 90")
+	offers = [
+		{"title": "Nike Air Max 95 phone case", "price": 499, "currency": "INR"},
+		{"title": "Air Max 90 laces", "price": 299, "currency": "INR"},
+		{"title": "Nike Air Max 90", "price": 129, "currency": "USD"},
+		{"title": "Nike Air Max 90", "price": 99, "currency": ""},
+		{"title": "Nike Air Max 90 sneakers", "price": 8999, "currency": "INR"},
+		{"title": "Nike Air Max 90 Essential", "price": 7999, "currency": "INR"},
+	]
+	# Two of the three best matches are in INR; USD 129 is never compared with them
+	assert _best_offer(key, offers)["price"] == 7999
+	assert _best_offer(key, offers, currency="usd")["price"] == 129
+	assert _best_offer(key, offers[:2]) is None
+	assert _best_offer(product_key(None, "Air Max 90"), offers[1:2]) is None
+	assert [_currency(v) for v in ("₹7,999.00", "Rs. 7,999", "eur", "US$ 12", "12.00", "7,999 per pair")] == ["INR", "INR", "EUR", "USD", "", ""]
+
+
+def test_best_offer_does_not_compare_prices_across_currencies():
+	key = product_key("Nike", "Air Max 90")
+	offers = [
+		{"title": "Nike Air Max 90", "price": 7999, "currency": "INR"},
+		{"title": "Nike Air Max 90", "price": 120, "currency": "USD"},
+		{"title": "Nike Air Max 90", "price": 9000, "currency": "INR"},
+	]
+	assert _best_offer(key, offers) == offers[0]
+	# A closer match decides the currency even when it is in the minority
+	essential = product_key("Nike", "Air Max 90 Essential")
+	offers.append({"title": "Nike Air Max 90 Essential", "price": 140, "currency": "USD"})
+	assert _best_offer(essential, offers) == offers[3]
+
+
+def test_lookup_picks_cheapest_match_and_caches(shop, tmp_path):
+	cache = PriceCache(str(tmp_path / "prices.sqlite3"), ttl_s=3600, negative_ttl_s=60)
+	engine = PriceEngine([_provider(shop, "/shop-a"), _provider(shop, "/shop-b")], cache=cache)
+	best, missing = engine.lookup_many([("Nike", "Air Max 90"), ("Acme", "Unknown gadget")])
+	assert best["price"] == 7499 and best["url"] == "https://b.example/am90"
+	assert missing is None
+	assert {(path, q) for path, q, _ in _StubShop.requests} == {
+		("/shop-a", "Nike Air Max 90"), ("/shop-b", "Nike Air Max 90"),
+		("/shop-a", "Acme Unknown gadget"), ("/shop-b", "Acme Unknown gadget"),
+	}
+	# Hits and cached misses don't go back to the providers
+	_StubShop.requests.clear()
+	assert engine.lookup_many([("nike", "air max 90 "), ("Acme", "Unknown gadget")])[0]["price"] == 7499
+	assert _StubShop.requests == []
+
+
+def test_slow_provider_is_abandoned_at_deadline(shop, tmp_path):
+	cache = PriceCache(str(tmp_path / "prices.sqlite3"), ttl_s=3600, negative_ttl_s=60)
+	engine = PriceEngine([_provider(shop, "/shop-a"), _provider(shop, "/slow")], cache=cache, timeout_s=0.3, domain_rate=0)
+	started = time.monotonic()
+	best = engine.lookup_many([("Nike", "Air Max 90")])[0]
+	assert time.monotonic() - started < 0.8
+	assert best["price"] == 7999
+	# Incomplete answers are not cached
+	assert cache.get(product_key("Nike", "Air Max 90")) == (False, None)
+
+
+def test_domain_rate_limit_spaces_requests(shop):
+	engine = PriceEngine([_provider(shop, "/shop-a")], domain_rate=10)
+	engine.lookup_many([(None, f"air max {n}") for n in range(4)])
+	stamps = sorted(t for _, _, t in _StubShop.requests)
+	assert len(stamps) == 4 and stamps[-1] - stamps[0] >= 0.25
+
+
+def test_enrich_products_fills_price_fields(shop, tmp_path, monkeypatch):
+	engine = PriceEngine([_provider(shop, "/shop-a")])
+	monkeypatch.setattr(prices, "get_price_engine", lambda: engine)
+	items = [
+		{"type": "product", "item_name": "Air Max 90", "brand_or_category": "Nike", "processing_status": "review"},
+		{"type": "product", "item_name": "Mystery box"},
+		{"type": "product", "item_name": "Mug", "price": "300"},
+	]
+	enrich.enrich_products(items)
+	assert items[0]["price"] == "7999.00 INR" and items[0]["price_source"] == "shop-a"
+	assert items[0]["purchase_link"] == "https://a.example/am90" and items[0]["processing_status"] == "done"
+	assert "price" not in items[1] and items[1]["processing_status"] == "review"
+	assert items[2]["price"] == "300" and "price_source" not in items[2]
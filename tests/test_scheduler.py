@@ -0,0 +1,59 @@
+import threading
+import time
+
+import pytest
+
+from src.agent.scheduler import Admission, Overloaded, ResourceScheduler
+from src.agent.tracing import job_trace
+
+
+def _hold(sched, name, started, release, **needs):
+	def run():
+		with sched.acquire(name, **needs):
+			started.append(name)
+			release.wait(5)
+	t = threading.Thread(target=run)
+	t.start()
+	return t
+
+
+def test_scheduler_enforces_budgets_without_blocking_unrelated_tasks():
+	sched = ResourceScheduler({"cpu": 4, "whisper": 1, "ocr": 2})
+	started, release = [], threading.Event()
+	first = _hold(sched, "whisper", started, release, whisper=1, cpu=2)
+	time.sleep(0.05)
+	second = _hold(sched, "whisper2", started, release, whisper=1, cpu=2)
+	time.sleep(0.05)
+	# The second decode waits for the whisper slot, but OCR (its own resource) is not held up
+	with sched.acquire("ocr", ocr=1, cpu=1):
+		assert started == ["whisper"]
+	release.set()
+	first.join()
+	second.join()
+	assert started == ["whisper", "whisper2"]
+	assert sched.in_use == {"cpu": 0, "whisper": 0, "ocr": 0}
+
+
+def test_oversized_and_unbudgeted_needs_do_not_deadlock():
+	sched = ResourceScheduler({"cpu": 2, "memory_mb": 0})
+	with job_trace("j") as spans:
+		with sched.acquire("whisper", cpu=16, memory_mb=900, gpu=1) as granted:
+			assert granted == {"cpu": 2}
+	assert spans[0]["span"] == "wait.whisper"
+
+
+def test_admission_queues_then_refuses():
+	gate = Admission(max_active=1, max_queued=1)
+	admitted = []
+	first = gate.join()
+	second = gate.join(on_admit=lambda: admitted.append("second"))
+	assert (first.position(), second.position()) == (0, 1)
+	with pytest.raises(Overloaded):
+		gate.join()
+	first.leave()
+	assert admitted == ["second"] and second.position() == 0
+	assert second.wait(0)
+	second.leave()
+	with gate.slot() as ticket:
+		assert ticket.admitted
+	assert gate.active == 0
@@ -0,0 +1,36 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from src.agent.tracing import job_trace, span
+
+
+def test_job_trace_collects_and_dumps_spans(tmp_path):
+	with job_trace("job1", str(tmp_path)) as spans:
+		with span("ocr", items=2):
+			pass
+		with pytest.raises(ValueError):
+			with span("llm.openai"):
+				raise ValueError("boom")
+	assert [s["span"] for s in spans] == ["ocr", "llm.openai"]
+	assert spans[1]["error"] == "ValueError"
+	dumped = json.loads((tmp_path / "job1.json").read_text())
+	assert dumped["spans"][0]["items"] == 2
+
+
+def test_spans_from_pool_threads_reach_the_job_trace(monkeypatch):
+	from src.agent import downloader
+	from src.agent.tracing import in_context
+	monkeypatch.setattr(downloader, "_download_reel", lambda url, out_dir: {"caption": url})
+	with job_trace("job1") as spans:
+		with ThreadPoolExecutor(max_workers=2) as pool:
+			for f in [pool.submit(in_context(_record), i) for i in range(4)]:
+				f.result()
+		downloader.download_many(["a", "b"], [None, None])
+	assert sorted(s["span"] for s in spans) == ["chunk0", "chunk1", "chunk2", "chunk3", "download", "download"]
+
+
+def _record(i):
+	with span(f"chunk{i}"):
+		pass
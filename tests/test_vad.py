@@ -0,0 +1,101 @@
+import wave
+
+import numpy as np
+
+from src.agent import media, vad
+from src.agent.config import Settings
+from src.agent.tracing import job_trace
+from src.agent.vad import energy_segments, load_pcm, plan_chunks
+
+
+def _write_wav(path, audio, sr=16000):
+	with wave.open(str(path), "wb") as w:
+		w.setnchannels(1)
+		w.setsampwidth(2)
+		w.setframerate(sr)
+		w.writeframes((audio * 32767).astype(np.int16).tobytes())
+
+
+def _tone(seconds, voiced, sr=16000):
+	t = np.arange(int(seconds * sr)) / sr
+	audio = np.random.default_rng(0).normal(0, 0.001, t.shape)
+	mask = (t >= voiced[0]) & (t < voiced[1])
+	audio[mask] += 0.5 * np.sin(2 * np.pi * 200 * t[mask])
+	return audio
+
+
+def test_energy_segments_find_voiced_region(tmp_path):
+	sr = 16000
+	path = tmp_path / "a.wav"
+	_write_wav(path, _tone(3, (1.0, 2.0)), sr)
+	segments = energy_segments(load_pcm(str(path)), sr)
+	assert len(segments) == 1
+	start, end = segments[0]
+	assert 0.8 <= start <= 1.05 and 1.95 <= end <= 2.2
+
+
+def test_plan_chunks_cuts_in_silences_and_splits_long_segments():
+	segments = [[0.0, 10.0], [12.0, 25.0], [31.0, 40.0], [45.0, 115.0]]
+	chunks = plan_chunks(segments, target_s=30.0)
+	assert chunks[0] == [[0.0, 10.0], [12.0, 25.0]]
+	assert chunks[1] == [[31.0, 40.0]]
+	# 70 s segment -> three equal parts, one per chunk
+	assert [c[0] for c in chunks[2:]] == [[45.0, 68.33], [68.33, 91.67], [91.67, 115.0]]
+	assert all(c[-1][1] - c[0][0] <= 30.0 for c in chunks)
+
+
+def test_energy_fallback_never_skips_transcription(tmp_path, monkeypatch):
+	def no_silero(audio):
+		raise ImportError("onnxruntime")
+
+	monkeypatch.setattr(vad, "silero_segments", no_silero)
+	path = tmp_path / "a.wav"
+	_write_wav(path, _tone(20, (1.0, 1.5)))
+	speech = vad.detect_speech(str(path), min_speech_ratio=0.1)
+	assert speech["method"] == "energy" and speech["speech_ratio"] < 0.1
+	assert speech["decision"] == "full" and not speech["skip"] and speech["skipped_s"] == 0
+
+	monkeypatch.setattr(vad, "silero_segments", lambda audio: [[1.0, 1.5]])
+	speech = vad.detect_speech(str(path), min_speech_ratio=0.1)
+	assert speech["decision"] == "skip" and speech["skipped_s"] == 20.0
+
+
+def test_vad_decision_is_recorded_on_spans(tmp_path, monkeypatch):
+	monkeypatch.setattr(media, "get_settings", lambda: Settings(vad_gate=True))
+	monkeypatch.setattr(vad, "silero_segments", lambda audio: [[1.0, 1.5]])
+	path = tmp_path / "a.wav"
+	_write_wav(path, _tone(20, (1.0, 1.5)))
+	with job_trace("job") as spans:
+		assert media.transcribe_segments(str(path), media.detect_speech(str(path))) == []
+	by_name = {s["span"]: s for s in spans}
+	assert by_name["vad"]["decision"] == "skip" and by_name["vad"]["skipped_s"] == 20.0
+	assert by_name["whisper"]["vad"] == "skip" and by_name["whisper"]["skipped_s"] == 20.0
+
+
+def test_plan_chunks_with_duration_cover_the_whole_clip():
+	chunks = plan_chunks([[0.0, 10.0], [12.0, 25.0], [31.0, 40.0]], target_s=30.0, duration_s=50.0)
+	assert chunks == [[[0.0, 28.0]], [[28.0, 50.0]]]
+
+
+class _FakeWhisper:
+	def __init__(self):
+		self.calls = []
+
+	def transcribe(self, audio, beam_size=1, clip_timestamps=None):
+		self.calls.append((audio, clip_timestamps))
+		return [], None
+
+
+def test_decode_without_vad_gate_transcribes_every_second(monkeypatch):
+	monkeypatch.setattr(media, "get_settings", lambda: Settings(whisper_chunk_s=30.0))
+	audio = _tone(70, (10.0, 20.0)).astype(np.float32)
+	audio[int(40 * 16000):int(50 * 16000)] += np.float32(0.5)  # loud enough for the energy detector
+	model = _FakeWhisper()
+	# the PCM is passed in, so the path is never read
+	media._decode(model, "missing.wav", None, workers=2, threads=1, audio=audio)
+	assert len(model.calls) > 1 and all(clips is None for _, clips in model.calls)
+	assert sum(len(piece) for piece, _ in model.calls) == len(audio)
+
+	model = _FakeWhisper()
+	media._decode(model, "missing.wav", None, workers=1, threads=1, audio=audio)
+	assert model.calls[0][0] is audio and model.calls[0][1] is None